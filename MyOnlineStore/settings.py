@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,11 +46,17 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'store.staticfiles.StaticFilesMiddleware',
+    'store.middleware.QueryInstrumentationMiddleware',
+    'store.routers.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'store.anonymous_cart.AnonymousCartMiddleware',
+    'store.ratelimit.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'store.middleware.SamplingProfilerMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -57,19 +64,31 @@ ROOT_URLCONF = 'MyOnlineStore.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Движок Django с замером времени рендеринга для метрик запросов
+        'BACKEND': 'store.middleware.TimedDjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'store.context_processors.navigation',
+            ],
+            # Скомпилированные шаблоны хранятся в памяти процесса; в gunicorn
+            # они компилируются до fork (MyOnlineStore.warmup), проверка - manage.py compile_templates
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
             ],
         },
     },
 ]
 
+# Время жизни фрагментного кеша навигации base.html (на пользователя), секунды
+NAV_CACHE_TIMEOUT = int(os.environ.get('NAV_CACHE_TIMEOUT', '300'))
+
 WSGI_APPLICATION = 'MyOnlineStore.wsgi.application'
 
 
@@ -125,6 +144,15 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'static'
 STATICFILES_DIRS = [BASE_DIR / 'static_dev']
+# collectstatic добавляет хеш в имена и сжимает файлы в .gz,
+# store.staticfiles.StaticFilesMiddleware раздает их из STATIC_ROOT
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'store.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+STATIC_SERVE = os.environ.get('STATIC_SERVE', 'True') == 'True'
+# Время кеширования файлов без хеша в имени; файлы с хешем кешируются на год
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', '60'))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -139,6 +167,116 @@ LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 LOGIN_URL = '/accounts/login/'
 
+# Кеш: общий бэкенд Redis (REDIS_URL) или локальный в памяти процесса
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Двухуровневый кеш чтений сервисного слоя (store.cache)
+SERVICE_CACHE_ENABLED = os.environ.get('SERVICE_CACHE_ENABLED', 'True') == 'True'
+SERVICE_CACHE_LOCAL_MAX_ENTRIES = int(os.environ.get('SERVICE_CACHE_LOCAL_MAX_ENTRIES', '1024'))
+SERVICE_CACHE_LOCAL_TTL = float(os.environ.get('SERVICE_CACHE_LOCAL_TTL', '5'))
+
+# Ограничение частоты запросов (store.ratelimit.RateLimitMiddleware): ведра
+# по имени URL и ключу (ip, user, username), состояние в общем кеше
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'True') == 'True'
+RATE_LIMIT_CACHE = 'default'
+# Заголовок с адресом клиента за обратным прокси, например HTTP_X_FORWARDED_FOR
+RATE_LIMIT_IP_HEADER = os.environ.get('RATE_LIMIT_IP_HEADER') or None
+RATE_LIMITS = {
+    'add_to_cart': {'ip': '60/m', 'user': '30/m'},
+    'checkout': {'ip': '20/m', 'user': '10/m', 'methods': ['POST']},
+    'login': {'ip': '20/m', 'username': '5/m', 'methods': ['POST']},
+}
+
+# Шина инвалидации кеша между процессами (store.invalidation):
+# auto - LISTEN/NOTIFY на PostgreSQL, иначе опрос журнала; notify | table | off
+CACHE_INVALIDATION_BACKEND = os.environ.get('CACHE_INVALIDATION_BACKEND', 'auto')
+CACHE_INVALIDATION_POLL_INTERVAL = float(os.environ.get('CACHE_INVALIDATION_POLL_INTERVAL', '1'))
+CACHE_INVALIDATION_GRACE = int(os.environ.get('CACHE_INVALIDATION_GRACE', '10'))
+CACHE_INVALIDATION_RETENTION = int(os.environ.get('CACHE_INVALIDATION_RETENTION', '3600'))
+
+# Рекомендации "покупают вместе" (store.recommendations): сколько соседей
+# хранить на товар и сколько показывать на странице товара и в корзине
+RECOMMENDATIONS_TOP_K = int(os.environ.get('RECOMMENDATIONS_TOP_K', '10'))
+RECOMMENDATIONS_SHOWN = int(os.environ.get('RECOMMENDATIONS_SHOWN', '4'))
+# Инкрементальный пересчет неточен (поздние и отмененные заказы), поэтому
+# не реже этого интервала, секунды, build_recommendations делает полный
+RECOMMENDATIONS_FULL_REBUILD_INTERVAL = int(os.environ.get('RECOMMENDATIONS_FULL_REBUILD_INTERVAL', str(24 * 60 * 60)))
+
+# Подсказки поиска (store.autocomplete): индекс названий в памяти процесса.
+# С preload_app строится в мастере gunicorn и делится с воркерами
+AUTOCOMPLETE_PRELOAD = os.environ.get('AUTOCOMPLETE_PRELOAD', 'True') == 'True'
+AUTOCOMPLETE_MAX_BYTES = int(os.environ.get('AUTOCOMPLETE_MAX_BYTES', str(256 * 1024 * 1024)))
+AUTOCOMPLETE_MAX_WORDS = 4
+AUTOCOMPLETE_MIN_LENGTH = 2
+# Как часто дочитывать товары, измененные другими процессами, секунды
+AUTOCOMPLETE_REFRESH_INTERVAL = float(os.environ.get('AUTOCOMPLETE_REFRESH_INTERVAL', '10'))
+AUTOCOMPLETE_COMPACT_THRESHOLD = 500
+
+# Счетчики просмотров и популярности (store.counters): буфер в памяти процесса
+# (memory) или в общем кеше (cache), сброс в БД раз в COUNTERS_FLUSH_INTERVAL секунд
+COUNTERS_ENABLED = os.environ.get('COUNTERS_ENABLED', 'True') == 'True'
+COUNTERS_BACKEND = os.environ.get('COUNTERS_BACKEND', 'memory')
+COUNTERS_CACHE = 'default'
+COUNTERS_FLUSH_INTERVAL = float(os.environ.get('COUNTERS_FLUSH_INTERVAL', '30'))
+POPULARITY_HALF_LIFE_DAYS = float(os.environ.get('POPULARITY_HALF_LIFE_DAYS', '7'))
+POPULARITY_WEIGHTS = {'view': 1, 'cart': 5}
+
+# Блоки главной (store.homepage): пересчитываются командой refresh_home_page.
+# Блоки старше HOME_PAGE_MAX_AGE секунд отдаются с предупреждением в лог
+HOME_PAGE_BLOCK_SIZE = 8
+HOME_PAGE_BESTSELLER_DAYS = int(os.environ.get('HOME_PAGE_BESTSELLER_DAYS', '30'))
+HOME_PAGE_RESTOCK_DAYS = int(os.environ.get('HOME_PAGE_RESTOCK_DAYS', '14'))
+HOME_PAGE_MAX_AGE = int(os.environ.get('HOME_PAGE_MAX_AGE', '3600'))
+
+# Корзины, не менявшиеся столько дней, удаляет команда cleanup_expired
+CART_EXPIRY_DAYS = int(os.environ.get('CART_EXPIRY_DAYS', '30'))
+
+# Корзина до входа (store.anonymous_cart): подписанная cookie, переносится
+# в корзину пользователя при входе
+ANONYMOUS_CART_COOKIE = 'cart'
+ANONYMOUS_CART_MAX_AGE = 30 * 86400
+ANONYMOUS_CART_MAX_ITEMS = 50
+
+# Фасеты каталога (store.facets): границы ценовых диапазонов в рублях.
+# После изменения нужно выполнить rebuild_facets
+CATALOG_PRICE_BUCKETS = [1000, 5000, 20000, 100000]
+
+# Профилирование запросов (store.middleware.SamplingProfilerMiddleware)
+REQUEST_PROFILER_DIR = os.environ.get('REQUEST_PROFILER_DIR', BASE_DIR / 'profiles')
+REQUEST_PROFILER_SAMPLE_RATE = float(os.environ.get('REQUEST_PROFILER_SAMPLE_RATE', '0'))
+REQUEST_PROFILER_INTERVAL = float(os.environ.get('REQUEST_PROFILER_INTERVAL', '0.005'))
+
+# Метрики запросов (store.middleware.QueryInstrumentationMiddleware).
+# Заголовок Server-Timing отдается сотрудникам, всем - при SERVER_TIMING_HEADER=True
+# (по умолчанию - при DEBUG); JSON-лог по каждому запросу - при уровне INFO
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'store.metrics': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_METRICS_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -147,11 +285,53 @@ DATABASES = {
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD', '3520'),
         'HOST': os.environ.get('POSTGRES_HOST', 'db'),
         'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Пул соединений psycopg 3 (psycopg_pool): проверка соединения перед выдачей,
+# ограничение времени жизни и размера пула, ожидание свободного соединения не дольше DB_POOL_TIMEOUT.
+# Без psycopg_pool используются постоянные соединения psycopg2 (CONN_MAX_AGE)
+DB_POOL_ENABLED = (
+    os.environ.get('DB_POOL', 'True') == 'True'
+    and find_spec('psycopg') is not None and find_spec('psycopg_pool') is not None
+)
+if DB_POOL_ENABLED:
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+            'max_waiting': int(os.environ.get('DB_POOL_MAX_WAITING', '0')),
+            'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', '1800')),
+            'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', '600')),
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', '60'))
+
+# Реплики для чтения каталога: POSTGRES_REPLICA_HOSTS="host1,host2[:port]"
+DATABASE_REPLICAS = []
+for index, replica_host in enumerate(filter(None, os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(',')), start=1):
+    host, _, port = replica_host.strip().partition(':')
+    alias = f'replica_{index}'
+    DATABASES[alias] = dict(
+        DATABASES['default'], HOST=host, PORT=port or DATABASES['default']['PORT'],
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['store.routers.ReplicaRouter']
+REPLICA_URL_NAMES = ['home', 'product_list', 'product_detail']
+# Сколько секунд после записи чтения пользователя идут на основную БД
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '10'))
+# Максимально допустимое отставание реплики и период его проверки, секунды
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', '10'))
+REPLICA_CHECK_INTERVAL = float(os.environ.get('REPLICA_CHECK_INTERVAL', '5'))
+
 # Настройки для production
 DEBUG = os.environ.get('DEBUG', 'True') == 'True'
+SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', str(DEBUG)) == 'True'
 
 # Разрешенные хосты для Docker
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '0.0.0.0', 'web']
\ No newline at end of file
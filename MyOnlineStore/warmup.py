@@ -0,0 +1,168 @@
+"""
+Прогрев приложения перед приемом запросов (gunicorn.conf.py).
+
+Код, шаблоны и URL прогреваются в мастер-процессе до fork, и воркеры
+получают их через copy-on-write. Соединения с БД и кешем открываются
+в каждом воркере отдельно: сокет, открытый до fork, нельзя делить между процессами.
+"""
+import gc
+import logging
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.urls import NoReverseMatch, URLPattern, URLResolver, get_resolver, reverse
+
+logger = logging.getLogger(__name__)
+
+
+def warmup_code():
+    """
+    Импорт представлений, разбор URL и компиляция всех шаблонов.
+    Возвращает счетчики и время в секундах
+    """
+    started = time.perf_counter()
+    resolver = get_resolver()
+    resolver.url_patterns  # импортирует urls.py и все модули представлений
+    names = list(_url_names(resolver.url_patterns))
+    for name in names:
+        try:
+            reverse(name)
+        except NoReverseMatch:
+            # Шаблоны с параметрами: reverse_dict заполнен, этого достаточно
+            pass
+
+    # Ошибки в шаблонах сторонних приложений не мешают старту,
+    # шаблоны проекта проверяются командой compile_templates
+    templates = sum(1 for result in compile_templates() if result.error is None)
+    return {'urls': len(names), 'templates': templates, 'seconds': round(time.perf_counter() - started, 3)}
+
+
+class CompiledTemplate:
+    """Результат компиляции одного шаблона"""
+    __slots__ = ('name', 'path', 'seconds', 'error')
+
+    def __init__(self, name, path, seconds, error=None):
+        self.name = name
+        self.path = path
+        self.seconds = seconds
+        self.error = error
+
+    @property
+    def is_project(self):
+        return Path(self.path).is_relative_to(settings.BASE_DIR) and 'site-packages' not in self.path
+
+
+def compile_templates():
+    """
+    Компиляция всех шаблонов из загрузчиков Django. Для кеширующего
+    загрузчика результат остается в его кеше
+    """
+    results = []
+    for engine in engines.all():
+        # Библиотеки тегов импортируются при создании движка
+        seen = set()
+        for loader in engine.engine.template_loaders:
+            for name, path in _template_names(loader):
+                # Одноименный шаблон из следующей папки перекрыт первым
+                if name in seen:
+                    continue
+                seen.add(name)
+                started = time.perf_counter()
+                try:
+                    engine.get_template(name)
+                    error = None
+                except Exception as exc:
+                    error = exc
+                results.append(CompiledTemplate(name, str(path), time.perf_counter() - started, error))
+    return results
+
+
+def warmup_connections():
+    """
+    Открытие соединений со всеми БД и кешем в текущем процессе
+    """
+    from django.core.cache import caches
+
+    started = time.perf_counter()
+    opened = 0
+    for alias in connections:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            opened += 1
+        except DatabaseError:
+            # Недоступная реплика не должна мешать старту воркера
+            logger.exception('Warmup could not connect to database %s', alias)
+    for alias in settings.CACHES:
+        caches[alias].get('warmup')
+    return {'databases': opened, 'seconds': round(time.perf_counter() - started, 3)}
+
+
+def close_connections():
+    """
+    Закрытие соединений с БД текущего процесса перед fork. С пулом
+    (OPTIONS['pool']) close_all() только возвращает соединения в пул,
+    и его сокеты достались бы дочерним процессам, поэтому пулы
+    закрываются отдельно
+    """
+    connections.close_all()
+    for alias in connections:
+        connection = connections[alias]
+        # Обращение к connection.pool создало бы пул: закрываются только открытые
+        if alias in getattr(connection, '_connection_pools', ()):
+            connection.close_pool()
+
+
+def prepare_fork():
+    """
+    Перед fork: закрыть соединения и пулы мастера и заморозить объекты в GC,
+    чтобы сборщик мусора не копировал их страницы в каждом воркере
+    """
+    close_connections()
+    gc.collect()
+    gc.freeze()
+
+
+def memory_usage(pid='self'):
+    """
+    Память процесса в КиБ: RSS, а также PSS и разделяемая часть из smaps_rollup
+    (PSS делит общие с мастером страницы между процессами). Только Linux
+    """
+    usage = {}
+    for filename, fields in (('status', ('VmRSS',)), ('smaps_rollup', ('Pss', 'Shared_Clean', 'Shared_Dirty'))):
+        try:
+            with open(f'/proc/{pid}/{filename}') as f:
+                for line in f:
+                    key, _, value = line.partition(':')
+                    if key in fields:
+                        usage[key] = int(value.split()[0])
+        except OSError:
+            pass
+    if 'Shared_Clean' in usage:
+        usage['Shared'] = usage.pop('Shared_Clean') + usage.pop('Shared_Dirty', 0)
+    return usage
+
+
+def _url_names(patterns, namespace=''):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            prefix = f'{namespace}{pattern.namespace}:' if pattern.namespace else namespace
+            yield from _url_names(pattern.url_patterns, prefix)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield f'{namespace}{pattern.name}'
+
+
+def _template_names(loader):
+    if isinstance(loader, CachedLoader):
+        for inner in loader.loaders:
+            yield from _template_names(inner)
+        return
+    get_dirs = getattr(loader, 'get_dirs', None)
+    for directory in get_dirs() if get_dirs else []:
+        directory = Path(directory)
+        for path in sorted(directory.rglob('*.html')):
+            yield path.relative_to(directory).as_posix(), path
@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MyOnlineStore.settings')
 
 application = get_wsgi_application()
+
+# Слушатель шины инвалидации кеша и сброс счетчиков: только в процессах, которые
+# обслуживают запросы. При предзагрузке в gunicorn они запускаются в воркерах после fork
+# (gunicorn.conf.py)
+from store.counters import counters  # noqa: E402
+from store.invalidation import start_listener  # noqa: E402
+
+if not os.environ.get('APP_SERVER_PRELOAD'):
+    start_listener()
+    counters.start()
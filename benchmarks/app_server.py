@@ -0,0 +1,106 @@
+"""
+Холодный старт и память gunicorn с предзагрузкой приложения и без нее.
+
+Запуск: python -m benchmarks.app_server --workers 4 --path /accounts/login/ --output results.json
+
+Для каждого режима gunicorn запускается с gunicorn.conf.py, замеряется время
+от запуска до первого успешного ответа и память мастера и каждого воркера
+(RSS, PSS и разделяемая часть из /proc). Только Linux. Воркеры открывают
+соединения с БД из настроек, поэтому она должна быть доступна.
+"""
+import argparse
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks.utils import BASE_DIR, write_results
+
+START_TIMEOUT = 60
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(port, path, timeout=START_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', path)
+            status = conn.getresponse().status
+            conn.close()
+            if status < 500:
+                return status
+        except OSError:
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(f'gunicorn did not answer on {path} within {timeout}s')
+
+
+def children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def run_mode(preload, workers, path):
+    from MyOnlineStore.warmup import memory_usage
+
+    port = free_port()
+    env = dict(os.environ, GUNICORN_PRELOAD=str(preload), GUNICORN_WORKERS=str(workers),
+               GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_ACCESS_LOG='')
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'MyOnlineStore.wsgi:application'],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        status = wait_ready(port, path)
+        cold_start = time.perf_counter() - started
+        # Ждем, пока поднимутся все воркеры
+        deadline = time.monotonic() + START_TIMEOUT
+        while len(children(process.pid)) < workers and time.monotonic() < deadline:
+            time.sleep(0.05)
+        for _ in range(workers * 5):
+            wait_ready(port, path)
+        worker_memory = [memory_usage(pid) for pid in children(process.pid)]
+        master_memory = memory_usage(process.pid)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+
+    return {
+        'status': status,
+        'cold_start_s': round(cold_start, 3),
+        'master_kib': master_memory,
+        'workers_kib': worker_memory,
+        'worker_rss_avg_kib': round(sum(m.get('VmRSS', 0) for m in worker_memory) / len(worker_memory))
+        if worker_memory else None,
+        'total_pss_kib': sum(m.get('Pss', 0) for m in worker_memory + [master_memory]),
+    }
+
+
+def run(workers, path, output=None):
+    results = {'workers': workers, 'path': path}
+    for preload in (False, True):
+        results['preload' if preload else 'no_preload'] = run_mode(preload, workers, path)
+    return write_results('app_server', results, output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--path', default='/accounts/login/', help='URL polled until the server answers')
+    parser.add_argument('--output', help='Path to JSON file with results')
+    args = parser.parse_args()
+    sys.path.insert(0, str(BASE_DIR))
+    run(args.workers, args.path, args.output)
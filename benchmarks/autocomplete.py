@@ -0,0 +1,98 @@
+"""
+Подсказки поиска: сборка индекса префиксов, его объем и задержка поиска.
+
+Запуск: python -m benchmarks.autocomplete --names 1000000 --queries 20000 --output results.json
+
+Названия строятся так же, как в generate_dataset (категория, бренд, номер),
+индекс собирается в памяти без БД. Запросы - префиксы 2-8 символов случайных
+названий и слов, половина из них кириллицей, половина латиницей. Замеряется
+Autocomplete.search целиком (нормализация, поиск, ранжирование): по одному
+ядру и с --changes изменениями поверх него, еще не перенесенными в ядро
+(по умолчанию на одно меньше AUTOCOMPLETE_COMPACT_THRESHOLD).
+"""
+import argparse
+import random
+import resource
+import time
+
+from benchmarks.storefront import percentile
+from benchmarks.utils import setup_django, write_results
+
+
+def names(count, rng):
+    from store.management.commands.generate_dataset import BRANDS, CATEGORIES
+
+    for product_id in range(1, count + 1):
+        yield product_id, f'{rng.choice(CATEGORIES)} {rng.choice(BRANDS)} {product_id}', f'product-{product_id}'
+
+
+def latency(index, samples):
+    timings = []
+    found = 0
+    for query in samples:
+        started = time.perf_counter()
+        found += bool(index.search(query, 10))
+        timings.append(time.perf_counter() - started)
+    return {
+        'mean_us': round(sum(timings) / len(timings) * 1e6, 1),
+        'p50_us': round(percentile(timings, 50) * 1e6, 1),
+        'p99_us': round(percentile(timings, 99) * 1e6, 1),
+        'max_us': round(max(timings) * 1e6, 1),
+        'with_results': round(found / len(samples), 3),
+    }
+
+
+def run(count, queries, changes=None, output=None):
+    from django.conf import settings
+    from store.autocomplete import Autocomplete, PrefixIndex
+    from store.management.commands.generate_dataset import BRANDS, CATEGORIES
+
+    if changes is None:
+        changes = settings.AUTOCOMPLETE_COMPACT_THRESHOLD - 1
+    rng = random.Random(42)
+    results = {'names': count, 'queries': queries, 'changes': changes}
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    core = PrefixIndex(names(count, rng))
+    results['build_s'] = round(time.perf_counter() - started, 3)
+    # Пик RSS во время сборки (ru_maxrss в КиБ на Linux)
+    results['build_peak_rss_growth_mb'] = round(
+        (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024, 1
+    )
+    results['index_mb'] = round(core.nbytes / 2 ** 20, 1)
+    results['keys'] = len(core.starts)
+
+    index = Autocomplete()
+    index.core = core
+    # Без дочитки из БД: замеряется только поиск
+    index.last_refresh = float('inf')
+    words = CATEGORIES + BRANDS + [str(rng.randint(1, count)) for _ in range(100)]
+    samples = []
+    for _ in range(queries):
+        word = rng.choice(words)
+        samples.append(word[:rng.randint(2, 8)])
+
+    results['search'] = latency(index, samples)
+
+    # Изменения поверх ядра: переименования и снятие с продажи случайных товаров
+    for product_id in rng.sample(range(1, count + 1), min(changes, count)):
+        if rng.random() < 0.2:
+            index.apply(product_id)
+        else:
+            name = f'{rng.choice(CATEGORIES)} {rng.choice(BRANDS)} {product_id}'
+            index.apply(product_id, name, f'product-{product_id}', active=True)
+    results['pending_changes'] = len(index.changes)
+    results['search_with_changes'] = latency(index, samples)
+    return write_results('autocomplete', results, output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--names', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--changes', type=int, help='Pending changes (default: compaction threshold - 1)')
+    parser.add_argument('--output', help='Path to JSON file with results')
+    args = parser.parse_args()
+    setup_django()
+    run(args.names, args.queries, args.changes, args.output)
@@ -0,0 +1,60 @@
+"""
+Сравнение ORM и COPY режимов load_goods/export_product_residue.
+
+Запуск: python -m benchmarks.catalog_copy --rows 1000000
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from benchmarks.utils import setup_django, test_database, timer, write_results
+
+
+def generate_file(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump([
+            {
+                'name': f'Product {i}',
+                'description': f'Description {i}',
+                'price': round(10 + (i % 1000) * 1.5, 2),
+                'quantity': i % 50,
+            }
+            for i in range(rows)
+        ], f)
+
+
+def run(rows, output=None):
+    from django.core.management import call_command
+    from store.models import Product
+
+    results = {'rows': rows}
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = os.path.join(tmp, 'products.json')
+        generate_file(data_file, rows)
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            with test_database() as connection:
+                results['vendor'] = connection.vendor
+                for mode, extra in (('orm', []), ('copy', ['--copy'])):
+                    Product.objects.all().delete()
+                    with timer(results, f'{mode}_load_insert_s'):
+                        call_command('load_goods', '--file', data_file, *extra)
+                    with timer(results, f'{mode}_load_update_s'):
+                        call_command('load_goods', '--file', data_file, *extra)
+                    with timer(results, f'{mode}_export_s'):
+                        call_command('export_product_residue', *extra)
+        finally:
+            os.chdir(cwd)
+
+    return write_results('catalog_copy', results, output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--output', help='Path to JSON file with results')
+    args = parser.parse_args()
+    setup_django()
+    run(args.rows, args.output)
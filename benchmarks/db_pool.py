@@ -0,0 +1,89 @@
+"""
+Задержка коротких запросов с пулом соединений и без него (только PostgreSQL).
+
+Запуск: python -m benchmarks.db_pool --requests 2000 --threads 8 --output results.json
+
+Каждый "запрос" выполняет один SELECT и в конце, как Django после ответа,
+освобождает соединение: без пула оно закрывается, с пулом возвращается в пул.
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.storefront import percentile
+from benchmarks.utils import setup_django, write_results
+
+
+def configure_aliases():
+    from django.db import connections
+
+    base = dict(connections.settings['default'])
+    options = {key: value for key, value in base['OPTIONS'].items() if key != 'pool'}
+    pool = dict(
+        base['OPTIONS'].get('pool') or {'min_size': 2, 'max_size': 10, 'timeout': 10},
+    )
+    configured = connections.configure_settings({
+        'default': connections.settings['default'],
+        'bench_nopool': dict(base, OPTIONS=options, CONN_MAX_AGE=0),
+        'bench_pool': dict(base, OPTIONS=dict(options, pool=pool), CONN_MAX_AGE=0),
+    })
+    for alias in ('bench_nopool', 'bench_pool'):
+        connections.settings[alias] = configured[alias]
+    return pool
+
+
+def run_mode(alias, requests, threads):
+    from django.db import connections
+
+    latencies = []
+    lock = threading.Lock()
+
+    def request(_):
+        started = time.perf_counter()
+        conn = connections[alias]
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        conn.close()
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(request, range(requests)))
+    wall = time.perf_counter() - started
+
+    result = {
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'throughput_rps': round(requests / wall, 1),
+    }
+    conn_pool = connections[alias].pool
+    if conn_pool is not None:
+        result['pool_stats'] = conn_pool.get_stats()
+    return result
+
+
+def run(requests, threads, output=None):
+    from django.db import connection
+
+    if connection.vendor != 'postgresql':
+        raise SystemExit('Connection pooling benchmark requires PostgreSQL')
+    pool = configure_aliases()
+    results = {'requests': requests, 'threads': threads, 'pool': pool}
+    results['without_pool'] = run_mode('bench_nopool', requests, threads)
+    results['with_pool'] = run_mode('bench_pool', requests, threads)
+    return write_results('db_pool', results, output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--output', help='Path to JSON file with results')
+    args = parser.parse_args()
+    setup_django()
+    run(args.requests, args.threads, args.output)
@@ -0,0 +1,137 @@
+"""
+Фасеты каталога: счетчики фильтров из таблицы CatalogFacet против COUNT
+по товарам и задержка отфильтрованных страниц каталога.
+
+Запуск: python -m benchmarks.facets --products 1000000 --output results.json
+
+Данные генерируются командой generate_dataset во временной БД. Для случайных
+сочетаний фильтров (ценовой диапазон, наличие) замеряются: счетчики
+фильтров отдельными COUNT-запросами, как без фасетов, и одним чтением
+ячеек; выборка страницы каталога по частичным индексам; полный пересчет
+счетчиков и приращение при переходе остатка через ноль. Для PostgreSQL
+в результаты попадает верхний узел плана каждой выборки (ожидается
+Index Only Scan по индексу с включенными полями карточки).
+"""
+import argparse
+import io
+import random
+import time
+
+from benchmarks.storefront import percentile
+from benchmarks.utils import setup_django, test_database, timer, write_results
+
+
+def naive_counts(price_bucket, in_stock):
+    """Счетчики тех же фильтров, что показывает каталог, запросами COUNT"""
+    from store import facets
+    from store.models import Product
+
+    active = Product.objects.filter(is_active=True)
+    stock_filtered = active.filter(in_stock=True) if in_stock else active
+    bucket_filtered = active.filter(price_bucket=price_bucket) if price_bucket is not None else active
+    return {
+        'buckets': [stock_filtered.filter(price_bucket=index).count() for index in range(len(facets.labels()))],
+        'in_stock': bucket_filtered.filter(in_stock=True).count(),
+        'total': stock_filtered.count(),
+    }
+
+
+def facet_counts(price_bucket, in_stock):
+    from store import facets
+
+    summary = facets.summary(facets.counts(), price_bucket, in_stock)
+    return dict(summary, buckets=[bucket['count'] for bucket in summary['buckets']])
+
+
+def catalog_page(price_bucket, in_stock, page):
+    from store.views import PRODUCTS_PER_PAGE, catalog_products
+
+    offset = (page - 1) * PRODUCTS_PER_PAGE
+    return list(catalog_products('new', price_bucket, in_stock)[offset:offset + PRODUCTS_PER_PAGE + 1])
+
+
+def latency(func, samples):
+    timings = []
+    for sample in samples:
+        started = time.perf_counter()
+        func(*sample)
+        timings.append(time.perf_counter() - started)
+    return {
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+    }
+
+
+def plans(connection):
+    """Верхний узел плана выборки страницы для каждого сочетания фильтров (PostgreSQL)"""
+    import json
+
+    from store.views import PRODUCTS_PER_PAGE, catalog_products
+
+    if connection.vendor != 'postgresql':
+        return None
+    result = {}
+    for name, filters in [('all', (None, False)), ('price', (2, False)),
+                          ('in_stock', (None, True)), ('price_in_stock', (2, True))]:
+        queryset = catalog_products('new', *filters)[:PRODUCTS_PER_PAGE + 1]
+        plan = json.loads(queryset.explain(format='json'))[0]['Plan']
+        while plan.get('Plans') and plan['Node Type'] == 'Limit':
+            plan = plan['Plans'][0]
+        result[name] = f"{plan['Node Type']} using {plan.get('Index Name')}"
+    return result
+
+
+def run(products, lookups, output=None):
+    from django.core.management import call_command
+    from store import facets
+    from store.models import Product, StockBalance
+    from store.services import InventoryService
+
+    results = {'products': products, 'lookups': lookups}
+    with test_database() as connection:
+        results['vendor'] = connection.vendor
+        with timer(results, 'generate_s'):
+            call_command('generate_dataset', '--products', str(products), '--users', '0', '--carts', '0',
+                         '--orders', '0', stdout=io.StringIO())
+        with timer(results, 'recount_s'):
+            facets.recount()
+        results['cells'] = len(facets.counts())
+
+        rng = random.Random(42)
+        buckets = [None] + list(range(len(facets.labels())))
+        filters = [(rng.choice(buckets), rng.random() < 0.5) for _ in range(lookups)]
+        results['counts_naive'] = latency(naive_counts, filters)
+        results['counts_facets'] = latency(facet_counts, filters)
+        results['counts_match'] = all(naive_counts(*sample) == facet_counts(*sample) for sample in filters)
+
+        pages = [(price_bucket, in_stock, rng.randint(1, 5)) for price_bucket, in_stock in filters]
+        results['catalog_page'] = latency(catalog_page, pages)
+        results['plans'] = plans(connection)
+
+        # Приращение счетчиков: остаток проходит через ноль в обе стороны
+        ids = list(StockBalance.objects.filter(quantity__gt=0).values_list('product_id', flat=True)[:lookups])
+        quantities = dict(StockBalance.objects.filter(product_id__in=ids).values_list('product_id', 'quantity'))
+        results['stock_sold_out'] = latency(
+            lambda product_id: InventoryService.update_stock(product_id, -quantities[product_id]),
+            [(product_id,) for product_id in ids],
+        )
+        results['stock_restocked'] = latency(
+            lambda product_id: InventoryService.update_stock(product_id, 1), [(product_id,) for product_id in ids],
+        )
+        results['consistent'] = (
+            {cell: n for cell, n in facets.counts().items() if n}
+            == {cell: n for cell, n in facets.recount().items() if n}
+        )
+        results['active_products'] = Product.objects.filter(is_active=True).count()
+    return write_results('facets', results, output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=1000000)
+    parser.add_argument('--lookups', type=int, default=200)
+    parser.add_argument('--output', help='Path to JSON file with results')
+    args = parser.parse_args()
+    setup_django()
+    run(args.products, args.lookups, args.output)
@@ -0,0 +1,78 @@
+"""
+Собственные накладные расходы RateLimitMiddleware на запрос.
+
+Запуск: python -m benchmarks.ratelimit --iterations 20000 --output results.json
+
+Замеряется process_view без представления: страница без лимита, страница
+с лимитом по ip и пользователю (запрос разрешен и отклонен) и работа
+при недоступном общем кеше (ведра в памяти процесса). Кеш берется из
+настроек (LocMem или Redis через REDIS_URL).
+"""
+import argparse
+import time
+from unittest import mock
+
+from benchmarks.storefront import percentile
+from benchmarks.utils import setup_django, write_results
+
+UNLIMITED = '1000000000/s'
+
+
+def measure(middleware, request, iterations):
+    view_args = (request.resolver_match.func, (), request.resolver_match.kwargs)
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        middleware.process_view(request, *view_args)
+        timings.append(time.perf_counter() - started)
+    return {
+        'mean_us': round(sum(timings) / len(timings) * 1e6, 2),
+        'p50_us': round(percentile(timings, 50) * 1e6, 2),
+        'p99_us': round(percentile(timings, 99) * 1e6, 2),
+    }
+
+
+def run(iterations, output=None):
+    from django.conf import settings
+    from django.contrib.auth import SESSION_KEY
+    from django.core.cache import cache
+    from django.test import RequestFactory
+    from django.test.utils import override_settings
+    from django.urls import resolve, reverse
+    from store.ratelimit import RateLimitMiddleware
+
+    factory = RequestFactory()
+
+    def request_for(url):
+        request = factory.get(url)
+        request.resolver_match = resolve(url)
+        request.session = {SESSION_KEY: '1'}
+        return request
+
+    unlimited = request_for(reverse('product_list'))
+    limited = request_for(reverse('add_to_cart', args=[1]))
+    results = {'iterations': iterations, 'cache': settings.CACHES['default']['BACKEND']}
+    middleware = RateLimitMiddleware(lambda request: None)
+
+    with override_settings(RATE_LIMITS={'add_to_cart': {'ip': UNLIMITED, 'user': UNLIMITED}}):
+        cache.clear()
+        results['no_limit_configured'] = measure(middleware, unlimited, iterations)
+        results['allowed'] = measure(middleware, limited, iterations)
+        with mock.patch('store.ratelimit.caches') as caches:
+            caches.__getitem__.return_value.get.side_effect = ConnectionError('down')
+            results['allowed_in_process_fallback'] = measure(middleware, limited, iterations)
+
+    with override_settings(RATE_LIMITS={'add_to_cart': {'ip': '1/d'}}):
+        cache.clear()
+        results['rejected'] = measure(middleware, limited, iterations)
+    cache.clear()
+    return write_results('ratelimit', results, output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--output', help='Path to JSON file with results')
+    args = parser.parse_args()
+    setup_django()
+    run(args.iterations, args.output)
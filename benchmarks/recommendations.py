@@ -0,0 +1,105 @@
+"""
+Рекомендации "покупают вместе": живой подсчет по OrderItem против
+выдачи из предрассчитанной таблицы ProductNeighbour.
+
+Запуск: python -m benchmarks.recommendations --products 5000 --orders 50000 --output results.json
+
+Данные генерируются командой generate_dataset во временной БД. Замеряются
+полный пересчет, инкрементальный пересчет после 10% новых заказов и задержка
+выдачи для случайных товаров (живой SQL с самосоединением OrderItem и один
+индексированный запрос к ProductNeighbour).
+"""
+import argparse
+import io
+import random
+import time
+
+from benchmarks.storefront import percentile
+from benchmarks.utils import setup_django, test_database, timer, write_results
+
+
+def live_query(product_id, limit):
+    from django.db.models import Count
+    from store.models import OrderItem, Product
+
+    orders = OrderItem.objects.filter(product_id=product_id).exclude(
+        order__status='cancelled'
+    ).values('order_id')
+    neighbours = (
+        OrderItem.objects.filter(order_id__in=orders).exclude(product_id=product_id)
+        .values('product_id').annotate(score=Count('order_id', distinct=True))
+        .order_by('-score', 'product_id')[:limit]
+    )
+    ids = [row['product_id'] for row in neighbours]
+    return list(Product.objects.filter(id__in=ids, is_active=True))
+
+
+def add_orders(count, rng):
+    """Новые заказы из 2-4 товаров (популярные чаще) после первого пересчета"""
+    from django.contrib.auth import get_user_model
+    from store.models import Order, OrderItem, Product
+
+    customer = get_user_model().objects.first()
+    ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+    weights = [1 / rank for rank in range(1, len(ids) + 1)]
+    created = Order.objects.bulk_create([
+        Order(customer=customer, total_amount=0, shipping_address='Bench street 1', status='delivered')
+        for _ in range(count)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order_id=order.id, product_id=product_id, quantity=1, price=1)
+        for order in created
+        for product_id in set(rng.choices(ids, weights, k=rng.randint(2, 4)))
+    ], batch_size=5000)
+
+
+def latency(func, product_ids):
+    timings = []
+    for product_id in product_ids:
+        started = time.perf_counter()
+        func(product_id)
+        timings.append(time.perf_counter() - started)
+    return {
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+    }
+
+
+def run(products, orders, lookups, output=None):
+    from django.core.management import call_command
+    from store.models import Product, ProductNeighbour
+    from store.recommendations import build
+    from store.services import RecommendationService
+
+    results = {'products': products, 'orders': orders, 'lookups': lookups}
+    with test_database() as connection:
+        results['vendor'] = connection.vendor
+        base_orders = orders - orders // 10
+        call_command('generate_dataset', '--products', str(products), '--users', str(max(products // 10, 10)),
+                     '--carts', '0', '--orders', str(base_orders), stdout=io.StringIO())
+        with timer(results, 'full_build_s'):
+            build(full=True)
+        add_orders(orders - base_orders, random.Random(43))
+        with timer(results, 'incremental_build_s'):
+            run_info = build()
+        results['incremental_orders'] = run_info.orders
+        results['stored_pairs'] = ProductNeighbour.objects.count()
+
+        rng = random.Random(42)
+        ids = list(Product.objects.values_list('id', flat=True))
+        sample = [rng.choice(ids) for _ in range(lookups)]
+        results['live_sql'] = latency(lambda product_id: live_query(product_id, 4), sample)
+        results['precomputed'] = latency(RecommendationService.for_product.uncached, sample)
+    return write_results('recommendations', results, output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--lookups', type=int, default=200)
+    parser.add_argument('--output', help='Path to JSON file with results')
+    args = parser.parse_args()
+    setup_django()
+    run(args.products, args.orders, args.lookups, args.output)
@@ -0,0 +1,145 @@
+"""
+Бенчмарк статики на странице каталога: обычная раздача против сборки с хешами и gzip.
+
+Запуск: python -m benchmarks.static_assets --products 50 --requests 50 --output results.json
+
+Для каждого режима статика собирается collectstatic во временный STATIC_ROOT,
+приложение поднимается на локальном HTTP-сервере, и замеряются время до первого
+байта (TTFB) страницы и файлов, байты при первом визите и запросы при повторном.
+"""
+import argparse
+import http.client
+import re
+import tempfile
+import threading
+import time
+from io import StringIO
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+from socketserver import ThreadingMixIn
+
+from benchmarks.storefront import percentile
+from benchmarks.utils import setup_django, test_database, timer, write_results
+
+ASSET_RE = re.compile(r'(?:href|src)="(/static/[^"]+)"')
+MODES = {
+    'plain': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    'pipeline': 'store.staticfiles.CompressedManifestStaticFilesStorage',
+}
+# Браузер не перепроверяет файл, если его можно кешировать хотя бы сутки
+FRESH_SECONDS = 86400
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def fetch(port, path, headers=None):
+    """
+    GET-запрос: время до заголовков ответа, полное время и байты по сети
+    """
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    started = time.perf_counter()
+    conn.request('GET', path, headers=headers or {})
+    response = conn.getresponse()
+    ttfb = time.perf_counter() - started
+    body = response.read()
+    total = time.perf_counter() - started
+    header_bytes = sum(len(name) + len(value) + 4 for name, value in response.getheaders()) + 17
+    conn.close()
+    return response, body, ttfb, total, header_bytes + len(body)
+
+
+def max_age(cache_control):
+    match = re.search(r'max-age=(\d+)', cache_control or '')
+    return int(match.group(1)) if match else 0
+
+
+def run_mode(backend, products, requests):
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+    from django.urls import reverse
+
+    results = {}
+    with tempfile.TemporaryDirectory() as root, override_settings(
+        STATIC_ROOT=root, DEBUG=False, ALLOWED_HOSTS=['127.0.0.1'],
+        STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': backend},
+        },
+    ):
+        with timer(results, 'collectstatic_s'):
+            call_command('collectstatic', interactive=False, verbosity=0, stdout=StringIO())
+
+        server = make_server('127.0.0.1', 0, WSGIHandler(), server_class=ThreadingServer,
+                             handler_class=QuietHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        port = server.server_address[1]
+        try:
+            url = reverse('product_list')
+            page_ttfb, page_bytes, html = [], 0, ''
+            for _ in range(requests):
+                response, body, ttfb, _, size = fetch(port, url, {'Accept-Encoding': 'gzip'})
+                page_ttfb.append(ttfb)
+                page_bytes, html = size, body.decode('utf-8')
+
+            assets = sorted(set(ASSET_RE.findall(html)))
+            first_bytes, asset_ttfb, repeat_requests, repeat_bytes = 0, [], 0, 0
+            for asset in assets:
+                response, _, ttfb, _, size = fetch(port, asset, {'Accept-Encoding': 'gzip'})
+                first_bytes += size
+                asset_ttfb.append(ttfb)
+                # Повторный визит: свежие файлы берутся из кеша браузера без запроса
+                if max_age(response.getheader('Cache-Control')) < FRESH_SECONDS:
+                    repeat_requests += 1
+                    headers = {'Accept-Encoding': 'gzip'}
+                    if response.getheader('ETag'):
+                        headers['If-None-Match'] = response.getheader('ETag')
+                    repeat_bytes += fetch(port, asset, headers)[4]
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    results.update({
+        'assets': assets,
+        'page_ttfb_p50_ms': round(percentile(page_ttfb, 50) * 1000, 2),
+        'page_ttfb_p95_ms': round(percentile(page_ttfb, 95) * 1000, 2),
+        'asset_ttfb_p50_ms': round(percentile(asset_ttfb, 50) * 1000, 2) if asset_ttfb else None,
+        'first_visit_bytes': page_bytes + first_bytes,
+        'first_visit_asset_bytes': first_bytes,
+        'repeat_visit_asset_requests': repeat_requests,
+        'repeat_visit_asset_bytes': repeat_bytes,
+    })
+    return results
+
+
+def run(products, requests, output=None):
+    from store.models import Product
+
+    results = {'products': products, 'requests': requests}
+    with test_database() as connection:
+        results['vendor'] = connection.vendor
+        Product.objects.bulk_create([
+            Product(name=f'Product {i}', slug=f'product-{i}', description=f'Description {i}', price=100)
+            for i in range(products)
+        ])
+        for mode, backend in MODES.items():
+            results[mode] = run_mode(backend, products, requests)
+    return write_results('static_assets', results, output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=50,
+                        help='Catalog page requests per mode')
+    parser.add_argument('--output', help='Path to JSON file with results')
+    args = parser.parse_args()
+    setup_django()
+    run(args.products, args.requests, args.output)
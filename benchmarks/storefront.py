@@ -0,0 +1,174 @@
+"""
+Нагрузочный бенчмарк витрины: пользовательские сценарии через Django test client.
+
+Запуск: python -m benchmarks.storefront --products 10000 --workers 4 --iterations 20 --output results.json
+
+Сценарий покупателя включает набор поискового запроса: подсказки
+запрашиваются на каждые два введенных символа названия товара.
+Для каждого эндпоинта считаются p50/p95/p99, пропускная способность
+и число SQL-запросов на запрос (из заголовка Server-Timing).
+Для нескольких потоков нужен PostgreSQL: SQLite блокирует таблицы при параллельной записи.
+"""
+import argparse
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.utils import setup_django, test_database, write_results
+
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def seed(products, users):
+    """
+    Наполнение БД: товары с остатками и покупатели (без хеширования паролей)
+    """
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+    from store.models import Product, StockBalance
+
+    rng = random.Random(42)
+    Product.objects.bulk_create([
+        Product(name=f'Product {i}', slug=f'product-{i}', description=f'Description {i}',
+                price=rng.randint(100, 100000) / 100)
+        for i in range(products)
+    ], batch_size=5000)
+    StockBalance.objects.bulk_create([
+        StockBalance(product_id=product_id, quantity=10 ** 6)
+        for product_id in Product.objects.values_list('id', flat=True)
+    ], batch_size=5000)
+
+    User = get_user_model()
+    password = make_password(None)
+    User.objects.bulk_create([
+        User(username=f'bench{i}', email=f'bench{i}@example.com', password=password)
+        for i in range(users)
+    ])
+    return list(Product.objects.values_list('id', 'slug', 'name')), list(User.objects.all())
+
+
+class Recorder:
+    """Сбор замеров со всех потоков"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def request(self, client, endpoint, method, url, data=None):
+        started = time.perf_counter()
+        response = getattr(client, method)(url, data)
+        elapsed = time.perf_counter() - started
+        match = QUERIES_RE.search(response.get('Server-Timing', ''))
+        with self.lock:
+            self.latencies[endpoint].append(elapsed)
+            if match:
+                self.queries[endpoint].append(int(match.group(1)))
+            if response.status_code >= 400:
+                self.errors[endpoint] += 1
+        return response
+
+
+def journey(recorder, client, catalog, rng):
+    """
+    Сценарий покупателя: каталог, поиск, карточки товаров, корзина, заказ, кабинет
+    """
+    from django.urls import reverse
+
+    recorder.request(client, 'home', 'get', reverse('home'))
+    recorder.request(client, 'product_list', 'get', reverse('product_list'))
+    product_id, slug, name = rng.choice(catalog)
+    for length in range(2, len(name) + 1, 2):
+        recorder.request(client, 'autocomplete', 'get', reverse('autocomplete'), {'q': name[:length]})
+    for product_id, slug, name in rng.sample(catalog, 3):
+        recorder.request(client, 'product_detail', 'get', reverse('product_detail', args=[slug]))
+        recorder.request(client, 'add_to_cart', 'get', reverse('add_to_cart', args=[product_id]))
+    recorder.request(client, 'cart', 'get', reverse('cart'))
+    recorder.request(client, 'checkout', 'get', reverse('checkout'))
+    response = recorder.request(client, 'checkout_post', 'post', reverse('checkout'), {'address': 'Bench street 1'})
+    if response.status_code == 302:
+        recorder.request(client, 'order_confirmation', 'get', response['Location'])
+    recorder.request(client, 'my_account', 'get', reverse('my_account'))
+
+
+def worker(recorder, user, catalog, iterations, seed_value):
+    from django.db import connections
+    from django.test import Client
+
+    # Ошибки сервера считаются в отчете, а не прерывают прогон
+    client = Client(raise_request_exception=False)
+    client.force_login(user)
+    rng = random.Random(seed_value)
+    try:
+        for _ in range(iterations):
+            journey(recorder, client, catalog, rng)
+    finally:
+        connections.close_all()
+
+
+def run(products, workers, iterations, output=None):
+    from django.test.utils import override_settings, setup_test_environment
+    from store.autocomplete import index as autocomplete_index
+
+    setup_test_environment()
+    results = {'products': products, 'workers': workers, 'iterations': iterations}
+    recorder = Recorder()
+
+    # Все потоки ходят с одного адреса: лимиты частоты исказили бы замеры.
+    # Число запросов к БД берется из Server-Timing, который покупателям не отдается
+    with test_database() as connection, override_settings(RATE_LIMIT_ENABLED=False, SERVER_TIMING_HEADER=True):
+        results['vendor'] = connection.vendor
+        catalog, users = seed(products, workers)
+        # Товары созданы bulk_create без сигналов: индекс подсказок собирается
+        # заново до замеров, а не первым запросом
+        results['autocomplete_build'] = autocomplete_index.build()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(worker, recorder, user, catalog, iterations, i)
+                for i, user in enumerate(users)
+            ]
+            for future in futures:
+                future.result()
+        wall = time.perf_counter() - started
+
+    endpoints = {}
+    for endpoint, latencies in recorder.latencies.items():
+        queries = recorder.queries[endpoint]
+        endpoints[endpoint] = {
+            'requests': len(latencies),
+            'errors': recorder.errors[endpoint],
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'throughput_rps': round(len(latencies) / wall, 2),
+            'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        }
+    results['wall_s'] = round(wall, 3)
+    results['total_rps'] = round(sum(len(v) for v in recorder.latencies.values()) / wall, 2)
+    results['endpoints'] = endpoints
+    return write_results('storefront', results, output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=20,
+                        help='Journeys per worker')
+    parser.add_argument('--output', help='Path to JSON file with results')
+    args = parser.parse_args()
+    setup_django()
+    run(args.products, args.workers, args.iterations, args.output)
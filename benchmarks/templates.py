@@ -0,0 +1,98 @@
+"""
+Время рендеринга по шаблонам: без кеша шаблонов, с кеширующим загрузчиком
+и с кешем фрагмента навигации.
+
+Запуск: python -m benchmarks.templates --requests 50 --output results.json
+
+Страницы запрашиваются через Django test client, время рендеринга берется
+из заголовка Server-Timing (store.middleware.QueryInstrumentationMiddleware).
+Для каждого шаблона выводятся первый (холодный) рендер и p50/p95.
+"""
+import argparse
+import re
+from collections import defaultdict
+
+from benchmarks.storefront import percentile
+from benchmarks.utils import setup_django, test_database, write_results
+
+RENDER_RE = re.compile(r'render;dur=([\d.]+);desc="([^"]*)"')
+LOADERS = ['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader']
+
+
+def modes(templates):
+    base = templates[0]
+    plain = dict(base, OPTIONS=dict(base['OPTIONS'], loaders=LOADERS))
+    cached = dict(base, OPTIONS=dict(base['OPTIONS'], loaders=[('django.template.loaders.cached.Loader', LOADERS)]))
+    return {
+        'no_template_cache': {'TEMPLATES': [plain], 'NAV_CACHE_TIMEOUT': 0},
+        'cached_loader': {'TEMPLATES': [cached], 'NAV_CACHE_TIMEOUT': 0},
+        'cached_loader_and_fragments': {'TEMPLATES': [cached], 'NAV_CACHE_TIMEOUT': 300},
+    }
+
+
+def seed():
+    from django.contrib.auth import get_user_model
+    from store.models import Cart, CartItem, Order, OrderItem, Product, StockBalance
+
+    user = get_user_model().objects.create_user(username='bench', password='bench', first_name='Bench')
+    cart = Cart.objects.create(customer=user)
+    order = Order.objects.create(customer=user, total_amount=0, shipping_address='Bench street 1')
+    products = []
+    for i in range(20):
+        product = Product.objects.create(name=f'Product {i}', description=f'Description {i}', price=100 + i)
+        StockBalance.objects.create(product=product, quantity=100)
+        CartItem.objects.create(cart=cart, product=product, quantity=1)
+        OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+        products.append(product)
+    return user, products[0], order
+
+
+def run(requests, output=None):
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.test import Client
+    from django.test.utils import override_settings, setup_test_environment
+    from django.urls import reverse
+
+    setup_test_environment()
+    results = {'requests': requests}
+    with test_database() as connection:
+        results['vendor'] = connection.vendor
+        user, product, order = seed()
+        urls = [
+            reverse('product_list'),
+            reverse('product_detail', args=[product.slug]),
+            reverse('cart'),
+            reverse('checkout'),
+            reverse('my_account'),
+            reverse('order_detail', args=[order.id]),
+        ]
+        for mode, overrides in modes(settings.TEMPLATES).items():
+            cache.clear()
+            timings = defaultdict(list)
+            with override_settings(SERVER_TIMING_HEADER=True, **overrides):
+                client = Client()
+                client.force_login(user)
+                for _ in range(requests):
+                    for url in urls:
+                        match = RENDER_RE.search(client.get(url)['Server-Timing'])
+                        if match:
+                            timings[match.group(2)].append(float(match.group(1)))
+            results[mode] = {
+                name: {
+                    'first_ms': values[0],
+                    'p50_ms': percentile(values, 50),
+                    'p95_ms': percentile(values, 95),
+                }
+                for name, values in sorted(timings.items())
+            }
+    return write_results('templates', results, output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=50, help='Requests per page and mode')
+    parser.add_argument('--output', help='Path to JSON file with results')
+    args = parser.parse_args()
+    setup_django()
+    run(args.requests, args.output)
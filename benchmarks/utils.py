@@ -0,0 +1,55 @@
+import contextlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    """
+    Настройка окружения Django для запуска бенчмарка как скрипта
+    """
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MyOnlineStore.settings')
+    import django
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database(verbosity=0):
+    """
+    Временная тестовая БД: бенчмарки не трогают рабочие данные
+    """
+    from django.db import connection
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+@contextlib.contextmanager
+def timer(results, key):
+    """
+    Замер времени блока в секундах, результат пишется в results[key]
+    """
+    started = time.perf_counter()
+    yield
+    results[key] = round(time.perf_counter() - started, 4)
+
+
+def write_results(name, results, output=None):
+    """
+    Сохранение результатов в JSON (для сравнения между коммитами) и вывод в консоль
+    """
+    payload = {'benchmark': name, 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}
+    text = json.dumps(payload, ensure_ascii=False, indent=2)
+    if output:
+        Path(output).write_text(text, encoding='utf-8')
+    print(text)
+    return payload
@@ -0,0 +1,101 @@
+"""
+Конфигурация gunicorn для продакшена: gunicorn MyOnlineStore.wsgi:application
+
+Приложение загружается и прогревается в мастере до fork (preload_app),
+воркеры делят его память через copy-on-write. Каждый воркер после fork
+открывает свои соединения с БД и запускает слушатель шины инвалидации кеша.
+Воркеры плавно перезапускаются после GUNICORN_MAX_REQUESTS запросов.
+Время холодного старта и память мастера и воркеров пишутся в лог.
+
+Для ASGI: GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker
+и приложение MyOnlineStore.asgi:application.
+"""
+import multiprocessing
+import os
+import time
+
+STARTED = time.monotonic()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+threads = int(os.environ.get('GUNICORN_THREADS', '1'))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+
+# Плавный перезапуск воркеров: разброс, чтобы они не перезапускались одновременно
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', '200'))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+if preload_app:
+    # Слушатель шины запускается в воркерах (post_worker_init), а не в мастере
+    os.environ['APP_SERVER_PRELOAD'] = '1'
+
+
+def warmup_autocomplete(log):
+    # Индекс подсказок: с preload_app строится один раз в мастере
+    # и достается воркерам через copy-on-write
+    from django.conf import settings
+    from django.db import DatabaseError
+    from store.autocomplete import index
+
+    if not settings.AUTOCOMPLETE_PRELOAD:
+        return
+    try:
+        stats = index.build()
+    except DatabaseError:
+        log.exception('Autocomplete index was not built, it will be built on first request')
+        return
+    log.info('Autocomplete index: %(products)s products, %(bytes)s bytes in %(build_seconds)ss', stats)
+
+
+def when_ready(server):
+    # Вызывается в мастере до создания воркеров
+    from MyOnlineStore.warmup import memory_usage, prepare_fork, warmup_code
+
+    if preload_app:
+        stats = warmup_code()
+        server.log.info('Warmup: %(urls)s URLs, %(templates)s templates in %(seconds)ss', stats)
+        warmup_autocomplete(server.log)
+        prepare_fork()
+    server.log.info('Master ready in %.2fs, memory %s KiB', time.monotonic() - STARTED, memory_usage())
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.monotonic()
+
+
+def post_worker_init(worker):
+    # Воркер загрузил приложение, но еще не принимает запросы
+    from MyOnlineStore.warmup import memory_usage, warmup_code, warmup_connections
+    from store.counters import counters
+    from store.invalidation import start_listener
+
+    if not preload_app:
+        warmup_code()
+        warmup_autocomplete(worker.log)
+    stats = warmup_connections()
+    start_listener()
+    counters.start()
+    worker.log.info(
+        'Worker %s ready in %.3fs after fork (%s databases), memory %s KiB',
+        worker.pid, time.monotonic() - worker.forked_at, stats['databases'], memory_usage(),
+    )
+
+
+def worker_exit(server, worker):
+    from django.db import connections
+    from store.counters import counters
+    from store.invalidation import bus
+
+    bus.stop(timeout=1)
+    # Накопленные счетчики не теряются при перезапуске воркера
+    counters.stop(timeout=1)
+    connections.close_all()
+    server.log.info('Worker %s exited', worker.pid)
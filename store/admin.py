@@ -1,11 +1,119 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.utils import timezone
 
+from . import facets
+from .cache import invalidate_tags
 from .models import Product, Order, OrderItem, CartItem, Cart, Inventory
+from .pagination import EstimatedCountPaginator
 
-# Register your models here.
-admin.site.register(Product)
-admin.site.register(Order)
-admin.site.register(OrderItem)
-admin.site.register(CartItem)
-admin.site.register(Cart)
-admin.site.register(Inventory)
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Список для больших таблиц: оценка числа строк вместо COUNT(*),
+    без второго подсчета всей таблицы и без выпадающих списков по FK
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+def bulk_update_action(field, value, description, tag, after=None):
+    """
+    Действие админки, которое одним UPDATE меняет поле у выбранных записей.
+    update() не вызывает сигналы, поэтому кеш сбрасывается явно, а зависящие
+    от поля данные пересчитывает after()
+    """
+    def action(modeladmin, request, queryset):
+        values = {field: value}
+        # update() не трогает auto_now: без этого изменение не увидят те,
+        # кто дочитывает записи по updated_at (store.autocomplete)
+        if any(f.name == 'updated_at' for f in queryset.model._meta.concrete_fields):
+            values['updated_at'] = timezone.now()
+        updated = queryset.update(**values)
+        if after is not None:
+            after()
+        invalidate_tags(tag)
+        modeladmin.message_user(request, f'Обновлено записей: {updated}', messages.SUCCESS)
+
+    action.__name__ = f'set_{field}_{value}'
+    return admin.action(description=description)(action)
+
+
+@admin.register(Product)
+class ProductAdmin(LargeTableAdmin):
+    list_display = ('name', 'price', 'is_active', 'updated_at')
+    list_filter = ('is_active',)
+    search_fields = ('name',)
+    prepopulated_fields = {'slug': ('name',)}
+    actions = [
+        bulk_update_action('is_active', True, 'Сделать активными', 'product', after=facets.recount),
+        bulk_update_action('is_active', False, 'Снять с продажи', 'product', after=facets.recount),
+    ]
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+    autocomplete_fields = ('product',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+
+@admin.register(Order)
+class OrderAdmin(LargeTableAdmin):
+    list_display = ('id', 'customer', 'order_date', 'status', 'total_amount')
+    list_select_related = ('customer',)
+    # Фильтр по order_date без статуса не обслуживает ни один индекс:
+    # order_status_date_idx начинается со status
+    list_filter = ('status',)
+    search_fields = ('^customer__username', '^customer__email')
+    raw_id_fields = ('customer',)
+    inlines = [OrderItemInline]
+    actions = [
+        bulk_update_action('status', status, f'Статус: {label}', 'order')
+        for status, label in Order.STATUS_CHOICES
+    ]
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(LargeTableAdmin):
+    list_display = ('id', 'order', 'product', 'quantity', 'price')
+    list_select_related = ('order__customer', 'product')
+    raw_id_fields = ('order',)
+    autocomplete_fields = ('product',)
+
+
+class CartItemInline(admin.TabularInline):
+    model = CartItem
+    extra = 0
+    autocomplete_fields = ('product',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+
+@admin.register(Cart)
+class CartAdmin(LargeTableAdmin):
+    list_display = ('id', 'customer', 'created_at')
+    list_select_related = ('customer',)
+    search_fields = ('^customer__username',)
+    raw_id_fields = ('customer',)
+    inlines = [CartItemInline]
+
+
+@admin.register(CartItem)
+class CartItemAdmin(LargeTableAdmin):
+    list_display = ('id', 'cart', 'product', 'quantity')
+    list_select_related = ('cart__customer', 'product')
+    raw_id_fields = ('cart',)
+    autocomplete_fields = ('product',)
+
+
+@admin.register(Inventory)
+class InventoryAdmin(LargeTableAdmin):
+    list_display = ('product', 'quantity', 'last_updated')
+    list_select_related = ('product',)
+    search_fields = ('product__name',)
+    autocomplete_fields = ('product',)
+    actions = [bulk_update_action('quantity', 0, 'Обнулить остаток', 'stock')]
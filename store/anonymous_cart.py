@@ -0,0 +1,162 @@
+"""
+Корзина покупателя, который еще не вошел: хранится в подписанной cookie,
+поэтому просмотр и изменение корзины не пишут в БД и не создают сессию.
+
+Состав кодируется компактно: "id:количество" через запятую, id в base36
+("2s:1,a3f:2"). Cookie подписывается (django.core.signing), подделанное или
+испорченное значение считается пустой корзиной. Для показа цены и названия
+читаются одним запросом по id. При входе (сигнал user_logged_in) позиции
+переносятся в Cart пользователя одним INSERT ... ON CONFLICT DO UPDATE,
+а cookie удаляется.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.http import base36_to_int, int_to_base36
+
+from .models import Cart, CartItem, Product
+
+SALT = 'store.anonymous_cart'
+MAX_QUANTITY = 99
+
+
+def cookie_name():
+    return getattr(settings, 'ANONYMOUS_CART_COOKIE', 'cart')
+
+
+def max_items():
+    return getattr(settings, 'ANONYMOUS_CART_MAX_ITEMS', 50)
+
+
+def encode(items):
+    """{product_id: количество} -> строка для cookie"""
+    return ','.join(f'{int_to_base36(product_id)}:{quantity}' for product_id, quantity in items.items())
+
+
+def decode(value):
+    """Строка из cookie -> {product_id: количество}; ошибочные позиции отбрасываются"""
+    items = {}
+    for part in (value or '').split(','):
+        product_id, _, quantity = part.partition(':')
+        try:
+            product_id, quantity = base36_to_int(product_id), int(quantity)
+        except ValueError:
+            continue
+        if product_id > 0 and quantity > 0:
+            items[product_id] = min(quantity, MAX_QUANTITY)
+    return dict(list(items.items())[:max_items()])
+
+
+class AnonymousCartItem:
+    """Позиция корзины из cookie с теми же атрибутами, что у CartItem в шаблоне"""
+
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+
+    @property
+    def price(self):
+        return self.product.price * self.quantity
+
+
+class AnonymousCart:
+    """
+    Корзина из cookie текущего запроса. Читается лениво; изменения
+    записывает в ответ AnonymousCartMiddleware
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self._items = None
+        self.modified = False
+
+    @property
+    def items(self):
+        if self._items is None:
+            value = self.request.get_signed_cookie(
+                cookie_name(), default=None, salt=SALT,
+                max_age=getattr(settings, 'ANONYMOUS_CART_MAX_AGE', 30 * 86400),
+            )
+            self._items = decode(value)
+        return self._items
+
+    def __len__(self):
+        return sum(self.items.values())
+
+    def add(self, product_id, quantity=1):
+        items = self.items
+        if product_id not in items and len(items) >= max_items():
+            return False
+        items[product_id] = min(items.get(product_id, 0) + quantity, MAX_QUANTITY)
+        self.modified = True
+        return True
+
+    def remove(self, product_id):
+        if self.items.pop(product_id, None) is not None:
+            self.modified = True
+
+    def clear(self):
+        self._items = {}
+        self.modified = True
+
+    def lines(self):
+        """Позиции с товарами одним запросом; снятые с продажи пропускаются"""
+        if not self.items:
+            return []
+        products = Product.objects.filter(id__in=list(self.items), is_active=True).in_bulk()
+        return [
+            AnonymousCartItem(products[product_id], quantity)
+            for product_id, quantity in self.items.items() if product_id in products
+        ]
+
+    def update_response(self, response):
+        if not self.modified:
+            return
+        if self.items:
+            response.set_signed_cookie(
+                cookie_name(), encode(self.items), salt=SALT,
+                max_age=getattr(settings, 'ANONYMOUS_CART_MAX_AGE', 30 * 86400),
+                secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+            )
+        else:
+            response.delete_cookie(cookie_name(), samesite='Lax')
+
+
+class AnonymousCartMiddleware:
+    """request.anonymous_cart и запись измененной корзины в cookie ответа"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.anonymous_cart = AnonymousCart(request)
+        response = self.get_response(request)
+        request.anonymous_cart.update_response(response)
+        return response
+
+
+def merge(user, items):
+    """
+    Перенос позиций в корзину пользователя одним upsert: количество
+    складывается с уже лежащим в корзине. Возвращает число перенесенных позиций
+    """
+    active = set(Product.objects.filter(id__in=list(items), is_active=True).values_list('id', flat=True))
+    rows = [(product_id, quantity) for product_id, quantity in items.items() if product_id in active]
+    if not rows:
+        return 0
+
+    cart_table = connection.ops.quote_name(CartItem._meta.db_table)
+    with transaction.atomic():
+        cart, _ = Cart.objects.get_or_create(customer=user)
+        params = []
+        for product_id, quantity in rows:
+            params.extend([cart.id, product_id, quantity])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {cart_table} (cart_id, product_id, quantity) '
+                f'VALUES {", ".join(["(%s, %s, %s)"] * len(rows))} '
+                f'ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = {cart_table}.quantity + EXCLUDED.quantity',
+                params,
+            )
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+    return len(rows)
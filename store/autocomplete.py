@@ -0,0 +1,386 @@
+"""
+Подсказки поиска по мере ввода из индекса префиксов в памяти процесса.
+
+Названия товаров нормализуются (casefold, ё -> е, кириллица -> латиница),
+поэтому "смарт", "Smart" и "smart" находят "Смартфон". Индекс - отсортированный
+массив начал слов поверх одного блока байтов: поиск - бинарный поиск и
+короткий проход вперед, без запросов к БД.
+
+Неизменяемое ядро (PrefixIndex) дополняется словарем изменений: сигналы
+Product в этом процессе и периодическая дочитка товаров с updated_at после
+последней (изменения из других процессов и bulk-операций). Начала слов
+измененных названий лежат в отсортированном списке с готовыми ключами, и
+поиск по изменениям - тот же бинарный поиск. Когда изменений становится
+много, ядро пересобирается в фоновом потоке из памяти, без БД.
+Объем ядра ограничен AUTOCOMPLETE_MAX_BYTES.
+"""
+import bisect
+import datetime
+import heapq
+import logging
+import re
+import threading
+import time
+from array import array
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'c',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya',
+})
+# Варианты латинского написания, которые приводятся к одному виду
+LATIN_FOLDS = (('kh', 'h'), ('ts', 'c'), ('ja', 'ya'), ('ju', 'yu'))
+NON_WORD_RE = re.compile(r'[\W_]+')
+# Разделитель названий в блоке ключей: меньше пробела и любых букв
+SEPARATOR = b'\n'
+# Разделитель названия и slug в блоке для выдачи
+FIELD_SEPARATOR = '\x1f'
+# Начал слов в одной порции сортировки при сборке
+SORT_CHUNK = 200000
+# Совпадений, просматриваемых для ранжирования, на одну подсказку
+SCAN_FACTOR = 8
+
+
+def normalize(text):
+    """Ключ поиска: casefold, транслитерация, слова через один пробел"""
+    text = NON_WORD_RE.sub(' ', text.casefold()).translate(TRANSLIT)
+    for variant, folded in LATIN_FOLDS:
+        text = text.replace(variant, folded)
+    return ' '.join(text.split())
+
+
+def word_starts(key, max_words):
+    """Смещения начал слов в байтах ключа"""
+    starts = [0]
+    position = key.find(b' ')
+    while position != -1 and len(starts) < max_words:
+        starts.append(position + 1)
+        position = key.find(b' ', position + 1)
+    return starts
+
+
+class PrefixIndex:
+    """
+    Неизменяемый индекс префиксов. Записи (product_id, name, slug) хранятся
+    по возрастанию product_id, ключи - в одном блоке байтов, начала слов
+    отсортированы по тексту от начала слова до конца названия
+    """
+
+    def __init__(self, entries, max_words=4, max_bytes=None):
+        self.ids = array('q')
+        self.key_offsets = array('I')
+        self.display_offsets = array('I', [0])
+        keys, display = bytearray(), []
+        display_size = 0
+        starts = array('I')
+        self.truncated = False
+
+        for product_id, name, slug in entries:
+            key = normalize(name).encode()
+            if not key:
+                continue
+            text = f'{name}{FIELD_SEPARATOR}{slug}'.encode()
+            words = word_starts(key, max_words)
+            size = len(key) + len(text) + 8 + 4 + 4 + 8 * len(words)
+            if max_bytes is not None and len(keys) + display_size + size > max_bytes:
+                self.truncated = True
+                break
+            self.ids.append(product_id)
+            self.key_offsets.append(len(keys))
+            starts.extend(len(keys) + start for start in words)
+            keys += key + SEPARATOR
+            display.append(text)
+            display_size += len(text)
+            self.display_offsets.append(display_size)
+
+        self.keys = bytes(keys)
+        self.display = b''.join(display)
+        del keys, display
+        self.starts = self._sort(starts)
+        key_offsets = self.key_offsets
+        self.owners = array('I', (bisect.bisect_right(key_offsets, start) - 1 for start in self.starts))
+
+    def _sort(self, starts):
+        """
+        Сортировка начал слов по тексту. Ключи сортировки - копии байтов,
+        поэтому сортируются порции по SORT_CHUNK и затем сливаются: пик памяти
+        при сборке ограничен одной порцией
+        """
+        keys, find = self.keys, self.keys.find
+
+        def suffix(start):
+            return keys[start:find(SEPARATOR, start)]
+
+        chunks = [
+            array('I', sorted(starts[i:i + SORT_CHUNK], key=suffix))
+            for i in range(0, len(starts), SORT_CHUNK)
+        ]
+        if len(chunks) == 1:
+            return chunks[0]
+        return array('I', heapq.merge(*chunks, key=suffix))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        arrays = (self.ids, self.key_offsets, self.display_offsets, self.starts, self.owners)
+        return len(self.keys) + len(self.display) + sum(a.itemsize * len(a) for a in arrays)
+
+    def entry(self, owner):
+        text = self.display[self.display_offsets[owner]:self.display_offsets[owner + 1]].decode()
+        name, _, slug = text.partition(FIELD_SEPARATOR)
+        return self.ids[owner], name, slug
+
+    def key(self, owner):
+        start = self.key_offsets[owner]
+        return self.keys[start:self.keys.find(SEPARATOR, start)]
+
+    def entries(self):
+        for owner in range(len(self.ids)):
+            yield self.entry(owner)
+
+    def find(self, product_id):
+        """Номер записи товара или None"""
+        owner = bisect.bisect_left(self.ids, product_id)
+        if owner < len(self.ids) and self.ids[owner] == product_id:
+            return owner
+        return None
+
+    def search(self, prefix, scan):
+        """
+        До scan совпадений с prefix (байты нормализованного запроса):
+        пары (номер записи, совпадение с начала названия)
+        """
+        keys, starts, size = self.keys, self.starts, len(prefix)
+        low, high = 0, len(starts)
+        while low < high:
+            middle = (low + high) // 2
+            start = starts[middle]
+            if keys[start:start + size] < prefix:
+                low = middle + 1
+            else:
+                high = middle
+        for i in range(low, min(low + scan, len(starts))):
+            start = starts[i]
+            if keys[start:start + size] != prefix:
+                break
+            owner = self.owners[i]
+            yield owner, start == self.key_offsets[owner]
+
+
+class Autocomplete:
+    """Индекс подсказок процесса: ядро PrefixIndex и изменения поверх него"""
+
+    def __init__(self):
+        self.core = None
+        # product_id -> (name, slug) или None, если товар удален или снят с продажи
+        self.changes = {}
+        # Начала слов активных изменений: (текст от начала слова, product_id,
+        # с начала названия, ключ) по возрастанию. Заменяется копией целиком,
+        # поэтому поиск читает его без блокировки
+        self.overlay = []
+        self.watermark = None
+        self.last_refresh = 0.0
+        self.build_seconds = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._compacting = False
+
+    @staticmethod
+    def option(name, default):
+        return getattr(settings, f'AUTOCOMPLETE_{name}', default)
+
+    @property
+    def ready(self):
+        return self.core is not None
+
+    def build(self):
+        """Полная сборка из активных товаров БД"""
+        from .models import Product
+
+        started = time.perf_counter()
+        watermark = timezone.now()
+        rows = Product.objects.filter(is_active=True).order_by('id').values_list(
+            'id', 'name', 'slug'
+        ).iterator(chunk_size=5000)
+        core = PrefixIndex(rows, self.option('MAX_WORDS', 4), self.option('MAX_BYTES', None))
+        with self._lock:
+            self.core, self.changes, self.overlay = core, {}, []
+            self.watermark, self.last_refresh = watermark, time.monotonic()
+        self.build_seconds = round(time.perf_counter() - started, 3)
+        if core.truncated:
+            logger.warning('Autocomplete index reached AUTOCOMPLETE_MAX_BYTES, %s products indexed', len(core))
+        logger.info('Autocomplete index built: %s', self.stats())
+        return self.stats()
+
+    def clear(self):
+        """Забыть индекс: следующий поиск соберет его заново"""
+        with self._lock:
+            self.core, self.changes, self.overlay = None, {}, []
+
+    def ensure_built(self):
+        if self.core is None:
+            with self._build_lock:
+                if self.core is None:
+                    self.build()
+
+    def apply(self, product_id, name=None, slug=None, active=False):
+        """Изменение товара: новая версия записи или удаление из подсказок"""
+        if self.core is None:
+            return
+        value = (name, slug) if active else None
+        with self._lock:
+            if value == self._current(product_id):
+                return
+            overlay = [word for word in self.overlay if word[1] != product_id]
+            if value is not None:
+                for word in self._words(product_id, name):
+                    bisect.insort(overlay, word)
+            self.changes[product_id] = value
+            self.overlay = overlay
+        if len(self.changes) >= self.option('COMPACT_THRESHOLD', 500):
+            self.compact()
+
+    def apply_product(self, product):
+        self.apply(product.id, product.name, product.slug, product.is_active)
+
+    def refresh(self):
+        """Дочитать товары, измененные после предыдущей сборки или дочитки"""
+        from .models import Product
+
+        # Перекрытие: транзакция могла зафиксироваться позже, чем поставила updated_at
+        overlap = datetime.timedelta(seconds=self.option('REFRESH_OVERLAP', 60))
+        watermark = timezone.now()
+        rows = Product.objects.filter(updated_at__gte=self.watermark - overlap).values_list(
+            'id', 'name', 'slug', 'is_active'
+        )
+        for product_id, name, slug, active in rows.iterator(chunk_size=1000):
+            self.apply(product_id, name, slug, active)
+        self.watermark = watermark
+
+    def maybe_refresh(self):
+        if time.monotonic() - self.last_refresh < self.option('REFRESH_INTERVAL', 10):
+            return
+        # Дочитывает один поток, остальные отвечают по текущему индексу
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self.last_refresh = time.monotonic()
+            self.refresh()
+        except DatabaseError:
+            logger.exception('Autocomplete refresh failed')
+        finally:
+            self._refresh_lock.release()
+
+    def compact(self):
+        """Пересборка ядра с изменениями в фоновом потоке"""
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        threading.Thread(target=self._compact, name='autocomplete-compact', daemon=True).start()
+
+    def _compact(self):
+        try:
+            core, changes = self.core, dict(self.changes)
+            kept = (entry for entry in core.entries() if entry[0] not in changes)
+            changed = sorted(
+                (product_id, name, slug) for product_id, value in changes.items()
+                if value is not None for name, slug in [value]
+            )
+            new_core = PrefixIndex(
+                heapq.merge(kept, changed), self.option('MAX_WORDS', 4), self.option('MAX_BYTES', None)
+            )
+            with self._lock:
+                self.core = new_core
+                # Изменения, пришедшие во время сборки, остаются поверх нового ядра
+                self.changes = {
+                    product_id: value for product_id, value in self.changes.items()
+                    if product_id not in changes or changes[product_id] is not value
+                }
+                self.overlay = sorted(
+                    word for product_id, value in self.changes.items()
+                    if value is not None for word in self._words(product_id, value[0])
+                )
+        finally:
+            self._compacting = False
+
+    def _words(self, product_id, name):
+        """Записи overlay для начал слов названия"""
+        key = normalize(name).encode()
+        if not key:
+            return []
+        return [(key[start:], product_id, start == 0, key)
+                for start in word_starts(key, self.option('MAX_WORDS', 4))]
+
+    def _current(self, product_id):
+        if product_id in self.changes:
+            return self.changes[product_id]
+        owner = self.core.find(product_id)
+        if owner is None:
+            return None
+        _, name, slug = self.core.entry(owner)
+        return name, slug
+
+    def search(self, query, limit=10):
+        """
+        Подсказки для запроса: список (product_id, name, slug). Сначала
+        совпадения с начала названия, затем с начала любого слова
+        """
+        prefix = normalize(query)
+        if len(prefix) < self.option('MIN_LENGTH', 2):
+            return []
+        self.ensure_built()
+        self.maybe_refresh()
+        core, changes, overlay = self.core, self.changes, self.overlay
+        encoded = prefix.encode()
+        scan = limit * SCAN_FACTOR
+
+        # product_id -> ((не с начала названия, ключ), запись ядра или (name, slug))
+        found = {}
+        for owner, at_start in core.search(encoded, scan):
+            product_id = core.ids[owner]
+            if product_id not in changes:
+                # Несколько слов названия подходят под префикс: остается лучшее совпадение
+                rank = (not at_start, core.key(owner))
+                if product_id not in found or rank < found[product_id][0]:
+                    found[product_id] = (rank, owner)
+        start = bisect.bisect_left(overlay, (encoded,))
+        for suffix, product_id, at_start, key in overlay[start:start + scan]:
+            if not suffix.startswith(encoded):
+                break
+            value = changes.get(product_id)
+            if value is not None:
+                rank = (not at_start, key)
+                if product_id not in found or rank < found[product_id][0]:
+                    found[product_id] = (rank, value)
+        ranked = sorted(found.items(), key=lambda item: item[1][0])[:limit]
+        return [
+            core.entry(source) if isinstance(source, int) else (product_id, *source)
+            for product_id, (_, source) in ranked
+        ]
+
+    def stats(self):
+        core = self.core
+        return {
+            'products': len(core) if core else 0,
+            'keys': len(core.starts) if core else 0,
+            'changes': len(self.changes),
+            'bytes': core.nbytes if core else 0,
+            'max_bytes': self.option('MAX_BYTES', None),
+            'truncated': core.truncated if core else False,
+            'build_seconds': self.build_seconds,
+        }
+
+
+index = Autocomplete()
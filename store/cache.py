@@ -0,0 +1,260 @@
+import functools
+import hashlib
+import math
+import random
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import QuerySet
+
+# Коэффициент вероятностного досрочного обновления (XFetch): чем больше, тем раньше
+EARLY_REFRESH_BETA = 1.0
+TTL_JITTER = 0.1
+LOCK_TIMEOUT = 10
+WAIT_ATTEMPTS = 20
+WAIT_INTERVAL = 0.05
+
+
+class Entry:
+    """Закешированное значение с метаданными для досрочного обновления"""
+    __slots__ = ('value', 'expires_at', 'delta', 'tag_versions')
+
+    def __init__(self, value, expires_at, delta, tag_versions):
+        self.value = value
+        self.expires_at = expires_at
+        self.delta = delta
+        self.tag_versions = tag_versions
+
+    def __getstate__(self):
+        return (self.value, self.expires_at, self.delta, self.tag_versions)
+
+    def __setstate__(self, state):
+        self.value, self.expires_at, self.delta, self.tag_versions = state
+
+    def should_refresh(self, now):
+        # XFetch: вероятность пересчета растет по мере приближения к истечению
+        # и пропорциональна времени вычисления значения
+        return now - self.delta * EARLY_REFRESH_BETA * math.log(1 - random.random()) >= self.expires_at
+
+
+class TwoTierCache:
+    """
+    Двухуровневый кеш: ограниченный LRU в памяти процесса перед общим
+    бэкендом Django. Защита от лавины запросов: TTL с разбросом,
+    вероятностное досрочное обновление и единственный пересчет ключа
+    (блокировка через cache.add). Инвалидация по тегам через версии тегов
+    """
+
+    def __init__(self, alias='default', local_max_entries=1024, local_ttl=5):
+        self.alias = alias
+        self.local_max_entries = local_max_entries
+        self.local_ttl = local_ttl
+        self._local = OrderedDict()
+        self._local_tags = defaultdict(set)
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: defaultdict(int))
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def get_or_set(self, family, key, compute, ttl, tags=()):
+        now = time.time()
+        entry = self._local_get(key, now)
+        if entry is not None:
+            self._count(family, 'local_hits')
+            return entry.value
+
+        versions = self._tag_versions(tags)
+        entry = self.shared.get(key)
+        if entry is not None and entry.tag_versions != versions:
+            entry = None
+
+        if entry is not None:
+            if not entry.should_refresh(now):
+                self._local_set(key, entry, tags, now)
+                self._count(family, 'shared_hits')
+                return entry.value
+            # Значение скоро истечет: пересчитывает один, остальные отдают текущее
+            if not self._acquire(key):
+                self._count(family, 'stale_hits')
+                return entry.value
+            self._count(family, 'early_refreshes')
+        elif not self._acquire(key):
+            # Значение уже вычисляется другим процессом - ждем его
+            for _ in range(WAIT_ATTEMPTS):
+                time.sleep(WAIT_INTERVAL)
+                entry = self.shared.get(key)
+                if entry is not None and entry.tag_versions == versions:
+                    self._local_set(key, entry, tags, time.time())
+                    self._count(family, 'shared_hits')
+                    return entry.value
+            self._count(family, 'lock_timeouts')
+            return compute()
+        else:
+            self._count(family, 'misses')
+
+        try:
+            started = time.time()
+            value = compute()
+            finished = time.time()
+            ttl = ttl * random.uniform(1 - TTL_JITTER, 1 + TTL_JITTER)
+            entry = Entry(value, finished + ttl, finished - started, versions)
+            self.shared.set(key, entry, timeout=ttl)
+            self._local_set(key, entry, tags, finished)
+            return value
+        finally:
+            self.shared.delete(f'lock:{key}')
+
+    def invalidate_tags(self, *tags):
+        """
+        Сброс всех значений с указанными тегами
+        """
+        for tag in tags:
+            try:
+                self.shared.incr(f'tag:{tag}')
+            except ValueError:
+                self.shared.set(f'tag:{tag}', time.time_ns(), timeout=None)
+        self.invalidate_local(*tags)
+
+    def invalidate_local(self, *tags):
+        """
+        Сброс значений с указанными тегами только в памяти процесса
+        """
+        with self._lock:
+            for tag in tags:
+                for key in list(self._local_tags.get(tag, ())):
+                    self._local_drop(key)
+
+    def apply_remote(self, *tags):
+        """
+        Применение инвалидации, опубликованной другим процессом. Версии тегов
+        в общем бэкенде уже увеличены отправителем, если бэкенд действительно общий
+        """
+        if isinstance(self.shared, (LocMemCache, DummyCache)):
+            self.invalidate_tags(*tags)
+        else:
+            self.invalidate_local(*tags)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+            self._local_tags.clear()
+
+    def stats(self):
+        """
+        Счетчики и доля попаданий по семействам ключей
+        """
+        result = {}
+        for family, counters in self._stats.items():
+            hits = counters['local_hits'] + counters['shared_hits'] + counters['stale_hits']
+            total = hits + counters['misses'] + counters['early_refreshes'] + counters['lock_timeouts']
+            result[family] = dict(counters, hit_ratio=round(hits / total, 4) if total else None)
+        return result
+
+    def reset_stats(self):
+        self._stats.clear()
+
+    def _count(self, family, name):
+        self._stats[family][name] += 1
+
+    def _acquire(self, key):
+        return self.shared.add(f'lock:{key}', 1, timeout=LOCK_TIMEOUT)
+
+    def _tag_versions(self, tags):
+        if not tags:
+            return ()
+        keys = [f'tag:{tag}' for tag in tags]
+        versions = self.shared.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                self.shared.add(key, time.time_ns(), timeout=None)
+                versions[key] = self.shared.get(key)
+        return tuple(versions[key] for key in keys)
+
+    def _local_get(self, key, now):
+        with self._lock:
+            item = self._local.get(key)
+            if item is None:
+                return None
+            entry, local_expires_at, _ = item
+            if now >= local_expires_at:
+                self._local_drop(key)
+                return None
+            self._local.move_to_end(key)
+            return entry
+
+    def _local_set(self, key, entry, tags, now):
+        with self._lock:
+            self._local_drop(key)
+            self._local[key] = (entry, min(entry.expires_at, now + self.local_ttl), tuple(tags))
+            for tag in tags:
+                self._local_tags[tag].add(key)
+            while len(self._local) > self.local_max_entries:
+                self._local_drop(next(iter(self._local)))
+
+    def _local_drop(self, key):
+        """Удаление ключа из LRU и из множеств его тегов (под self._lock)"""
+        item = self._local.pop(key, None)
+        if item is None:
+            return
+        for tag in item[2]:
+            keys = self._local_tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._local_tags[tag]
+
+
+service_cache = TwoTierCache(
+    local_max_entries=getattr(settings, 'SERVICE_CACHE_LOCAL_MAX_ENTRIES', 1024),
+    local_ttl=getattr(settings, 'SERVICE_CACHE_LOCAL_TTL', 5),
+)
+
+
+def make_key(family, args, kwargs):
+    raw = repr((args, sorted(kwargs.items())))
+    return f'svc:{family}:{hashlib.md5(raw.encode("utf-8")).hexdigest()}'
+
+
+def cached(family, ttl=60, tags=()):
+    """
+    Кеширование результата метода сервиса. QuerySet вычисляется до
+    сохранения, поэтому из кеша возвращается уже заполненный QuerySet.
+    Кешируются только ограниченные выборки (срез): QuerySet без среза
+    прочитал бы и положил в оба уровня кеша всю таблицу
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not getattr(settings, 'SERVICE_CACHE_ENABLED', True):
+                return func(*args, **kwargs)
+
+            def compute():
+                result = func(*args, **kwargs)
+                if isinstance(result, QuerySet):
+                    if result.query.high_mark is None:
+                        raise TypeError(f'{func.__qualname__} returns an unbounded QuerySet, slice it before caching')
+                    len(result)
+                return result
+
+            return service_cache.get_or_set(family, make_key(family, args, kwargs), compute, ttl, tags)
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def invalidate_tags(*tags):
+    """
+    Сброс значений с тегами в этом процессе и публикация в шину для остальных
+    """
+    from .invalidation import bus
+
+    service_cache.invalidate_tags(*tags)
+    bus.publish(*tags)
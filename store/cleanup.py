@@ -0,0 +1,132 @@
+"""
+Очистка брошенных корзин и истекших сессий небольшими пачками.
+
+Строки выбираются по порядку ключа (updated_at, id) для корзин и
+(expire_date, session_key) для сессий: каждая следующая пачка продолжает
+с последней строки предыдущей и читает индекс, а не таблицу целиком.
+Каждая пачка удаляется в своей короткой транзакции, поэтому блокировки
+держатся миллисекунды, а WAL для реплик пишется порциями. Темп задает
+вызывающий код (команда cleanup_expired): паузы между пачками и ожидание,
+пока реплики догонят мастер.
+"""
+import datetime
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Cart, CartItem
+
+BATCH_SIZE = 1000
+DB_SESSION_ENGINES = ('django.contrib.sessions.backends.db', 'django.contrib.sessions.backends.cached_db')
+
+
+def cart_cutoff(days=None):
+    """Корзины, не менявшиеся с этого момента, считаются брошенными"""
+    if days is None:
+        days = getattr(settings, 'CART_EXPIRY_DAYS', 30)
+    return timezone.now() - datetime.timedelta(days=days)
+
+
+def sessions_in_database():
+    return settings.SESSION_ENGINE in DB_SESSION_ENGINES
+
+
+def keyset_batches(queryset, fields, batch_size):
+    """
+    Пачки значений fields (первые два - ключ порядка) без OFFSET:
+    следующая пачка начинается строго после последней строки предыдущей
+    """
+    first, second = fields[:2]
+    after = None
+    while True:
+        batch_queryset = queryset
+        if after is not None:
+            batch_queryset = queryset.filter(
+                Q(**{f'{first}__gt': after[0]}) | Q(**{first: after[0], f'{second}__gt': after[1]})
+            )
+        batch = list(batch_queryset.order_by(first, second).values_list(*fields)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        after = batch[-1][:2]
+
+
+def delete_where_in(cursor, model, column, values):
+    """DELETE по списку значений столбца без загрузки объектов и сигналов"""
+    if not values:
+        return 0
+    ops = cursor.db.ops
+    cursor.execute(
+        f'DELETE FROM {ops.quote_name(model._meta.db_table)} '
+        f'WHERE {ops.quote_name(column)} IN ({", ".join(["%s"] * len(values))})',
+        list(values),
+    )
+    return cursor.rowcount
+
+
+def cleanup_carts(cutoff, batch_size=BATCH_SIZE, dry_run=False, using='default'):
+    """
+    Удаление корзин, не менявшихся с cutoff, вместе с позициями.
+    Для каждой пачки выдает {'carts': ..., 'items': ..., 'seconds': ...}
+    """
+    expired = Cart.objects.using(using).filter(updated_at__lt=cutoff)
+    for batch in keyset_batches(expired, ('updated_at', 'id', 'customer_id'), batch_size):
+        started = time.perf_counter()
+        ids = [cart_id for _, cart_id, _ in batch]
+        if dry_run:
+            items = CartItem.objects.using(using).filter(cart_id__in=ids).count()
+            yield {'carts': len(ids), 'items': items, 'seconds': time.perf_counter() - started}
+            continue
+
+        with transaction.atomic(using), connections[using].cursor() as cursor:
+            # Корзину могли изменить после чтения пачки: условие проверяется еще раз
+            # под блокировкой, занятые строки пропускаются до следующего запуска
+            locked = list(
+                Cart.objects.using(using).select_for_update(skip_locked=True)
+                .filter(id__in=ids, updated_at__lt=cutoff).values_list('id', 'customer_id')
+            )
+            locked_ids = [cart_id for cart_id, _ in locked]
+            items = delete_where_in(cursor, CartItem, 'cart_id', locked_ids)
+            carts = delete_where_in(cursor, Cart, 'id', locked_ids)
+        # Счетчик корзины в закешированной навигации (store.signals.invalidate_navigation)
+        cache.delete_many([make_template_fragment_key('nav', [customer_id]) for _, customer_id in locked])
+        yield {'carts': carts, 'items': items, 'seconds': time.perf_counter() - started}
+
+
+def cleanup_sessions(now=None, batch_size=BATCH_SIZE, dry_run=False, using='default'):
+    """
+    Удаление истекших сессий из django_session (если сессии хранятся в БД).
+    Для каждой пачки выдает {'sessions': ..., 'seconds': ...}
+    """
+    from django.contrib.sessions.models import Session
+
+    now = now or timezone.now()
+    expired = Session.objects.using(using).filter(expire_date__lt=now)
+    for batch in keyset_batches(expired, ('expire_date', 'session_key'), batch_size):
+        started = time.perf_counter()
+        keys = [session_key for _, session_key in batch]
+        if dry_run:
+            yield {'sessions': len(keys), 'seconds': time.perf_counter() - started}
+            continue
+        with transaction.atomic(using):
+            sessions, _ = Session.objects.using(using).filter(session_key__in=keys, expire_date__lt=now).delete()
+        yield {'sessions': sessions, 'seconds': time.perf_counter() - started}
+
+
+def replication_lag(using='default'):
+    """
+    Наибольшее отставание реплик в секундах (PostgreSQL, pg_stat_replication).
+    None, если узнать нельзя
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT EXTRACT(EPOCH FROM MAX(replay_lag)) FROM pg_stat_replication')
+        lag = cursor.fetchone()[0]
+    return float(lag or 0)
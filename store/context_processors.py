@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.db.models import Sum
+
+from .models import CartItem
+
+
+def navigation(request):
+    """
+    Данные навигации base.html. Навигация кешируется фрагментом на
+    пользователя, поэтому количество товаров в корзине считается лениво:
+    при попадании в кеш запроса к БД нет
+    """
+    def cart_items_count():
+        if not request.user.is_authenticated:
+            return 0
+        total = CartItem.objects.filter(cart__customer=request.user).aggregate(total=Sum('quantity'))['total']
+        return total or 0
+
+    return {
+        'cart_items_count': cart_items_count,
+        'nav_cache_timeout': getattr(settings, 'NAV_CACHE_TIMEOUT', 300),
+    }
@@ -0,0 +1,307 @@
+"""
+Буферизованные счетчики просмотров и популярности товаров.
+
+Просмотр страницы товара или добавление в корзину только увеличивает
+счетчик в буфере: в памяти процесса (COUNTERS_BACKEND = 'memory') или
+в общем кеше ('cache', счетчики переживают перезапуск воркера). Фоновый
+поток раз в COUNTERS_FLUSH_INTERVAL секунд сбрасывает накопленное в
+ProductPopularity пачками INSERT ... ON CONFLICT DO UPDATE с прибавлением.
+
+Популярность затухает с периодом полураспада POPULARITY_HALF_LIFE_DAYS.
+Вместо пересчета всех строк вклад нового события умножается на
+2 ** ((t - epoch) / half_life) (forward decay): порядок по score совпадает
+с порядком по затухшей популярности, а текущее значение - score / decay_factor(now).
+Множитель удваивается каждый период полураспада, и float переполнился бы
+через 1024 периода (меньше трех лет при периоде в сутки). Поэтому точка
+отсчета хранится в PopularityEpoch и, когда множитель превышает
+2 ** RESCALE_EXPONENT, сдвигается на момент сброса: все score делятся на
+старый множитель одним UPDATE в той же транзакции.
+"""
+import datetime
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Начальная точка отсчета; текущая - в PopularityEpoch
+EPOCH = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+# Сдвиг точки отсчета, когда множитель вклада превышает 2 ** RESCALE_EXPONENT:
+# запас до 2 ** 1024 остается на сумму вкладов
+RESCALE_EXPONENT = 512
+DEFAULT_WEIGHTS = {'view': 1, 'cart': 5}
+BATCH_SIZE = 500
+WARNING_INTERVAL = 60
+
+
+def decay_exponent(when=None, epoch=EPOCH):
+    """Число периодов полураспада от точки отсчета epoch до when"""
+    half_life = getattr(settings, 'POPULARITY_HALF_LIFE_DAYS', 7) * 86400
+    when = when or timezone.now()
+    return (when - epoch).total_seconds() / half_life
+
+
+def decay_factor(when=None, epoch=EPOCH):
+    """Множитель вклада события в момент when"""
+    return 2 ** decay_exponent(when, epoch)
+
+
+def current_epoch(using='default', lock=False):
+    """Точка отсчета score из PopularityEpoch; lock блокирует строку до конца транзакции"""
+    from .models import PopularityEpoch
+
+    epochs = PopularityEpoch.objects.using(using)
+    if lock:
+        epochs = epochs.select_for_update()
+    return epochs.get_or_create(pk=1, defaults={'epoch': EPOCH})[0].epoch
+
+
+def current_score(score, when=None, using='default'):
+    """Популярность на момент when из сохраненного score"""
+    return score / decay_factor(when, current_epoch(using))
+
+
+def rescale(epoch, when, using='default'):
+    """
+    Сдвиг точки отсчета на when: все score делятся на множитель старой
+    точки, порядок не меняется. Вызывается с заблокированной строкой
+    PopularityEpoch, поэтому параллельный сброс ждет окончания
+    """
+    from .models import PopularityEpoch, ProductPopularity
+
+    # Вклады старше тысячи периодов полураспада ничтожны: делитель ограничен,
+    # чтобы не переполнить float после долгого простоя
+    divisor = 2 ** min(decay_exponent(when, epoch), 1000)
+    ProductPopularity.objects.using(using).update(score=F('score') / divisor)
+    PopularityEpoch.objects.using(using).filter(pk=1).update(epoch=when)
+    logger.info('Popularity epoch moved from %s to %s', epoch, when)
+    return when
+
+
+class MemoryStore:
+    """Буфер счетчиков в памяти процесса: {(product_id, событие): число}"""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, count):
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + count
+
+    def drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def restore(self, pending):
+        for key, count in pending.items():
+            self.add(key, count)
+
+    def __len__(self):
+        return len(self._pending)
+
+
+class CacheStore:
+    """
+    Буфер счетчиков в общем кеше: атомарные incr/decr по ключу на товар
+    и событие. Процесс помнит, какие ключи он увеличивал, и сбрасывает их;
+    значения, оставшиеся после падения процесса, сбросит тот, кто следующим
+    увеличит тот же счетчик. При недоступном кеше счетчики копятся в памяти
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self.fallback = MemoryStore()
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._warned_at = 0.0
+
+    @staticmethod
+    def cache_key(key):
+        product_id, event = key
+        return f'counters:{event}:{product_id}'
+
+    def add(self, key, count):
+        cache_key = self.cache_key(key)
+        try:
+            cache = caches[self.alias]
+            try:
+                cache.incr(cache_key, count)
+            except ValueError:
+                # Ключа нет: add не перезапишет значение, созданное параллельно
+                if not cache.add(cache_key, count, timeout=None):
+                    cache.incr(cache_key, count)
+        except Exception:
+            now = time.monotonic()
+            if now - self._warned_at > WARNING_INTERVAL:
+                self._warned_at = now
+                logger.warning('Counter cache is unavailable, buffering in process', exc_info=True)
+            self.fallback.add(key, count)
+            return
+        with self._lock:
+            self._dirty.add(key)
+
+    def drain(self):
+        pending = self.fallback.drain()
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return pending
+        cache = caches[self.alias]
+        try:
+            values = cache.get_many([self.cache_key(key) for key in dirty])
+            for key in dirty:
+                count = values.get(self.cache_key(key))
+                if count:
+                    # decr, а не delete: увеличения после get_many остаются в кеше
+                    cache.decr(self.cache_key(key), count)
+                    pending[key] = pending.get(key, 0) + count
+        except Exception:
+            logger.warning('Counter cache is unavailable, flush postponed', exc_info=True)
+            with self._lock:
+                self._dirty |= dirty
+        return pending
+
+    def restore(self, pending):
+        self.fallback.restore(pending)
+
+    def __len__(self):
+        return len(self._dirty) + len(self.fallback)
+
+
+class PopularityCounters:
+    """Счетчики процесса: запись событий в буфер и фоновый сброс в БД"""
+
+    def __init__(self):
+        self._store = None
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self.flushed = 0
+        self.last_flush = None
+
+    @property
+    def store(self):
+        # Буфер создается в каждом процессе заново: после fork чужие счетчики не нужны
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            backend = getattr(settings, 'COUNTERS_BACKEND', 'memory')
+            self._store = CacheStore(getattr(settings, 'COUNTERS_CACHE', 'default')) \
+                if backend == 'cache' else MemoryStore()
+            self._thread = None
+        return self._store
+
+    def record(self, product_id, event='view', count=1):
+        """Событие товара: только увеличение счетчика в буфере"""
+        if getattr(settings, 'COUNTERS_ENABLED', True):
+            self.store.add((product_id, event), count)
+
+    def pending(self):
+        return len(self.store)
+
+    def flush(self):
+        """Сброс буфера в БД. Возвращает число обновленных товаров"""
+        pending = self.store.drain()
+        if not pending:
+            return 0
+        try:
+            updated = write(pending)
+        except DatabaseError:
+            self.store.restore(pending)
+            logger.exception('Failed to flush %s counters, will retry', len(pending))
+            return 0
+        self.flushed += updated
+        self.last_flush = timezone.now()
+        return updated
+
+    def start(self):
+        """Запуск фонового сброса в текущем процессе (повторный вызов ничего не делает)"""
+        self.store  # буфер текущего процесса
+        interval = getattr(settings, 'COUNTERS_FLUSH_INTERVAL', 30)
+        if not interval or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='counters-flush', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Остановка потока и последний сброс (выход воркера)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Counters flush failed')
+            finally:
+                # Соединение потока не должно висеть между сбросами
+                connections.close_all()
+
+
+def write(pending, using=None):
+    """
+    Пачки upsert в ProductPopularity: просмотры и взвешенные события
+    прибавляются к сохраненным значениям. Удаленные товары пропускаются.
+    Строка точки отсчета заблокирована до коммита: сдвиг точки отсчета
+    не может пройти между расчетом множителя и записью
+    """
+    db = connections[using] if using else connection
+    with transaction.atomic(using=db.alias):
+        now = timezone.now()
+        epoch = current_epoch(db.alias, lock=True)
+        if decay_exponent(now, epoch) > RESCALE_EXPONENT:
+            epoch = rescale(epoch, now, db.alias)
+        return _upsert(db, pending, now, decay_factor(now, epoch))
+
+
+def _upsert(db, pending, now, factor):
+    from .models import Product, ProductPopularity
+
+    weights = getattr(settings, 'POPULARITY_WEIGHTS', DEFAULT_WEIGHTS)
+    rows = {}
+    for (product_id, event), count in pending.items():
+        row = rows.setdefault(product_id, [0, 0.0])
+        if event == 'view':
+            row[0] += count
+        row[1] += weights.get(event, 0) * count
+
+    table = db.ops.quote_name(ProductPopularity._meta.db_table)
+    timestamp = db.ops.adapt_datetimefield_value(now)
+    product_ids = sorted(rows)
+    updated = 0
+    for start in range(0, len(product_ids), BATCH_SIZE):
+        batch = product_ids[start:start + BATCH_SIZE]
+        existing = set(Product.objects.using(db.alias).filter(id__in=batch).values_list('id', flat=True))
+        params = []
+        for product_id in batch:
+            if product_id in existing:
+                views, points = rows[product_id]
+                params.extend([product_id, views, points * factor, timestamp])
+        if not params:
+            continue
+        placeholders = ', '.join(['(%s, %s, %s, %s)'] * (len(params) // 4))
+        with db.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (product_id, views, score, updated_at) VALUES {placeholders} '
+                f'ON CONFLICT (product_id) DO UPDATE SET views = {table}.views + EXCLUDED.views, '
+                f'score = {table}.score + EXCLUDED.score, updated_at = EXCLUDED.updated_at',
+                params,
+            )
+        updated += len(params) // 4
+    return updated
+
+
+counters = PopularityCounters()
@@ -0,0 +1,196 @@
+"""
+Фасеты каталога: ценовой диапазон и наличие с готовыми счетчиками.
+
+Диапазон (price_bucket, границы CATALOG_PRICE_BUCKETS) и наличие (in_stock,
+остаток больше нуля) хранятся в строке товара, поэтому отфильтрованная
+страница каталога читается частичным индексом товаров. Число активных
+товаров в каждой ячейке "диапазон x наличие" лежит в CatalogFacet: ячеек
+всего несколько, и все счетчики фильтров читаются одним запросом вместо
+COUNT по таблице товаров на каждый фильтр.
+
+Счетчики меняются приращениями сразу после изменения товара или остатка
+(store.signals): INSERT ... ON CONFLICT DO UPDATE с прибавлением. Остаток
+трогает ячейку только при переходе через ноль. Закешированные счетчики
+сбрасываются вместе с тегами product и stock. Массовые операции
+(bulk_create, update) сигналов не отправляют и вызывают refresh() или
+recount(); команда rebuild_facets пересчитывает все целиком.
+"""
+from bisect import bisect_right
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Case, Count, Exists, OuterRef, Value, When
+
+from .cache import invalidate_tags
+from .models import CatalogFacet, Product, StockBalance
+
+BATCH_SIZE = 50000
+
+
+def bounds():
+    return getattr(settings, 'CATALOG_PRICE_BUCKETS', [])
+
+
+def bucket(price):
+    """Номер ценового диапазона: 0 - дешевле первой границы"""
+    return bisect_right(bounds(), price)
+
+
+def bucket_expression():
+    """bucket() в SQL, для массового пересчета"""
+    return Case(
+        *[When(price__lt=bound, then=Value(index)) for index, bound in enumerate(bounds())],
+        default=Value(len(bounds())),
+    )
+
+
+def labels():
+    """Подписи диапазонов по порядку номеров"""
+    limits = bounds()
+    if not limits:
+        return ["Любая цена"]
+    return (
+        [f"до {limits[0]}"]
+        + [f"{low} – {high}" for low, high in zip(limits, limits[1:])]
+        + [f"от {limits[-1]}"]
+    )
+
+
+def cell(is_active, price_bucket, in_stock):
+    """Ячейка, в которой считается товар; неактивные не считаются"""
+    return (price_bucket, in_stock) if is_active else None
+
+
+def apply(deltas, using='default'):
+    """
+    Прибавление {(price_bucket, in_stock): приращение} к счетчикам ячеек
+    одним upsert. Вызывается внутри транзакции изменения товара
+    """
+    rows = [(price_bucket, in_stock, delta) for (price_bucket, in_stock), delta in deltas.items() if delta]
+    if not rows:
+        return
+    _upsert(connections[using], rows, 'products = {table}.products + EXCLUDED.products')
+
+
+def move(old, new, using='default'):
+    """Перенос товара из ячейки old в new (любая может быть None)"""
+    if old == new:
+        return
+    deltas = {}
+    if old is not None:
+        deltas[old] = deltas.get(old, 0) - 1
+    if new is not None:
+        deltas[new] = deltas.get(new, 0) + 1
+    apply(deltas, using)
+
+
+def _upsert(db, rows, assignment):
+    table = db.ops.quote_name(CatalogFacet._meta.db_table)
+    params = [value for row in rows for value in row]
+    with db.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (price_bucket, in_stock, products) '
+            f'VALUES {", ".join(["(%s, %s, %s)"] * len(rows))} '
+            f'ON CONFLICT (price_bucket, in_stock) DO UPDATE SET {assignment.format(table=table)}',
+            params,
+        )
+
+
+def set_in_stock(product_id, in_stock, using='default'):
+    """
+    Наличие товара после изменения остатка. В обычном случае (наличие не
+    изменилось) это один UPDATE, который не находит строк; при переходе
+    через ноль товар переносится в другую ячейку
+    """
+    products = Product.objects.using(using)
+    with transaction.atomic(using):
+        if not products.filter(id=product_id).exclude(in_stock=in_stock).update(in_stock=in_stock):
+            return False
+        # Строка уже заблокирована UPDATE: диапазон и активность не изменятся до коммита
+        is_active, price_bucket = products.filter(id=product_id).values_list('is_active', 'price_bucket').get()
+        move(cell(is_active, price_bucket, not in_stock), cell(is_active, price_bucket, in_stock), using)
+    return True
+
+
+def refresh(ids=None, using='default'):
+    """
+    Пересчет price_bucket и in_stock у товаров (у всех, если ids не заданы)
+    пачками по id, затем счетчиков ячеек. Возвращает число обновленных товаров
+    """
+    products = Product.objects.using(using)
+    values = {
+        'price_bucket': bucket_expression(),
+        'in_stock': Exists(StockBalance.objects.filter(product_id=OuterRef('id'), quantity__gt=0)),
+    }
+    updated = 0
+    if ids is not None:
+        ids = sorted(ids)
+        for start in range(0, len(ids), BATCH_SIZE):
+            updated += products.filter(id__in=ids[start:start + BATCH_SIZE]).update(**values)
+    else:
+        last_id = products.order_by('-id').values_list('id', flat=True).first() or 0
+        for start in range(0, last_id, BATCH_SIZE):
+            updated += products.filter(id__gt=start, id__lte=start + BATCH_SIZE).update(**values)
+    recount(using)
+    invalidate_tags('product', 'stock')
+    return updated
+
+
+def recount(using='default'):
+    """
+    Счетчики всех ячеек заново по таблице товаров одной группировкой.
+    Возвращает {ячейка: число}
+    """
+    db = connections[using]
+    with transaction.atomic(using):
+        if db.vendor == 'postgresql':
+            # Блокировка конфликтует с upsert в apply(): транзакции, уже
+            # изменившие счетчики, фиксируются до чтения итогов и попадают в
+            # них, новые приращения ждут записи итогов и ложатся поверх
+            with db.cursor() as cursor:
+                cursor.execute(
+                    f'LOCK TABLE {db.ops.quote_name(CatalogFacet._meta.db_table)} IN SHARE ROW EXCLUSIVE MODE'
+                )
+        totals = {
+            (row['price_bucket'], row['in_stock']): row['products']
+            for row in Product.objects.using(using).filter(is_active=True)
+            .values('price_bucket', 'in_stock').annotate(products=Count('id')).order_by()
+        }
+        # Опустевшие ячейки обнуляются, а не удаляются: параллельный apply()
+        # прибавит к существующей строке
+        cells = set(totals) | set(CatalogFacet.objects.using(using).values_list('price_bucket', 'in_stock'))
+        rows = [(price_bucket, in_stock, totals.get((price_bucket, in_stock), 0))
+                for price_bucket, in_stock in sorted(cells)]
+        if rows:
+            _upsert(db, rows, 'products = EXCLUDED.products')
+    return totals
+
+
+def counts():
+    """Все ячейки одним запросом: {(price_bucket, in_stock): число товаров}"""
+    return {
+        (price_bucket, in_stock): products
+        for price_bucket, in_stock, products in CatalogFacet.objects.values_list('price_bucket', 'in_stock', 'products')
+    }
+
+
+def summary(cells, price_bucket=None, in_stock=False):
+    """
+    Счетчики для фильтров каталога из ячеек: число товаров в каждом
+    диапазоне с учетом фильтра наличия и число товаров в наличии с учетом
+    выбранного диапазона
+    """
+    def total(bucket_filter, stock_filter):
+        return sum(
+            products for (cell_bucket, cell_in_stock), products in cells.items()
+            if bucket_filter in (None, cell_bucket) and (not stock_filter or cell_in_stock)
+        )
+
+    return {
+        'buckets': [
+            {'index': index, 'label': label, 'count': total(index, in_stock)}
+            for index, label in enumerate(labels())
+        ],
+        'in_stock': total(price_bucket, True),
+        'total': total(None, in_stock),
+    }
@@ -0,0 +1,118 @@
+"""
+Предрассчитанные блоки главной страницы: хиты продаж, новинки и товары,
+снова появившиеся в наличии.
+
+Агрегации по OrderItem и StockBalance выполняет команда refresh_home_page
+(периодически, например из cron), результат хранится одной строкой
+PrecomputedPage в JSON. Представление читает его одним запросом по первичному
+ключу через кеш сервисов, без агрегаций. Если пересчет давно не запускался,
+отдаются старые блоки с предупреждением в лог; если его не было ни разу -
+только новинки по индексу активных товаров.
+"""
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .cache import invalidate_tags
+from .models import OrderItem, PrecomputedPage, Product, StockBalance
+
+logger = logging.getLogger(__name__)
+
+HOME_PAGE_KEY = 'home'
+EXCLUDED_STATUSES = ('cancelled',)
+
+
+def block_size():
+    return getattr(settings, 'HOME_PAGE_BLOCK_SIZE', 8)
+
+
+def serialize(products):
+    """Товары блока в виде, который шаблон выводит без обращений к БД"""
+    return [
+        {'id': product.id, 'name': product.name, 'price': str(product.price), 'url': product.get_absolute_url()}
+        for product in products
+    ]
+
+
+def in_order(ids):
+    """Активные товары с id из ids в том же порядке"""
+    products = Product.objects.filter(id__in=ids, is_active=True).in_bulk()
+    return [products[product_id] for product_id in ids if product_id in products]
+
+
+def bestsellers(since, limit):
+    """Товары с наибольшим числом проданных штук в заказах после since"""
+    rows = (
+        OrderItem.objects.filter(order__order_date__gte=since, product__is_active=True)
+        .exclude(order__status__in=EXCLUDED_STATUSES)
+        .values('product_id').annotate(sold=Sum('quantity'))
+        .order_by('-sold', 'product_id')[:limit]
+    )
+    return in_order([row['product_id'] for row in rows])
+
+
+def new_arrivals(limit):
+    """Последние добавленные активные товары (частичный индекс product_active_idx)"""
+    return list(Product.objects.filter(is_active=True).order_by('-id')[:limit])
+
+
+def back_in_stock(since, limit):
+    """Товары, остаток которых вырос с нуля после since и еще не закончился"""
+    ids = (
+        StockBalance.objects.filter(restocked_at__gte=since, quantity__gt=0, product__is_active=True)
+        .order_by('-restocked_at', 'product_id').values_list('product_id', flat=True)[:limit]
+    )
+    return in_order(list(ids))
+
+
+def build_payload(now=None):
+    """Все блоки главной: {название блока: [товар, ...]}"""
+    now = now or timezone.now()
+    limit = block_size()
+    bestseller_days = getattr(settings, 'HOME_PAGE_BESTSELLER_DAYS', 30)
+    restock_days = getattr(settings, 'HOME_PAGE_RESTOCK_DAYS', 14)
+    return {
+        'bestsellers': serialize(bestsellers(now - datetime.timedelta(days=bestseller_days), limit)),
+        'new_arrivals': serialize(new_arrivals(limit)),
+        'back_in_stock': serialize(back_in_stock(now - datetime.timedelta(days=restock_days), limit)),
+    }
+
+
+def refresh():
+    """Пересчет блоков главной. Возвращает сохраненную PrecomputedPage"""
+    now = timezone.now()
+    payload = build_payload(now)
+    with transaction.atomic():
+        page, _ = PrecomputedPage.objects.update_or_create(
+            key=HOME_PAGE_KEY, defaults={'payload': payload, 'refreshed_at': now},
+        )
+        transaction.on_commit(lambda: invalidate_tags('home'))
+    return page
+
+
+def load():
+    """
+    Блоки главной одним запросом по первичному ключу:
+    {'blocks': ..., 'refreshed_at': datetime или None}
+    """
+    row = PrecomputedPage.objects.filter(key=HOME_PAGE_KEY).values_list('payload', 'refreshed_at').first()
+    if row is None:
+        logger.warning('Home page blocks were never refreshed, run refresh_home_page')
+        return {'blocks': {'new_arrivals': serialize(new_arrivals(block_size()))}, 'refreshed_at': None}
+    payload, refreshed_at = row
+    if is_stale(refreshed_at):
+        # Старые блоки лучше пустой страницы: отдаются как есть
+        logger.warning('Home page blocks are stale (refreshed at %s), check refresh_home_page', refreshed_at)
+    return {'blocks': payload, 'refreshed_at': refreshed_at}
+
+
+def is_stale(refreshed_at, now=None):
+    """Блоки старше HOME_PAGE_MAX_AGE секунд (или не пересчитывались вовсе)"""
+    if refreshed_at is None:
+        return True
+    max_age = getattr(settings, 'HOME_PAGE_MAX_AGE', 3600)
+    return ((now or timezone.now()) - refreshed_at).total_seconds() > max_age
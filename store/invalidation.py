@@ -0,0 +1,203 @@
+"""
+Шина инвалидации кеша между процессами и узлами.
+
+Изменения товаров, остатков и заказов публикуются как короткие сообщения
+"<источник>|<тег>,<тег>". Транспорт - PostgreSQL LISTEN/NOTIFY или
+журнал CacheInvalidation, который воркеры опрашивают раз в
+CACHE_INVALIDATION_POLL_INTERVAL секунд. Получатель сбрасывает значения
+с этими тегами в локальном уровне service_cache. Теги "nav:<id пользователя>"
+сбрасывают закешированную навигацию base.html: без REDIS_URL кеш
+фрагментов у каждого процесса свой.
+"""
+import logging
+import os
+import select
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache as fragment_cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils import timezone
+
+from .cache import service_cache
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'store_cache_invalidation'
+PRUNE_INTERVAL = 60
+NAVIGATION_TAG_PREFIX = 'nav:'
+
+
+def navigation_tag(user_id):
+    return f'{NAVIGATION_TAG_PREFIX}{user_id}'
+
+
+def drop_navigation(*user_ids):
+    """Сброс фрагмента навигации base.html пользователей в кеше этого процесса"""
+    fragment_cache.delete_many([make_template_fragment_key('nav', [user_id]) for user_id in user_ids])
+
+
+def encode(origin, tags):
+    return f"{origin}|{','.join(sorted(set(tags)))}"
+
+
+def decode(payload):
+    origin, _, tags = payload.partition('|')
+    return origin, [tag for tag in tags.split(',') if tag]
+
+
+def backend_name(alias=DEFAULT_DB_ALIAS):
+    """
+    Транспорт шины: CACHE_INVALIDATION_BACKEND = 'notify' | 'table' | 'off'.
+    По умолчанию NOTIFY на PostgreSQL и журнал на остальных БД
+    """
+    name = getattr(settings, 'CACHE_INVALIDATION_BACKEND', 'auto')
+    if name == 'auto':
+        return 'notify' if connections[alias].vendor == 'postgresql' else 'table'
+    return name
+
+
+class InvalidationBus:
+    """
+    Публикация сообщений и фоновый поток, применяющий чужие сообщения.
+    Поток создается отдельно в каждом процессе (после fork потоки не наследуются)
+    """
+
+    def __init__(self, cache, alias=DEFAULT_DB_ALIAS):
+        self.cache = cache
+        self.alias = alias
+        self._origin = None
+        self._pid = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.received = 0
+
+    @property
+    def origin(self):
+        # Идентификатор процесса: свои сообщения уже применены при публикации
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._origin = f'{socket.gethostname()[:40]}:{self._pid}:{uuid.uuid4().hex[:8]}'
+        return self._origin
+
+    def publish(self, *tags):
+        backend = backend_name(self.alias)
+        if not tags or backend == 'off':
+            return
+        payload = encode(self.origin, tags)
+        try:
+            if backend == 'notify':
+                with connections[self.alias].cursor() as cursor:
+                    cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, payload])
+            else:
+                from .models import CacheInvalidation
+                CacheInvalidation.objects.using(self.alias).create(
+                    tags=payload.partition('|')[2], origin=self.origin,
+                )
+        except DatabaseError:
+            # Другие процессы получат изменения не позже SERVICE_CACHE_LOCAL_TTL
+            logger.exception('Failed to publish cache invalidation %s', payload)
+
+    def apply(self, payload):
+        origin, tags = decode(payload)
+        if origin == self.origin or not tags:
+            return
+        self.received += 1
+        navigation = [tag[len(NAVIGATION_TAG_PREFIX):] for tag in tags if tag.startswith(NAVIGATION_TAG_PREFIX)]
+        if navigation:
+            drop_navigation(*navigation)
+        tags = [tag for tag in tags if not tag.startswith(NAVIGATION_TAG_PREFIX)]
+        if tags:
+            self.cache.apply_remote(*tags)
+
+    def start(self):
+        """
+        Запуск слушателя в текущем процессе (повторный вызов ничего не делает)
+        """
+        backend = backend_name(self.alias)
+        if backend == 'off' or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        target = self._listen if backend == 'notify' else self._poll
+        self._thread = threading.Thread(target=target, name='cache-invalidation', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _reconnected(self):
+        # Пока слушателя не было, сообщения могли потеряться
+        self.cache.clear_local()
+
+    def _listen(self):
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+        wrapper = connections[self.alias]
+        while not self._stop.is_set():
+            try:
+                # Отдельное соединение вне пула: LISTEN держит его постоянно
+                raw = wrapper.Database.connect(**wrapper.get_connection_params())
+                raw.autocommit = True
+                raw.cursor().execute(f'LISTEN {CHANNEL}')
+                self._reconnected()
+                try:
+                    while not self._stop.is_set():
+                        if is_psycopg3:
+                            for notify in raw.notifies(timeout=1.0):
+                                self.apply(notify.payload)
+                        elif select.select([raw], [], [], 1.0)[0]:
+                            raw.poll()
+                            while raw.notifies:
+                                self.apply(raw.notifies.pop(0).payload)
+                finally:
+                    raw.close()
+            except Exception:
+                logger.exception('Cache invalidation listener failed, reconnecting')
+                self._stop.wait(1)
+
+    def _poll(self):
+        from .models import CacheInvalidation
+
+        interval = getattr(settings, 'CACHE_INVALIDATION_POLL_INTERVAL', 1.0)
+        # Записи из долгих транзакций фиксируются позже записей с большими id,
+        # поэтому журнал перечитывается с запасом по времени
+        grace = timedelta(seconds=getattr(settings, 'CACHE_INVALIDATION_GRACE', 10))
+        retention = timedelta(seconds=getattr(settings, 'CACHE_INVALIDATION_RETENTION', 3600))
+        manager = CacheInvalidation.objects.using(self.alias)
+        since, seen, pruned_at = None, {}, 0
+        while not self._stop.is_set():
+            try:
+                if since is None:
+                    since = timezone.now()
+                    self._reconnected()
+                now = timezone.now()
+                rows = manager.filter(created_at__gte=since - grace).exclude(pk__in=list(seen))
+                for pk, origin, tags, created_at in rows.values_list('pk', 'origin', 'tags', 'created_at'):
+                    seen[pk] = created_at
+                    self.apply(f'{origin}|{tags}')
+                since = now
+                seen = {pk: created for pk, created in seen.items() if created >= since - grace}
+                if time.monotonic() - pruned_at > PRUNE_INTERVAL:
+                    manager.filter(created_at__lt=now - retention).delete()
+                    pruned_at = time.monotonic()
+            except DatabaseError:
+                logger.exception('Cache invalidation poll failed')
+                connections[self.alias].close()
+                since = None
+            self._stop.wait(interval)
+        connections[self.alias].close()
+
+
+bus = InvalidationBus(service_cache)
+
+
+def start_listener():
+    bus.start()
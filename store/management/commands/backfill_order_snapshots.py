@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from MyOnlineStore.warmup import close_connections
+from store.models import Order
+from store.pg_copy import is_postgresql
+from store.snapshots import backfill
+import multiprocessing
+import time
+
+CHUNK_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = ('Write immutable snapshots for orders placed before snapshots existed '
+            '(orders are split into id ranges processed in parallel; safe to rerun)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                            help='Worker processes (PostgreSQL only, other backends use 1)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Order id range handled per task')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        bounds = Order.objects.filter(snapshot__isnull=True).aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            self.stdout.write(self.style.SUCCESS('All orders already have snapshots'))
+            return
+
+        workers = options['workers'] if is_postgresql() else 1
+        tasks = [
+            (start, min(start + options['chunk_size'], bounds['last']))
+            for start in range(bounds['first'] - 1, bounds['last'], options['chunk_size'])
+        ]
+        started = time.perf_counter()
+        written = self.run_tasks(tasks, workers)
+        elapsed = time.perf_counter() - started
+        rate = written / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Snapshots written for {written} orders in {elapsed:.2f}s '
+            f'({rate:.0f} orders/sec, {len(tasks)} chunks, {workers} workers)'
+        ))
+
+    def run_tasks(self, tasks, workers):
+        if workers <= 1 or len(tasks) <= 1:
+            return sum(run_task(task) for task in tasks)
+
+        # Дочерние процессы не должны использовать соединения и пул родителя
+        close_connections()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(min(workers, len(tasks))) as pool:
+            return sum(pool.imap_unordered(run_task, tasks))
+
+
+def run_task(task):
+    start, end = task
+    return backfill(start, end)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from store.recommendations import CHUNK_SIZE, build, top_k_size
+import time
+
+
+class Command(BaseCommand):
+    help = ('Rebuild "frequently bought together" recommendations from order items '
+            '(incremental by default, full once RECOMMENDATIONS_FULL_REBUILD_INTERVAL '
+            'has passed since the last full one; run periodically, e.g. from cron)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Recount all orders instead of orders since the last run')
+        parser.add_argument('--top-k', type=int, default=None,
+                            help=f'Neighbours stored per product (default: {top_k_size()})')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Orders read from the database per window')
+
+    def handle(self, *args, **options):
+        if options['top_k'] is not None and options['top_k'] < 1:
+            raise CommandError('--top-k must be positive')
+
+        started = time.perf_counter()
+        run = build(full=options['full'], k=options['top_k'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Full' if run.full else 'Incremental'} rebuild: {run.orders} orders, "
+            f"{run.products} products updated, last order {run.last_order_id}, "
+            f"{time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand, CommandError
+from store.cleanup import (BATCH_SIZE, cart_cutoff, cleanup_carts, cleanup_sessions,
+                           replication_lag, sessions_in_database)
+import time
+
+
+class Command(BaseCommand):
+    help = ('Delete abandoned carts (with their items) and expired sessions in small '
+            'keyset-ordered batches (run periodically, e.g. from cron)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cart-days', type=int, default=None,
+                            help='Carts not changed for this many days are removed (default: CART_EXPIRY_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Rows deleted per transaction')
+        parser.add_argument('--sleep', type=float, default=0.1,
+                            help='Pause between batches, seconds')
+        parser.add_argument('--max-replication-lag', type=float, default=0,
+                            help='Wait before the next batch while replicas lag more than this, '
+                                 'seconds (PostgreSQL, 0 disables the check)')
+        parser.add_argument('--skip-carts', action='store_true')
+        parser.add_argument('--skip-sessions', action='store_true')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count what would be removed')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        if options['cart_days'] is not None and options['cart_days'] < 1:
+            raise CommandError('--cart-days must be positive')
+
+        self.options = options
+        prefix = 'Would remove' if options['dry_run'] else 'Removed'
+        if not options['skip_carts']:
+            batches = cleanup_carts(cart_cutoff(options['cart_days']), options['batch_size'], options['dry_run'])
+            totals = self.run_batches('carts', batches, ('carts', 'items'))
+            self.stdout.write(self.style.SUCCESS(
+                f"{prefix} {totals['carts']} carts and {totals['items']} cart items "
+                f"in {totals['batches']} batches, {totals['seconds']:.2f}s"
+            ))
+        if not options['skip_sessions']:
+            if not sessions_in_database():
+                self.stdout.write('Sessions are not stored in the database, skipped')
+                return
+            batches = cleanup_sessions(batch_size=options['batch_size'], dry_run=options['dry_run'])
+            totals = self.run_batches('sessions', batches, ('sessions',))
+            self.stdout.write(self.style.SUCCESS(
+                f"{prefix} {totals['sessions']} sessions in {totals['batches']} batches, "
+                f"{totals['seconds']:.2f}s"
+            ))
+
+    def run_batches(self, kind, batches, counters):
+        totals = dict.fromkeys(counters, 0)
+        totals['batches'] = 0
+        started = time.perf_counter()
+        for number, batch in enumerate(batches, start=1):
+            for counter in counters:
+                totals[counter] += batch[counter]
+            totals['batches'] = number
+            rows = ', '.join(f'{batch[counter]} {counter}' for counter in counters)
+            self.stdout.write(f"{kind} batch {number}: {rows} in {batch['seconds'] * 1000:.1f}ms")
+            self.throttle()
+        totals['seconds'] = time.perf_counter() - started
+        return totals
+
+    def throttle(self):
+        if self.options['dry_run']:
+            return
+        if self.options['sleep']:
+            time.sleep(self.options['sleep'])
+        limit = self.options['max_replication_lag']
+        while limit:
+            lag = replication_lag()
+            if lag is None or lag <= limit:
+                break
+            self.stdout.write(f'Replication lag {lag:.1f}s, waiting')
+            time.sleep(max(self.options['sleep'], 1))
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.template.backends.django import get_installed_libraries
+from importlib import import_module
+from pathlib import Path
+from MyOnlineStore.warmup import compile_templates
+import inspect
+
+# Аргументы для пробного вызова фильтров проекта
+SAMPLE_ARGS = ('2', '3')
+
+
+class Command(BaseCommand):
+    help = 'Compile every template and check custom template filters (run at build or boot)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Fail on errors in third-party templates too')
+        parser.add_argument('--slowest', type=int, default=10,
+                            help='Number of slowest templates to print')
+
+    def handle(self, *args, **options):
+        results = compile_templates()
+        checked = [r for r in results if options['all'] or r.is_project]
+        errors = [f'{r.name} ({r.path}): {r.error}' for r in checked if r.error is not None]
+
+        filters = 0
+        for name, module in project_libraries():
+            for filter_name, func in module.register.filters.items():
+                filters += 1
+                try:
+                    func(*SAMPLE_ARGS[:required_args(func)])
+                except Exception as exc:
+                    errors.append(f'filter {name}.{filter_name}: {exc!r}')
+
+        self.stdout.write('Slowest templates to compile:')
+        for result in sorted(results, key=lambda r: -r.seconds)[:options['slowest']]:
+            self.stdout.write(f'  {result.seconds * 1000:8.2f} ms  {result.name}')
+
+        if errors:
+            for error in errors:
+                self.stderr.write(self.style.ERROR(error))
+            raise CommandError(f'{len(errors)} template errors')
+        self.stdout.write(self.style.SUCCESS(
+            f'Compiled {len(results)} templates ({len(checked)} checked), '
+            f'{filters} project filters OK in {sum(r.seconds for r in results):.2f}s'
+        ))
+
+
+def project_libraries():
+    """
+    Библиотеки тегов и фильтров из приложений проекта (не из site-packages)
+    """
+    base_dir = Path(settings.BASE_DIR)
+    for name, path in sorted(get_installed_libraries().items()):
+        module = import_module(path)
+        filename = Path(module.__file__).resolve()
+        if filename.is_relative_to(base_dir) and 'site-packages' not in filename.parts:
+            yield name, module
+
+
+def required_args(func):
+    return sum(
+        1 for param in inspect.signature(func).parameters.values()
+        if param.default is param.empty and param.kind in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD)
+    )
@@ -1,24 +1,194 @@
-from django.core.management.base import BaseCommand
-from store.models import StockBalance
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from store.models import Product, StockBalance
+from store.pg_copy import is_postgresql, copy_query_out, mogrify
+import contextlib
+import csv
+import datetime
+import gzip
 import json
+import sys
+import time
+
+
+COLUMNS = ['product_id', 'product_name', 'quantity', 'last_updated']
+FORMATS = ['json', 'ndjson', 'csv', 'columnar']
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
 
 
 class Command(BaseCommand):
-    help = 'Export stock balances to JSON file'
+    help = 'Export stock balances (streaming, JSON/NDJSON/CSV/columnar)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Output format (default: json, csv with --copy)')
+        parser.add_argument('--output', '-o',
+                            help='Output path, "-" for stdout (default: stock_balances.<format>)')
+        parser.add_argument('--gzip', action='store_true',
+                            help='Compress output with gzip')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched from the database per round trip')
+        parser.add_argument('--changed-since',
+                            help='Only balances updated at or after this ISO datetime')
+        parser.add_argument('--low-stock', type=int, metavar='THRESHOLD',
+                            help='Only balances with quantity <= THRESHOLD')
+        parser.add_argument('--copy', action='store_true',
+                            help='Export CSV via PostgreSQL COPY TO STDOUT '
+                                 '(falls back to ORM on other backends)')
 
     def handle(self, *args, **options):
-        balances = StockBalance.objects.select_related('product').all()
-        data = []
+        fmt = options['format'] or ('csv' if options['copy'] else 'json')
+        if options['copy']:
+            if fmt != 'csv':
+                raise CommandError('--copy supports only the csv format')
+            if not is_postgresql():
+                self.stdout.write(self.style.WARNING(
+                    f'COPY is not supported on {connection.vendor}, using ORM'
+                ))
+                options['copy'] = False
+
+        changed_since = None
+        if options['changed_since']:
+            changed_since = parse_datetime(options['changed_since'])
+            if changed_since is None:
+                raise CommandError(f"Invalid datetime: {options['changed_since']}")
+            if timezone.is_naive(changed_since):
+                changed_since = timezone.make_aware(changed_since, datetime.timezone.utc)
+
+        path = options['output'] or f'stock_balances.{fmt}'
+        if options['gzip'] and path != '-' and not path.endswith('.gz'):
+            path += '.gz'
+        # При выводе в stdout отчет пишем в stderr, чтобы не портить данные
+        report = self.stderr if path == '-' else self.stdout
+
+        started = time.perf_counter()
+        with self.open_output(path, options['gzip']) as f:
+            if options['copy']:
+                count = self.export_with_copy(f, changed_since, options['low_stock'])
+            else:
+                rows = self.iter_rows(changed_since, options['low_stock'], options['chunk_size'])
+                count = WRITERS[fmt](f, rows)
+        elapsed = time.perf_counter() - started
+
+        rate = count / elapsed if elapsed else 0
+        report.write(self.style.SUCCESS(
+            f'Successfully exported {count} stock balances in {elapsed:.2f}s ({rate:.0f} rows/sec)'
+        ))
+
+    @contextlib.contextmanager
+    def open_output(self, path, compress):
+        if path == '-':
+            if compress:
+                with gzip.open(sys.stdout.buffer, 'wt', encoding='utf-8', newline='') as f:
+                    yield f
+            else:
+                yield self.stdout._out
+            return
+        opener = gzip.open if compress else open
+        with opener(path, 'wt', encoding='utf-8', newline='') as f:
+            yield f
+
+    def get_queryset(self, changed_since=None, low_stock=None):
+        balances = StockBalance.objects.all()
+        if changed_since is not None:
+            balances = balances.filter(last_updated__gte=changed_since)
+        if low_stock is not None:
+            balances = balances.filter(quantity__lte=low_stock)
+        return balances.order_by('id')
+
+    def iter_rows(self, changed_since, low_stock, chunk_size):
+        """
+        Строки без создания моделей: values_list + iterator порциями
+        """
+        rows = self.get_queryset(changed_since, low_stock).values_list(
+            'product_id', 'product__name', 'quantity', 'last_updated'
+        ).iterator(chunk_size=chunk_size)
+        for product_id, name, quantity, last_updated in rows:
+            yield product_id, name, quantity, last_updated.strftime(DATE_FORMAT)
+
+    def export_with_copy(self, f, changed_since, low_stock):
+        conditions, params = [], []
+        if changed_since is not None:
+            conditions.append('s.last_updated >= %s')
+            params.append(changed_since)
+        if low_stock is not None:
+            conditions.append('s.quantity <= %s')
+            params.append(low_stock)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        query = f'''
+            SELECT p.id AS product_id, p.name AS product_name, s.quantity,
+                   to_char(s.last_updated AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS') AS last_updated
+            FROM {StockBalance._meta.db_table} s
+            JOIN {Product._meta.db_table} p ON p.id = s.product_id
+            {where}
+            ORDER BY s.id
+        '''
+        with connection.cursor() as cursor:
+            return copy_query_out(cursor, mogrify(cursor, query, params), f)
+
+
+def write_json(f, rows):
+    count = 0
+    f.write('[')
+    for row in rows:
+        f.write(',\n' if count else '\n')
+        json.dump(dict(zip(COLUMNS, row)), f, ensure_ascii=False)
+        count += 1
+    f.write('\n]\n')
+    return count
+
+
+def write_ndjson(f, rows):
+    count = 0
+    for row in rows:
+        f.write(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False))
+        f.write('\n')
+        count += 1
+    return count
+
+
+def write_csv(f, rows):
+    writer = csv.writer(f)
+    writer.writerow(COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_columnar(f, rows, block_size=10000):
+    """
+    Компактный колоночный формат: первая строка - заголовок со списком колонок,
+    далее по строке на блок, в которой лежат массивы значений каждой колонки
+    """
+    f.write(json.dumps({'columns': COLUMNS}))
+    f.write('\n')
+    count = 0
+    block = [[] for _ in COLUMNS]
+
+    def flush():
+        f.write(json.dumps(block, ensure_ascii=False, separators=(',', ':')))
+        f.write('\n')
 
-        for balance in balances:
-            data.append({
-                'product_id': balance.product.id,
-                'product_name': balance.product.name,
-                'quantity': balance.quantity,
-                'last_updated': balance.last_updated.strftime('%Y-%m-%d %H:%M:%S')
-            })
+    for row in rows:
+        for column, value in zip(block, row):
+            column.append(value)
+        count += 1
+        if count % block_size == 0:
+            flush()
+            block = [[] for _ in COLUMNS]
+    if block[0]:
+        flush()
+    return count
 
-        with open('stock_balances.json', 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
 
-        self.stdout.write(self.style.SUCCESS(f'Successfully exported {len(data)} stock balances'))
\ No newline at end of file
+WRITERS = {
+    'json': write_json,
+    'ndjson': write_ndjson,
+    'csv': write_csv,
+    'columnar': write_columnar,
+}
@@ -0,0 +1,289 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from MyOnlineStore.warmup import close_connections
+from store import facets
+from store.cache import invalidate_tags
+from store.models import Product, ProductPopularity, StockBalance, Cart, CartItem, Order, OrderItem
+from store.pg_copy import is_postgresql, insert_rows
+import bisect
+import datetime
+import itertools
+import math
+import multiprocessing
+import random
+import time
+
+
+CATEGORIES = ['Смартфон', 'Ноутбук', 'Планшет', 'Наушники', 'Телевизор', 'Монитор',
+              'Клавиатура', 'Мышь', 'Часы', 'Колонка', 'Фотоаппарат', 'Роутер']
+BRANDS = ['Samsung', 'Apple', 'Xiaomi', 'HP', 'Lenovo', 'Sony', 'LG', 'Asus', 'Huawei', 'Philips']
+STATUSES = ['pending', 'processing', 'shipped', 'delivered', 'cancelled']
+STATUS_WEIGHTS = [5, 5, 10, 75, 5]
+STATUS_CUM_WEIGHTS = list(itertools.accumulate(STATUS_WEIGHTS))
+# Сезонность заказов: пик в ноябре-декабре, провал летом
+MONTH_WEIGHTS = {1: 0.8, 2: 0.8, 3: 0.9, 4: 0.9, 5: 0.9, 6: 0.7, 7: 0.7,
+                 8: 0.8, 9: 1.0, 10: 1.1, 11: 1.6, 12: 2.0}
+ZIPF_EXPONENT = 1.1
+CHUNK_SIZE = 20000
+# Момент, от которого отсчитываются даты: фиксирован, чтобы --seed однозначно задавал данные
+DEFAULT_NOW = '2026-01-01T00:00:00+00:00'
+
+# Общие данные для процессов-воркеров: заполняются до fork и наследуются
+_state = {}
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic synthetic dataset (products, users, carts, orders)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--carts', type=int, default=500,
+                            help='Number of generated users that get a non-empty cart')
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--now', default=DEFAULT_NOW,
+                            help='ISO datetime the generated dates are counted back from '
+                                 f'(default: {DEFAULT_NOW}, "now" for the current time)')
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                            help='Worker processes (PostgreSQL only, other backends use 1)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Rows generated and inserted per task')
+
+    def handle(self, *args, **options):
+        if options['carts'] > options['users']:
+            raise CommandError('--carts cannot exceed --users')
+        if options['now'] == 'now':
+            now = timezone.now().replace(microsecond=0)
+        else:
+            now = parse_datetime(options['now'])
+            if now is None:
+                raise CommandError(f"Invalid datetime: {options['now']}")
+            if timezone.is_naive(now):
+                now = timezone.make_aware(now, datetime.timezone.utc)
+
+        User = get_user_model()
+        workers = options['workers'] if is_postgresql() else 1
+        rng = random.Random(options['seed'])
+
+        _state.update({
+            'seed': options['seed'],
+            'product_base': Product.objects.aggregate(m=Max('id'))['m'] or 0,
+            'user_base': User.objects.aggregate(m=Max('id'))['m'] or 0,
+            'cart_base': Cart.objects.aggregate(m=Max('id'))['m'] or 0,
+            'order_base': Order.objects.aggregate(m=Max('id'))['m'] or 0,
+            'users': options['users'],
+            'now': now,
+            # Один хеш на всех: пароль "password", без хеширования на каждую строку
+            'password': make_password('password'),
+        })
+        if not options['users'] and options['orders']:
+            _state['customer_ids'] = list(User.objects.values_list('id', flat=True))
+            if not _state['customer_ids']:
+                raise CommandError('--orders requires --users or existing users')
+
+        _state['prices'] = [
+            round(min(math.exp(rng.gauss(8, 1.2)), 9999999), 2) for _ in range(options['products'])
+        ]
+        # Популярность по Zipf: ранг товара определяется случайной перестановкой
+        ranks = list(range(1, options['products'] + 1))
+        rng.shuffle(ranks)
+        weights = [1 / rank ** ZIPF_EXPONENT for rank in ranks]
+        _state['popularity'] = list(_accumulate(weights))
+        _state['day_weights'] = list(_accumulate(
+            MONTH_WEIGHTS[day.month] * (1.3 if day.weekday() >= 5 else 1.0)
+            for day in _year_days(_state['now'])
+        ))
+
+        phases = [
+            ('products', options['products']),
+            ('users', options['users']),
+            ('carts', options['carts']),
+            ('orders', options['orders']),
+        ]
+        started = time.perf_counter()
+        total = 0
+        for kind, count in phases:
+            tasks = [
+                (kind, index, start, min(start + options['chunk_size'], count))
+                for index, start in enumerate(range(0, count, options['chunk_size']))
+            ]
+            phase_started = time.perf_counter()
+            rows = self.run_tasks(tasks, workers)
+            total += rows
+            self.stdout.write(f'{kind}: {rows} rows in {time.perf_counter() - phase_started:.2f}s')
+
+        self.reset_sequences(User)
+        # Товары вставлены без сигналов: счетчики фасетов каталога пересчитываются целиком
+        facets.recount()
+        invalidate_tags('product', 'stock', 'order')
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {total} rows in {elapsed:.2f}s ({rate:.0f} rows/sec, {workers} workers)'
+        ))
+
+    def run_tasks(self, tasks, workers):
+        if workers <= 1 or len(tasks) <= 1:
+            return sum(run_task(task) for task in tasks)
+
+        # Дочерние процессы не должны использовать соединения и пул родителя
+        close_connections()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(min(workers, len(tasks))) as pool:
+            return sum(pool.imap_unordered(run_task, tasks))
+
+    def reset_sequences(self, User):
+        """
+        Идентификаторы задавались явно, поэтому последовательности надо сдвинуть
+        """
+        sql = connection.ops.sequence_reset_sql(no_style(), [Product, User, Cart, Order])
+        if sql:
+            with connection.cursor() as cursor:
+                for statement in sql:
+                    cursor.execute(statement)
+
+
+def run_task(task):
+    kind, index, start, end = task
+    rng = random.Random(f"{_state['seed']}:{kind}:{index}")
+    total = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model, columns, rows in GENERATORS[kind](rng, start, end, connection.ops):
+            total += insert_rows(cursor, model._meta.db_table, columns, rows)
+    return total
+
+
+def generate_products(rng, start, end, ops):
+    product_rows, stock_rows, popularity_rows = [], [], []
+    for n in range(start, end):
+        product_id = _state['product_base'] + n + 1
+        created = _timestamp(ops, _state['now'] - datetime.timedelta(seconds=rng.randint(0, 2 * 365 * 86400)))
+        name = f'{rng.choice(CATEGORIES)} {rng.choice(BRANDS)} {product_id}'
+        is_active = rng.random() > 0.05
+        quantity = max(0, int(rng.gauss(40, 30)))
+        price = _state['prices'][n]
+        product_rows.append((
+            product_id, name, f'Описание товара {name}', price,
+            None, created, created, f'product-{product_id}', is_active,
+            facets.bucket(price), quantity > 0,
+        ))
+        stock_rows.append((product_id, quantity, created))
+        popularity_rows.append((product_id, 0, 0.0, created))
+    yield Product, ['id', 'name', 'description', 'price', 'image', 'created_at',
+                    'updated_at', 'slug', 'is_active', 'price_bucket', 'in_stock'], product_rows
+    yield StockBalance, ['product_id', 'quantity', 'last_updated'], stock_rows
+    yield ProductPopularity, ['product_id', 'views', 'score', 'updated_at'], popularity_rows
+
+
+def generate_users(rng, start, end, ops):
+    rows = []
+    for n in range(start, end):
+        user_id = _state['user_base'] + n + 1
+        joined = _timestamp(ops, _state['now'] - datetime.timedelta(seconds=rng.randint(0, 3 * 365 * 86400)))
+        rows.append((
+            user_id, _state['password'], None, False, f'synthetic{user_id}',
+            f'Имя{user_id}', '', f'synthetic{user_id}@example.com', False, True, joined,
+            f'Фамилия{user_id}', '', '', f'г. Москва, ул. Тестовая, д. {user_id % 200 + 1}', None, None,
+        ))
+    yield get_user_model(), ['id', 'password', 'last_login', 'is_superuser', 'username',
+                             'first_name', 'last_name', 'email', 'is_staff', 'is_active',
+                             'date_joined', 'surname', 'patronymic', 'phone', 'address',
+                             'avatar', 'birth_date'], rows
+
+
+def generate_carts(rng, start, end, ops):
+    cart_rows, item_rows = [], []
+    created = _timestamp(ops, _state['now'])
+    for n in range(start, end):
+        cart_id = _state['cart_base'] + n + 1
+        cart_rows.append((cart_id, _state['user_base'] + n + 1, created, created))
+        for product_id in _popular_products(rng, _cart_size(rng)):
+            item_rows.append((cart_id, product_id, 1 + int(rng.expovariate(1.5))))
+    yield Cart, ['id', 'customer_id', 'created_at', 'updated_at'], cart_rows
+    yield CartItem, ['cart_id', 'product_id', 'quantity'], item_rows
+
+
+def generate_orders(rng, start, end, ops):
+    order_rows, item_rows = [], []
+    days = len(_state['day_weights'])
+    for n in range(start, end):
+        order_id = _state['order_base'] + n + 1
+        if _state['users']:
+            customer_id = _state['user_base'] + rng.randint(1, _state['users'])
+        else:
+            customer_id = rng.choice(_state['customer_ids'])
+        day = _weighted(rng, _state['day_weights'])
+        order_date = _state['now'] - datetime.timedelta(days=days - day, seconds=rng.randint(0, 86399))
+
+        total = 0
+        for product_id in _popular_products(rng, _cart_size(rng)):
+            quantity = 1 + int(rng.expovariate(2))
+            price = _state['prices'][product_id - _state['product_base'] - 1]
+            total += price * quantity
+            item_rows.append((order_id, product_id, quantity, price))
+        order_rows.append((
+            order_id, customer_id, _timestamp(ops, order_date),
+            STATUSES[_weighted(rng, STATUS_CUM_WEIGHTS)], round(total, 2),
+            f'г. Москва, ул. Тестовая, д. {customer_id % 200 + 1}',
+        ))
+    yield Order, ['id', 'customer_id', 'order_date', 'status', 'total_amount',
+                  'shipping_address'], order_rows
+    yield OrderItem, ['order_id', 'product_id', 'quantity', 'price'], item_rows
+
+
+GENERATORS = {
+    'products': generate_products,
+    'users': generate_users,
+    'carts': generate_carts,
+    'orders': generate_orders,
+}
+
+
+def _timestamp(ops, value):
+    """
+    Дата для вставки строкой: строка товара содержит дату дважды, а перевод
+    datetime в текст при записи CSV - заметная часть времени генерации
+    """
+    return str(ops.adapt_datetimefield_value(value))
+
+
+def _weighted(rng, cum_weights):
+    """
+    Индекс, выбранный по накопленным весам: то же, что
+    rng.choices(range(n), cum_weights=...)[0], без создания списка на каждый вызов
+    """
+    return bisect.bisect(cum_weights, rng.random() * cum_weights[-1], 0, len(cum_weights) - 1)
+
+
+def _cart_size(rng):
+    # Скошенное распределение: чаще всего 1-2 позиции, изредка до 20
+    return min(1 + int(rng.expovariate(0.6)), 20)
+
+
+def _popular_products(rng, count):
+    """
+    Различные товары, выбранные с учетом популярности (Zipf)
+    """
+    if not _state['popularity']:
+        return []
+    chosen = set(rng.choices(range(len(_state['popularity'])), cum_weights=_state['popularity'], k=count))
+    return [_state['product_base'] + index + 1 for index in sorted(chosen)]
+
+
+def _year_days(now):
+    start = now.date() - datetime.timedelta(days=365)
+    return [start + datetime.timedelta(days=offset) for offset in range(365)]
+
+
+def _accumulate(values):
+    total = 0
+    for value in values:
+        total += value
+        yield total
@@ -1,32 +1,142 @@
 from django.core.management.base import BaseCommand
-from store.models import Product, StockBalance
+from django.db import connection, transaction
+from store import facets
+from store.models import Product, ProductPopularity, StockBalance
+from store.pg_copy import is_postgresql, copy_rows_in
+from store.cache import invalidate_tags
+from store.services import CatalogSyncService
+from decimal import Decimal
 import json
 
 
+STAGING_TABLE = 'store_goods_staging'
+
+
 class Command(BaseCommand):
     help = 'Load products data from JSON file'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default='products_data.json',
+                            help='Path to JSON file with products')
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument('--copy', action='store_true',
+                          help='Use PostgreSQL COPY into a staging table (falls back to ORM on other backends)')
+        mode.add_argument('--sync', action='store_true',
+                          help='Treat the file as a full snapshot: write only changed rows '
+                               'and deactivate products missing from it')
+
     def handle(self, *args, **options):
         try:
-            with open('products_data.json', 'r', encoding='utf-8') as f:
+            with open(options['file'], 'r', encoding='utf-8') as f:
                 data = json.load(f)
 
-                for item in data:
-                    product, created = Product.objects.get_or_create(
-                        name=item['name'],
-                        defaults={
-                            'description': item.get('description', ''),
-                            'price': item['price'],
-                            'is_active': True
-                        }
-                    )
+            if options['copy'] and not is_postgresql():
+                self.stdout.write(self.style.WARNING(
+                    f'COPY is not supported on {connection.vendor}, using ORM'
+                ))
+                options['copy'] = False
 
-                    StockBalance.objects.update_or_create(
-                        product=product,
-                        defaults={'quantity': item['quantity']}
-                    )
+            if options['sync']:
+                summary = CatalogSyncService.sync(data)
+                self.stdout.write(
+                    'Created: {created}, updated: {updated}, stock updated: {stock_updated}, '
+                    'deactivated: {deactivated}, unchanged: {unchanged}'.format(**summary)
+                )
+            elif options['copy']:
+                self.load_with_copy(data)
+                invalidate_tags('product', 'stock')
+            else:
+                self.load_with_orm(data)
 
-                self.stdout.write(self.style.SUCCESS(f'Successfully loaded {len(data)} products'))
+            self.stdout.write(self.style.SUCCESS(f'Successfully loaded {len(data)} products'))
 
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Error: {str(e)}'))
\ No newline at end of file
+            self.stdout.write(self.style.ERROR(f'Error: {str(e)}'))
+
+    def load_with_orm(self, data):
+        for item in data:
+            product, created = Product.objects.get_or_create(
+                name=item['name'],
+                defaults={
+                    'description': item.get('description', ''),
+                    'price': item['price'],
+                    'is_active': True
+                }
+            )
+
+            stock_balance, created = StockBalance.objects.get_or_create(
+                product=product,
+                defaults={'quantity': item['quantity']}
+            )
+            if not created:
+                stock_balance.quantity = item['quantity']
+                stock_balance.save()
+
+    @transaction.atomic
+    def load_with_copy(self, data):
+        """
+        Загрузка через COPY во временную таблицу и слияние одним запросом:
+        новые товары создаются, остатки всех товаров из файла обновляются.
+        Слияние идет мимо сигналов, поэтому фасеты каталога (store.facets)
+        затронутых товаров пересчитываются после него
+        """
+        rows = (
+            (item['name'], Product.make_slug(item['name']), item.get('description', ''),
+             item['price'], facets.bucket(Decimal(str(item['price']))), item['quantity'])
+            for item in data
+        )
+        product_table = Product._meta.db_table
+        stock_table = StockBalance._meta.db_table
+        popularity_table = ProductPopularity._meta.db_table
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE {STAGING_TABLE} ('
+                'name text, slug text, description text, price numeric, price_bucket smallint, quantity integer'
+                ') ON COMMIT DROP'
+            )
+            copy_rows_in(cursor, STAGING_TABLE,
+                         ['name', 'slug', 'description', 'price', 'price_bucket', 'quantity'], rows)
+            cursor.execute(f'''
+                WITH incoming AS (
+                    SELECT DISTINCT ON (name) name, slug, description, price, price_bucket, quantity
+                    FROM {STAGING_TABLE}
+                    ORDER BY name
+                ),
+                -- id новых товаров берется из последовательности заранее: он входит в slug
+                fresh AS (
+                    SELECT nextval(pg_get_serial_sequence('{product_table}', 'id')) AS id, i.*
+                    FROM incoming i
+                    WHERE NOT EXISTS (SELECT 1 FROM {product_table} p WHERE p.name = i.name)
+                ),
+                inserted AS (
+                    INSERT INTO {product_table}
+                        (id, name, slug, description, price, price_bucket, in_stock, is_active,
+                         created_at, updated_at)
+                    SELECT f.id, f.name, f.slug || '-' || f.id, f.description, f.price, f.price_bucket,
+                           f.quantity > 0, TRUE, now(), now()
+                    FROM fresh f
+                    RETURNING id, name
+                ),
+                popularity AS (
+                    INSERT INTO {popularity_table} (product_id, views, score, updated_at)
+                    SELECT id, 0, 0, now() FROM inserted
+                ),
+                matched AS (
+                    SELECT id, name FROM inserted
+                    UNION ALL
+                    (SELECT DISTINCT ON (p.name) p.id, p.name
+                     FROM {product_table} p JOIN incoming i ON i.name = p.name
+                     ORDER BY p.name, p.id)
+                )
+                INSERT INTO {stock_table} (product_id, quantity, last_updated)
+                SELECT m.id, i.quantity, now()
+                FROM matched m JOIN incoming i ON i.name = m.name
+                ON CONFLICT (product_id) DO UPDATE
+                SET quantity = EXCLUDED.quantity, last_updated = EXCLUDED.last_updated,
+                    restocked_at = CASE WHEN {stock_table}.quantity = 0 AND EXCLUDED.quantity > 0
+                                        THEN EXCLUDED.last_updated ELSE {stock_table}.restocked_at END
+                RETURNING product_id
+            ''')
+            product_ids = [product_id for product_id, in cursor.fetchall()]
+        facets.refresh(product_ids)
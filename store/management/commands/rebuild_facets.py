@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from store.facets import labels, refresh
+import time
+
+
+class Command(BaseCommand):
+    help = ('Recompute price buckets and availability of all products and the catalog facet counts '
+            '(run after changing CATALOG_PRICE_BUCKETS or bulk edits that bypass signals)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        updated = refresh()
+        self.stdout.write(self.style.SUCCESS(
+            f'Facets rebuilt: {updated} products, {len(labels())} price buckets, '
+            f'{time.perf_counter() - started:.2f}s'
+        ))
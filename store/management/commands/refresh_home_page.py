@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from store.homepage import refresh
+import time
+
+
+class Command(BaseCommand):
+    help = ('Recompute home page blocks: bestsellers, new arrivals and back in stock '
+            '(run periodically, e.g. from cron, more often than HOME_PAGE_MAX_AGE)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        page = refresh()
+        counts = ', '.join(f'{len(products)} {name}' for name, products in page.payload.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Home page refreshed: {counts}, {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,73 @@
+from collections import Counter, defaultdict
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+import json
+
+
+class Command(BaseCommand):
+    help = 'List and aggregate request profiles saved by SamplingProfilerMiddleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None,
+                            help='Profiles directory (default: REQUEST_PROFILER_DIR)')
+        parser.add_argument('--url-name', help='Only profiles of this URL name')
+        parser.add_argument('--aggregate', metavar='PATH',
+                            help='Merge collapsed stacks of the selected profiles into PATH')
+        parser.add_argument('--top', type=int, default=10,
+                            help='Number of hottest functions and slowest queries to print')
+
+    def handle(self, *args, **options):
+        directory = Path(options['dir'] or getattr(settings, 'REQUEST_PROFILER_DIR', 'profiles'))
+        profiles = []
+        for path in sorted(directory.glob('*.json')):
+            meta = json.loads(path.read_text(encoding='utf-8'))
+            if options['url_name'] and meta['url_name'] != options['url_name']:
+                continue
+            profiles.append(meta)
+
+        if not profiles:
+            self.stdout.write('No profiles found')
+            return
+
+        for meta in profiles:
+            self.stdout.write(
+                f"{meta['id']}  {meta['method']} {meta['path']}  status={meta['status']}  "
+                f"total={meta['total_ms']}ms  sql={meta['sql_ms']}ms/{len(meta['queries'])}q  "
+                f"samples={meta['samples']}"
+            )
+
+        stacks = Counter()
+        for meta in profiles:
+            folded = directory / f"{meta['id']}.folded"
+            if not folded.exists():
+                continue
+            for line in folded.read_text(encoding='utf-8').splitlines():
+                stack, _, count = line.rpartition(' ')
+                stacks[stack] += int(count)
+
+        # Собственное время функции - число сэмплов, где она на вершине стека
+        self_samples = Counter()
+        for stack, count in stacks.items():
+            self_samples[stack.rsplit(';', 1)[-1]] += count
+        self.stdout.write(f'\nHottest functions ({sum(stacks.values())} samples):')
+        for name, count in self_samples.most_common(options['top']):
+            self.stdout.write(f'  {count:6d}  {name}')
+
+        sql_time = defaultdict(float)
+        sql_count = Counter()
+        for meta in profiles:
+            for query in meta['queries']:
+                sql_time[query['sql']] += query['ms']
+                sql_count[query['sql']] += 1
+        self.stdout.write('\nSlowest queries (total ms / count):')
+        for sql, ms in sorted(sql_time.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'  {ms:10.2f}  {sql_count[sql]:5d}  {sql[:150]}')
+
+        if options['aggregate']:
+            with open(options['aggregate'], 'w', encoding='utf-8') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f'{stack} {count}\n')
+            self.stdout.write(self.style.SUCCESS(
+                f"Aggregated {len(profiles)} profiles into {options['aggregate']}"
+            ))
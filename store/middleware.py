@@ -0,0 +1,300 @@
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from .cache import service_cache
+
+logger = logging.getLogger('store.metrics')
+
+_NUMBER_RE = re.compile(r'\b\d+(\.\d+)?\b')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_IN_LIST_RE = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+
+_current_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+
+def fingerprint(sql):
+    """
+    Нормализация SQL: литералы и списки IN заменяются плейсхолдерами,
+    чтобы одинаковые по форме запросы имели одинаковый отпечаток
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+def pool_stats():
+    """
+    Статистика пулов соединений (psycopg_pool): размер, свободные соединения,
+    ожидающие запросы и суммарное время ожидания
+    """
+    stats = {}
+    for conn in connections.all(initialized_only=True):
+        pool = getattr(conn, 'pool', None)
+        if pool is not None:
+            stats[conn.alias] = pool.get_stats()
+    return stats
+
+
+class RequestMetrics:
+    """Метрики одного запроса: SQL и время рендеринга шаблонов"""
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.render_depth = 0
+        self.templates = Counter()
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.query_count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+
+class TimedTemplate(Template):
+    """Шаблон, время рендеринга которого попадает в метрики текущего запроса"""
+
+    def render(self, context=None, request=None):
+        metrics = _current_metrics.get()
+        # Вложенный рендеринг (виджеты форм и т.п.) уже учтен во внешнем
+        if metrics is None or metrics.render_depth:
+            return super().render(context, request)
+        metrics.render_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.render_depth -= 1
+            elapsed = time.perf_counter() - started
+            metrics.render_time += elapsed
+            metrics.templates[self.template.name] += elapsed
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    Движок шаблонов Django, который отдает TimedTemplate. Подключается в
+    TEMPLATES['BACKEND'] вместо DjangoTemplates: замеряются только шаблоны
+    этого движка, классы Django не подменяются
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Считает количество SQL-запросов, время БД, дубликаты запросов
+    и время рендеринга шаблонов (движок TimedDjangoTemplates). Результат
+    пишется в лог store.metrics и отдается в заголовке Server-Timing:
+    сотрудникам (is_staff) всегда, остальным - при SERVER_TIMING_HEADER
+    (по умолчанию DEBUG)
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        started = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        total = time.perf_counter() - started
+
+        duplicates = metrics.duplicates
+        if self.show_timing(request):
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.query_count} queries"',
+                f'dup;desc="{sum(duplicates.values())} duplicated queries"',
+                f'render;dur={metrics.render_time * 1000:.1f};desc="{",".join(metrics.templates)}"',
+                f'total;dur={total * 1000:.1f}',
+            ])
+
+        if logger.isEnabledFor(logging.INFO):
+            self.log_metrics(request, response, metrics, total, duplicates)
+        return response
+
+    @staticmethod
+    def show_timing(request):
+        """Заголовок раскрывает шаблоны и нагрузку на БД: только по настройке или сотрудникам"""
+        if getattr(settings, 'SERVER_TIMING_HEADER', settings.DEBUG):
+            return True
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
+
+    def log_metrics(self, request, response, metrics, total, duplicates):
+        match = getattr(request, 'resolver_match', None)
+        logger.info(json.dumps({
+            'event': 'request_metrics',
+            'method': request.method,
+            'path': request.path,
+            'url_name': match.url_name if match else None,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': metrics.query_count,
+            'db_ms': round(metrics.db_time * 1000, 2),
+            'render_ms': round(metrics.render_time * 1000, 2),
+            'templates_ms': {name: round(ms * 1000, 2) for name, ms in metrics.templates.items()},
+            'total_ms': round(total * 1000, 2),
+            'duplicates': duplicates,
+            'db_pool': pool_stats(),
+            'service_cache': service_cache.stats(),
+        }, ensure_ascii=False))
+
+
+class StackSampler:
+    """
+    Сэмплирующий профайлер: фоновый поток периодически снимает стек
+    потока запроса и считает одинаковые стеки (формат collapsed stacks)
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self.collapse(frame)] += 1
+
+    @staticmethod
+    def collapse(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            filename = os.path.basename(code.co_filename)
+            names.append(f'{code.co_name} ({filename}:{code.co_firstlineno})'.replace(';', ':'))
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class SQLTimer:
+    """Время выполнения каждого SQL-запроса"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': fingerprint(sql),
+                'ms': round((time.perf_counter() - started) * 1000, 3),
+            })
+
+
+class SamplingProfilerMiddleware:
+    """
+    Профилирование отдельных запросов без передеплоя.
+    Включается сотрудником (is_staff) заголовком X-Profile: 1 или параметром ?__profile=1,
+    либо для доли трафика REQUEST_PROFILER_SAMPLE_RATE. Стеки сохраняются
+    в REQUEST_PROFILER_DIR в формате flamegraph (.folded) вместе с SQL-таймингами (.json)
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.directory = Path(getattr(settings, 'REQUEST_PROFILER_DIR', 'profiles'))
+        self.sample_rate = float(getattr(settings, 'REQUEST_PROFILER_SAMPLE_RATE', 0))
+        self.interval = float(getattr(settings, 'REQUEST_PROFILER_INTERVAL', 0.005))
+
+    def should_profile(self, request):
+        requested = request.headers.get('X-Profile') == '1' or request.GET.get('__profile') == '1'
+        user = getattr(request, 'user', None)
+        if requested and user is not None and user.is_staff:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        sql = SQLTimer()
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            with contextlib.ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(sql))
+                response = self.get_response(request)
+        finally:
+            sampler.stop()
+        elapsed = time.perf_counter() - started
+
+        profile_id = self.save(request, response, sampler, sql, elapsed)
+        response['X-Profile-Id'] = profile_id
+        return response
+
+    def save(self, request, response, sampler, sql, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.url_name if match and match.url_name else 'unknown'
+        profile_id = f'{time.strftime("%Y%m%dT%H%M%S")}_{url_name}_{uuid.uuid4().hex[:8]}'
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        (self.directory / f'{profile_id}.folded').write_text(sampler.folded(), encoding='utf-8')
+        (self.directory / f'{profile_id}.json').write_text(json.dumps({
+            'id': profile_id,
+            'method': request.method,
+            'path': request.path,
+            'url_name': url_name,
+            'status': response.status_code,
+            'total_ms': round(elapsed * 1000, 2),
+            'samples': sum(sampler.stacks.values()),
+            'interval_ms': self.interval * 1000,
+            'sql_ms': round(sum(query['ms'] for query in sql.queries), 3),
+            'queries': sql.queries,
+        }, ensure_ascii=False, indent=2), encoding='utf-8')
+        return profile_id
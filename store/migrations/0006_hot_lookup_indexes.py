@@ -0,0 +1,79 @@
+# Generated by Django 5.2.5 on 2026-10-19 17:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """
+    На PostgreSQL индекс строится CREATE INDEX CONCURRENTLY, чтобы не блокировать
+    запись в большие таблицы. На остальных БД это обычный AddIndex
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+def create_name_trigram_index(apps, schema_editor):
+    """
+    Поиск по name__icontains на PostgreSQL: UPPER(name) LIKE '%...%'
+    обслуживает только триграммный GIN индекс по тому же выражению
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS product_name_trgm_idx '
+        'ON store_product USING gin ((UPPER(name::text)) gin_trgm_ops)'
+    )
+
+
+def drop_name_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS product_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+    # CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('store', '0005_cacheinvalidation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='cartitem',
+            index=models.Index(fields=['cart', 'product'], name='cartitem_cart_product_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['customer', '-order_date'], name='order_customer_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['status', '-order_date'], name='order_status_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['id'], name='product_active_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='stockbalance',
+            index=models.Index(fields=['quantity'], name='stockbalance_quantity_idx'),
+        ),
+        migrations.RunPython(create_name_trigram_index, drop_name_trigram_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-19 17:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_product_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPopularity',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='store.product')),
+                ('views', models.PositiveBigIntegerField(default=0, verbose_name='Просмотры')),
+                ('score', models.FloatField(default=0, verbose_name='Популярность')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Популярность товара',
+                'verbose_name_plural': 'Популярность товаров',
+                'indexes': [models.Index(fields=['-score', 'product'], name='popularity_score_idx')],
+            },
+        ),
+    ]
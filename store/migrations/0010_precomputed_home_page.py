@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-19 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_productpopularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecomputedPage',
+            fields=[
+                ('key', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('payload', models.JSONField(default=dict)),
+                ('refreshed_at', models.DateTimeField(verbose_name='Дата пересчета')),
+            ],
+            options={
+                'verbose_name': 'Предрассчитанная страница',
+                'verbose_name_plural': 'Предрассчитанные страницы',
+            },
+        ),
+        migrations.AddField(
+            model_name='stockbalance',
+            name='restocked_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Снова в наличии с'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-19 17:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_precomputed_home_page'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSnapshot',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='store.order')),
+                ('data', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Снимок заказа',
+                'verbose_name_plural': 'Снимки заказов',
+            },
+        ),
+    ]
@@ -0,0 +1,122 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:02
+
+from importlib import import_module
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, Count, Exists, OuterRef, Value, When
+
+AddIndexConcurrently = import_module('store.migrations.0006_hot_lookup_indexes').AddIndexConcurrently
+
+BATCH_SIZE = 50000
+
+
+class RemoveIndexConcurrently(migrations.RemoveIndex):
+    """
+    На PostgreSQL индекс удаляется DROP INDEX CONCURRENTLY, без блокировки
+    чтения и записи таблицы. На остальных БД это обычный RemoveIndex
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            index = from_state.models[app_label, self.model_name_lower].get_index_by_name(self.name)
+            schema_editor.remove_index(model, index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            index = to_state.models[app_label, self.model_name_lower].get_index_by_name(self.name)
+            schema_editor.add_index(model, index, concurrently=True)
+
+
+def fill_facets(apps, schema_editor):
+    """
+    Ценовой диапазон и наличие существующих товаров (пачками по id),
+    затем счетчики ячеек фасетов. То же делает команда rebuild_facets.
+    Миграция не атомарная: каждая пачка фиксируется сразу и не держит
+    блокировки строк до конца заполнения
+    """
+    Product = apps.get_model('store', 'Product')
+    StockBalance = apps.get_model('store', 'StockBalance')
+    CatalogFacet = apps.get_model('store', 'CatalogFacet')
+    bounds = getattr(settings, 'CATALOG_PRICE_BUCKETS', [])
+    price_bucket = Case(
+        *[When(price__lt=bound, then=Value(index)) for index, bound in enumerate(bounds)],
+        default=Value(len(bounds)),
+    )
+    in_stock = Exists(StockBalance.objects.filter(product_id=OuterRef('id'), quantity__gt=0))
+    last_id = Product.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    for start in range(0, last_id, BATCH_SIZE):
+        Product.objects.filter(id__gt=start, id__lte=start + BATCH_SIZE).update(
+            price_bucket=price_bucket, in_stock=in_stock,
+        )
+    CatalogFacet.objects.bulk_create([
+        CatalogFacet(**row)
+        for row in Product.objects.filter(is_active=True).values('price_bucket', 'in_stock')
+        .annotate(products=Count('id')).order_by()
+    ])
+
+
+class Migration(migrations.Migration):
+    # CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('store', '0013_cartitem_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_bucket', models.PositiveSmallIntegerField(verbose_name='Ценовой диапазон')),
+                ('in_stock', models.BooleanField(verbose_name='В наличии')),
+                ('products', models.IntegerField(default=0, verbose_name='Товаров')),
+            ],
+            options={
+                'verbose_name': 'Фасет каталога',
+                'verbose_name_plural': 'Фасеты каталога',
+            },
+        ),
+        RemoveIndexConcurrently(
+            model_name='product',
+            name='product_active_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='in_stock',
+            field=models.BooleanField(default=False, verbose_name='В наличии'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price_bucket',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Ценовой диапазон'),
+        ),
+        migrations.RunPython(fill_facets, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['id'], include=('name', 'price', 'slug', 'image'), name='product_active_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['price_bucket', 'id'], include=('name', 'price', 'slug', 'image'), name='product_bucket_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('in_stock', True), ('is_active', True)), fields=['id'], include=('name', 'price', 'slug', 'image'), name='product_in_stock_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('in_stock', True), ('is_active', True)), fields=['price_bucket', 'id'], include=('name', 'price', 'slug', 'image'), name='product_bucket_in_stock_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='catalogfacet',
+            constraint=models.UniqueConstraint(fields=('price_bucket', 'in_stock'), name='catalogfacet_cell_uniq'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:55
+
+from django.db import migrations
+
+BATCH_SIZE = 50000
+
+
+def seed_popularity(apps, schema_editor):
+    """
+    Нулевые счетчики популярности для товаров, которые еще ни разу не
+    просматривались (пачками по id): без строки товар выпадал из
+    сортировки каталога по популярности
+    """
+    Product = apps.get_model('store', 'Product')
+    ProductPopularity = apps.get_model('store', 'ProductPopularity')
+    last_id = Product.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    for start in range(0, last_id, BATCH_SIZE):
+        ids = Product.objects.filter(
+            id__gt=start, id__lte=start + BATCH_SIZE, popularity__isnull=True,
+        ).values_list('id', flat=True)
+        ProductPopularity.objects.bulk_create([ProductPopularity(product_id=product_id) for product_id in ids])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_catalog_facets'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_popularity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_seed_product_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularityEpoch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('epoch', models.DateTimeField(verbose_name='Точка отсчета')),
+            ],
+            options={
+                'verbose_name': 'Точка отсчета популярности',
+                'verbose_name_plural': 'Точка отсчета популярности',
+            },
+        ),
+    ]
@@ -1,25 +1,60 @@
-from django.db import models
+import uuid
+
+from django.db import models, router, transaction
+from django.utils import timezone
 from django.utils.text import slugify
 from django.urls import reverse
 
 from MyOnlineStore import settings
+from .autocomplete import TRANSLIT
 
 
 # Create your models here.
+
+# Поля товара, которые выводит карточка в каталоге
+CATALOG_COLUMNS = ['name', 'price', 'slug', 'image']
+
+
 class Product(models.Model):
     name = models.CharField(max_length=200, verbose_name="Название товара")
     description = models.TextField(verbose_name="Описание")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена")
     image = models.ImageField(upload_to="products/", verbose_name="Изображение", null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата добавления")
-    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+    # Индекс: дочитка измененных товаров в подсказки поиска (store.autocomplete)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Дата обновления")
     slug = models.SlugField(max_length=200, unique=True, blank=True)
     is_active = models.BooleanField(default=True)
+    # Фасеты каталога (store.facets): ценовой диапазон и наличие хранятся в
+    # строке товара, чтобы фильтры каталога обслуживались индексами товаров
+    price_bucket = models.PositiveSmallIntegerField(default=0, verbose_name="Ценовой диапазон")
+    in_stock = models.BooleanField(default=False, verbose_name="В наличии")
+
+    @staticmethod
+    def make_slug(name, product_id=None):
+        """
+        Slug из названия. Кириллица транслитерируется: slugify без
+        allow_unicode оставил бы от русского названия пустую строку.
+        Суффикс product_id делает slug уникальным, даже если названия
+        после транслитерации совпадают
+        """
+        slug = slugify(name.casefold().translate(TRANSLIT))[:180].strip('-') or 'product'
+        return slug if product_id is None else f'{slug}-{product_id}'
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        if self.slug:
+            return super().save(*args, **kwargs)
+        if self.pk is not None:
+            self.slug = self.make_slug(self.name, self.pk)
+            return super().save(*args, **kwargs)
+        # Новый товар без slug: постоянный slug содержит id, который выдаст
+        # вставка, поэтому до нее slug временный
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using):
+            self.slug = uuid.uuid4().hex
+            super().save(*args, **kwargs)
+            self.slug = self.make_slug(self.name, self.pk)
+            super().save(using=using, update_fields=['slug'])
 
     def get_absolute_url(self):
         return reverse('product_detail', args=[self.slug])
@@ -30,6 +65,18 @@ class Product(models.Model):
     class Meta:
         verbose_name = "Товар"
         verbose_name_plural = "Товары"
+        # Страницы каталога: только активные товары, по id. Поля карточки
+        # включены в индексы (INCLUDE, PostgreSQL), страница читается из индекса
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(is_active=True), include=CATALOG_COLUMNS,
+                         name='product_active_idx'),
+            models.Index(fields=['price_bucket', 'id'], condition=models.Q(is_active=True),
+                         include=CATALOG_COLUMNS, name='product_bucket_idx'),
+            models.Index(fields=['id'], condition=models.Q(is_active=True, in_stock=True),
+                         include=CATALOG_COLUMNS, name='product_in_stock_idx'),
+            models.Index(fields=['price_bucket', 'id'], condition=models.Q(is_active=True, in_stock=True),
+                         include=CATALOG_COLUMNS, name='product_bucket_in_stock_idx'),
+        ]
 
 class Inventory(models.Model):
     product = models.OneToOneField(Product, on_delete=models.CASCADE, verbose_name="Товар")
@@ -64,6 +111,12 @@ class Order(models.Model):
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
+        indexes = [
+            # Заказы покупателя в личном кабинете, новые сверху
+            models.Index(fields=['customer', '-order_date'], name='order_customer_date_idx'),
+            # OrderService.get_orders_by_status и фильтр статуса в админке
+            models.Index(fields=['status', '-order_date'], name='order_status_date_idx'),
+        ]
 
     def create_order_from_cart(self, cart):
         for cart_item in cart.items.all():
@@ -97,6 +150,8 @@ class OrderItem(models.Model):
 class Cart(models.Model):
     customer = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name="Покупатель")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    # Последнее изменение состава: по нему cleanup_expired находит брошенные корзины
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Последнее изменение")
 
     def __str__(self):
         return f"Корзина {self.customer}"
@@ -104,6 +159,10 @@ class Cart(models.Model):
     class Meta:
         verbose_name = "Корзина"
         verbose_name_plural = "Корзины"
+        indexes = [
+            # Пачки брошенных корзин по порядку (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='cart_updated_idx'),
+        ]
 
     @property
     def total_price(self):
@@ -140,6 +199,11 @@ class CartItem(models.Model):
     class Meta:
         verbose_name = "Позиция корзины"
         verbose_name_plural = "Позиции корзины"
+        constraints = [
+            # Поиск позиции при добавлении товара в корзину и ключ upsert
+            # при переносе корзины из cookie (store.anonymous_cart.merge)
+            models.UniqueConstraint(fields=['cart', 'product'], name='cartitem_cart_product_uniq'),
+        ]
 
 class StockBalance(models.Model):
     product = models.OneToOneField(
@@ -149,10 +213,165 @@ class StockBalance(models.Model):
     )
     quantity = models.PositiveIntegerField(default=0, verbose_name="Количество на складе")
     last_updated = models.DateTimeField(auto_now=True, verbose_name="Последнее обновление")
+    # Когда остаток последний раз вырос с нуля (блок "снова в продаже" на главной)
+    restocked_at = models.DateTimeField(null=True, blank=True, verbose_name="Снова в наличии с")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Остаток на момент чтения: save() по нему замечает рост с нуля
+        if 'quantity' in field_names:
+            instance._loaded_quantity = instance.quantity
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Рост остатка с нуля отмечается при любом save() (сервисы, админка,
+        # загрузка ORM). Массовые UPDATE и COPY выставляют restocked_at сами
+        update_fields = kwargs.get('update_fields')
+        if self.quantity > 0 and self.pk is not None and (update_fields is None or 'quantity' in update_fields):
+            previous = getattr(self, '_loaded_quantity', None)
+            if previous is None:
+                using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+                previous = StockBalance.objects.using(using).filter(pk=self.pk).values_list('quantity', flat=True).first()
+            if previous == 0:
+                self.restocked_at = timezone.now()
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'restocked_at'}
+        super().save(*args, **kwargs)
+        self._loaded_quantity = self.quantity
 
     def __str__(self):
         return f"{self.product.name} - {self.quantity} шт."
 
     class Meta:
         verbose_name = "Остаток товара"
-        verbose_name_plural = "Остатки товаров"
\ No newline at end of file
+        verbose_name_plural = "Остатки товаров"
+        indexes = [
+            # InventoryService.get_low_stock_products
+            models.Index(fields=['quantity'], name='stockbalance_quantity_idx'),
+        ]
+
+
+class CacheInvalidation(models.Model):
+    """Журнал инвалидаций кеша, который опрашивают воркеры, если LISTEN/NOTIFY недоступен"""
+    tags = models.CharField(max_length=255)
+    origin = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Инвалидация кеша"
+        verbose_name_plural = "Инвалидации кеша"
+
+
+class ProductNeighbour(models.Model):
+    """
+    Товары, которые чаще всего покупают вместе с product: top-K соседей
+    по числу совместных заказов, rank 0 - самый частый
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_index=False, related_name='neighbours')
+    neighbour = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.PositiveIntegerField(verbose_name="Совместных заказов")
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        verbose_name = "Рекомендация"
+        verbose_name_plural = "Рекомендации"
+        constraints = [
+            # Индекс для выдачи рекомендаций одним запросом
+            models.UniqueConstraint(fields=['product', 'rank'], name='productneighbour_product_rank_uniq'),
+        ]
+
+
+class RecommendationRun(models.Model):
+    """Запуск пересчета рекомендаций: заказы до last_order_id уже учтены"""
+    last_order_id = models.BigIntegerField()
+    full = models.BooleanField(default=False)
+    orders = models.PositiveIntegerField(default=0)
+    products = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Пересчет рекомендаций"
+        verbose_name_plural = "Пересчеты рекомендаций"
+
+
+class ProductPopularity(models.Model):
+    """
+    Счетчики товара, накопленные store.counters. score - популярность
+    с затуханием: вклад события растет со временем (forward decay), поэтому
+    старые значения не пересчитываются, а сортировка по score верна всегда.
+    Строка создается вместе с товаром (с нулями), чтобы сортировка каталога
+    по популярности шла по индексу и не теряла товары без просмотров
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='popularity')
+    views = models.PositiveBigIntegerField(default=0, verbose_name="Просмотры")
+    score = models.FloatField(default=0, verbose_name="Популярность")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Популярность товара"
+        verbose_name_plural = "Популярность товаров"
+        indexes = [
+            # Каталог и главная по популярности
+            models.Index(fields=['-score', 'product'], name='popularity_score_idx'),
+        ]
+
+
+class PopularityEpoch(models.Model):
+    """
+    Точка отсчета forward decay для ProductPopularity.score (store.counters),
+    одна строка. Сдвигается вместе с делением всех score, пока множитель
+    вклада не вышел за пределы float
+    """
+    epoch = models.DateTimeField(verbose_name="Точка отсчета")
+
+    class Meta:
+        verbose_name = "Точка отсчета популярности"
+        verbose_name_plural = "Точка отсчета популярности"
+
+
+class PrecomputedPage(models.Model):
+    """
+    Заранее собранные данные страницы (store.homepage): блоки с товарами
+    в JSON, которые представление читает одним запросом по первичному ключу
+    """
+    key = models.CharField(max_length=50, primary_key=True)
+    payload = models.JSONField(default=dict)
+    refreshed_at = models.DateTimeField(verbose_name="Дата пересчета")
+
+    class Meta:
+        verbose_name = "Предрассчитанная страница"
+        verbose_name_plural = "Предрассчитанные страницы"
+
+
+class CatalogFacet(models.Model):
+    """
+    Число активных товаров в ячейке фасетов каталога (store.facets):
+    ценовой диапазон x наличие. Обновляется приращениями при изменении
+    товаров и остатков, фильтры каталога читают все ячейки одним запросом
+    """
+    price_bucket = models.PositiveSmallIntegerField(verbose_name="Ценовой диапазон")
+    in_stock = models.BooleanField(verbose_name="В наличии")
+    products = models.IntegerField(default=0, verbose_name="Товаров")
+
+    class Meta:
+        verbose_name = "Фасет каталога"
+        verbose_name_plural = "Фасеты каталога"
+        constraints = [
+            models.UniqueConstraint(fields=['price_bucket', 'in_stock'], name='catalogfacet_cell_uniq'),
+        ]
+
+
+class OrderSnapshot(models.Model):
+    """
+    Неизменяемый снимок заказа на момент оформления (store.snapshots):
+    позиции с названиями и ценами, итог и адрес в одном JSON. Страницы
+    заказа не зависят от последующих изменений товаров
+    """
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    data = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Снимок заказа"
+        verbose_name_plural = "Снимки заказов"
@@ -0,0 +1,52 @@
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Ниже этой оценки точный COUNT(*) дешев и выполняется как обычно
+ESTIMATE_THRESHOLD = 100000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для больших таблиц: на PostgreSQL число строк берется из оценки
+    планировщика (EXPLAIN), а точный COUNT(*) выполняется, только если
+    оценка меньше ESTIMATE_THRESHOLD. На остальных БД считает точно
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+            return estimate
+        return super().count
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк QuerySet по статистике планировщика PostgreSQL
+    (pg_class.reltuples для таблицы без фильтров). None, если оценить нельзя
+    """
+    if not hasattr(queryset, 'query'):
+        return None
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            # -1: таблица еще ни разу не анализировалась
+            if row is not None and row[0] >= 0:
+                return row[0]
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
@@ -0,0 +1,111 @@
+import csv
+import io
+
+from django.db import connection
+
+NULL = '\\N'
+
+
+def is_postgresql(conn=None):
+    """
+    Проверка, что текущее подключение - PostgreSQL (COPY доступен только там)
+    """
+    return (conn or connection).vendor == 'postgresql'
+
+
+def copy_rows_in(cursor, table, columns, rows, chunk_size=50000):
+    """
+    Потоковая загрузка строк в таблицу через COPY ... FROM STDIN.
+    Строки сериализуются в CSV порциями по chunk_size, поэтому
+    весь набор данных в памяти не держится. Возвращает число строк.
+    """
+    # NULL передается как \N: в CSV-режиме пустое значение без кавычек - это NULL,
+    # а пустые строки должны остаться пустыми строками
+    sql = "COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '{}')".format(
+        table, ', '.join(columns), NULL
+    )
+    total = 0
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    pending = 0
+
+    for row in rows:
+        writer.writerow([NULL if value is None else value for value in row])
+        pending += 1
+        if pending >= chunk_size:
+            _flush(cursor, sql, buffer)
+            total += pending
+            pending = 0
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+
+    if pending:
+        _flush(cursor, sql, buffer)
+        total += pending
+    return total
+
+
+def copy_query_out(cursor, query, fileobj, header=True):
+    """
+    Выгрузка результата запроса через COPY (...) TO STDOUT в CSV.
+    Возвращает число выгруженных строк
+    """
+    sql = 'COPY ({}) TO STDOUT WITH (FORMAT csv{})'.format(
+        query, ', HEADER' if header else ''
+    )
+    raw = _raw_cursor(cursor)
+    if hasattr(raw, 'copy_expert'):
+        raw.copy_expert(sql, fileobj)
+    else:
+        # psycopg 3 отдает данные COPY построчно
+        with raw.copy(sql) as copy:
+            for data in copy:
+                fileobj.write(bytes(data).decode('utf-8'))
+    return raw.rowcount
+
+
+def mogrify(cursor, query, params):
+    """
+    Подстановка параметров в запрос (COPY не принимает параметры)
+    """
+    query = _raw_cursor(cursor).mogrify(query, params)
+    return query.decode() if isinstance(query, bytes) else query
+
+
+def _flush(cursor, sql, buffer):
+    raw = _raw_cursor(cursor)
+    if hasattr(raw, 'copy_expert'):
+        buffer.seek(0)
+        raw.copy_expert(sql, buffer)
+    else:
+        with raw.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+def _raw_cursor(cursor):
+    # Django оборачивает курсор драйвера, COPY вызывается у исходного
+    return getattr(cursor, 'cursor', cursor)
+
+
+def insert_rows(cursor, table, columns, rows, chunk_size=50000):
+    """
+    Массовая вставка строк: COPY на PostgreSQL, executemany порциями на остальных БД
+    """
+    if is_postgresql(cursor.db):
+        return copy_rows_in(cursor, table, columns, rows, chunk_size)
+
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        table, ', '.join(columns), ', '.join(['%s'] * len(columns))
+    )
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            cursor.executemany(sql, batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+        total += len(batch)
+    return total
@@ -0,0 +1,168 @@
+"""
+Ограничение частоты запросов к дорогим представлениям (корзина, оформление
+заказа, вход) по алгоритму token bucket.
+
+Лимиты задаются в RATE_LIMITS по имени URL:
+
+    RATE_LIMITS = {
+        'login': {'ip': '10/m', 'username': '5/m', 'methods': ['POST']},
+    }
+
+Ключи: ip - адрес клиента, user - id пользователя из сессии, username -
+имя из формы входа. Значение '10/m' означает ведро на 10 запросов,
+которое пополняется на 10 токенов в минуту (s, m, h, d).
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+LOCAL_MAX_BUCKETS = 10000
+# Не чаще одного предупреждения о недоступном кеше за это время, секунды
+WARNING_INTERVAL = 60
+
+
+def parse_rate(rate):
+    """
+    '10/m' -> (емкость 10, пополнение 10/60 токенов в секунду)
+    """
+    count, _, period = rate.partition('/')
+    count = int(count)
+    return count, count / PERIODS[period[:1].lower()]
+
+
+class TokenBucket:
+    """Состояние ведра: число токенов и время последнего обновления"""
+
+    @staticmethod
+    def take(state, capacity, refill, now):
+        """
+        Попытка взять токен. Возвращает (разрешено, новое состояние, секунд до токена)
+        """
+        tokens, updated_at = state if state is not None else (capacity, now)
+        tokens = min(capacity, tokens + max(0.0, now - updated_at) * refill)
+        if tokens >= 1:
+            return True, (tokens - 1, now), 0.0
+        return False, (tokens, now), (1 - tokens) / refill
+
+
+class BucketStore:
+    """
+    Хранилище ведер в общем кеше. Если общий кеш недоступен, используется
+    ограниченный LRU в памяти процесса: лимиты становятся приблизительными
+    (на процесс), но запросы продолжают обслуживаться
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._warned_at = 0.0
+
+    def take(self, key, capacity, refill, now):
+        # Ведро заполняется за capacity / refill секунд, после этого хранить его незачем
+        ttl = math.ceil(capacity / refill) + 1
+        try:
+            cache = caches[self.alias]
+            allowed, state, wait = TokenBucket.take(cache.get(key), capacity, refill, now)
+            cache.set(key, state, timeout=ttl)
+            return allowed, wait
+        except Exception:
+            if now - self._warned_at > WARNING_INTERVAL:
+                self._warned_at = now
+                logger.warning('Rate limit cache is unavailable, using in-process buckets', exc_info=True)
+        with self._lock:
+            allowed, state, wait = TokenBucket.take(self._local.get(key), capacity, refill, now)
+            self._local[key] = state
+            self._local.move_to_end(key)
+            while len(self._local) > LOCAL_MAX_BUCKETS:
+                self._local.popitem(last=False)
+        return allowed, wait
+
+
+def client_ip(request):
+    header = getattr(settings, 'RATE_LIMIT_IP_HEADER', None)
+    if header and request.META.get(header):
+        # X-Forwarded-For: клиент - первый адрес в списке
+        return request.META[header].split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def identity(request, scope):
+    """
+    Идентификатор клиента для ключа лимита без обращения к ORM и хеширования
+    """
+    if scope == 'ip':
+        return client_ip(request)
+    if scope == 'user':
+        session = getattr(request, 'session', None)
+        return session.get(SESSION_KEY) if session is not None else None
+    if scope == 'username':
+        if request.method != 'POST':
+            return None
+        username = request.POST.get('username', '').strip().lower()
+        return username or None
+    raise ValueError(f'Unknown rate limit scope: {scope}')
+
+
+class RateLimitMiddleware:
+    """
+    Отклоняет запросы сверх лимита ответом 429 с Retry-After до вызова
+    представления, то есть до запросов к БД и проверки пароля.
+    Должен стоять после SessionMiddleware (лимит по пользователю)
+    """
+    SCOPES = ('ip', 'user', 'username')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.store = BucketStore(getattr(settings, 'RATE_LIMIT_CACHE', 'default'))
+        self._parsed = {}
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not getattr(settings, 'RATE_LIMIT_ENABLED', True):
+            return None
+        url_name = request.resolver_match.url_name
+        config = getattr(settings, 'RATE_LIMITS', {}).get(url_name)
+        if not config or ('methods' in config and request.method not in config['methods']):
+            return None
+
+        now = time.time()
+        for scope in self.SCOPES:
+            rate = config.get(scope)
+            if not rate:
+                continue
+            ident = identity(request, scope)
+            if ident is None:
+                continue
+            capacity, refill = self.rate(rate)
+            digest = hashlib.blake2b(str(ident).encode('utf-8'), digest_size=8).hexdigest()
+            allowed, wait = self.store.take(f'rl:{url_name}:{scope}:{digest}', capacity, refill, now)
+            if not allowed:
+                return self.reject(request, url_name, scope, wait)
+        return None
+
+    def rate(self, rate):
+        if rate not in self._parsed:
+            self._parsed[rate] = parse_rate(rate)
+        return self._parsed[rate]
+
+    def reject(self, request, url_name, scope, wait):
+        retry_after = max(1, math.ceil(wait))
+        logger.info('Rate limit exceeded: %s by %s from %s', url_name, scope, client_ip(request))
+        response = HttpResponse('Слишком много запросов. Повторите попытку позже.',
+                                status=429, content_type='text/plain; charset=utf-8')
+        response['Retry-After'] = str(retry_after)
+        return response
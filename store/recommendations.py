@@ -0,0 +1,157 @@
+"""
+Рекомендации "покупают вместе" по совместным покупкам.
+
+Позиции заказов читаются окнами по id заказа, из каждого окна строится
+разреженная матрица заказ x товар, а ее произведение B.T @ B дает число
+заказов, где встретились оба товара. Для каждого товара в ProductNeighbour
+хранятся только top-K соседей. Инкрементальный пересчет берет заказы после
+последнего запуска и складывает их счетчики с уже сохраненными top-K.
+Он неточен: пары, которые раньше не вошли в top-K, теряют историю, заказ,
+закоммиченный позже заказа с большим id, не попадет ни в один запуск,
+а отмененный после учета заказ не вычитается. Поэтому инкрементальный
+запуск сам становится полным, если последний полный пересчет старше
+RECOMMENDATIONS_FULL_REBUILD_INTERVAL секунд.
+"""
+import itertools
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from scipy import sparse
+
+from .cache import invalidate_tags
+from .models import Order, OrderItem, Product, ProductNeighbour, RecommendationRun
+from .pg_copy import insert_rows
+
+# Заказов в одном окне чтения
+CHUNK_SIZE = 50000
+# Размер пачки id в фильтрах IN
+ID_BATCH_SIZE = 500
+EXCLUDED_STATUSES = ('cancelled',)
+
+
+def top_k_size():
+    return getattr(settings, 'RECOMMENDATIONS_TOP_K', 10)
+
+
+def full_rebuild_due():
+    """Пора ли полный пересчет: последний был раньше RECOMMENDATIONS_FULL_REBUILD_INTERVAL"""
+    interval = getattr(settings, 'RECOMMENDATIONS_FULL_REBUILD_INTERVAL', 24 * 60 * 60)
+    last_full = RecommendationRun.objects.filter(full=True).order_by('-id').values_list('created_at', flat=True).first()
+    return last_full is None or (timezone.now() - last_full).total_seconds() >= interval
+
+
+def order_baskets(after_id, until_id, chunk_size=CHUNK_SIZE):
+    """
+    Позиции заказов с after_id < id <= until_id окнами по chunk_size заказов:
+    пары массивов NumPy (order_id, product_id)
+    """
+    start = after_id
+    while start < until_id:
+        end = min(start + chunk_size, until_id)
+        rows = (
+            OrderItem.objects
+            .filter(order_id__gt=start, order_id__lte=end)
+            .exclude(order__status__in=EXCLUDED_STATUSES)
+            .values_list('order_id', 'product_id')
+        )
+        pairs = np.fromiter(
+            itertools.chain.from_iterable(rows.iterator(chunk_size=10000)), dtype=np.int64
+        ).reshape(-1, 2)
+        if len(pairs):
+            yield pairs[:, 0], pairs[:, 1]
+        start = end
+
+
+def cooccurrence(order_ids, product_ids, size):
+    """
+    Матрица size x size: в ячейке (a, b) - число заказов, где есть оба товара.
+    Повторы товара в одном заказе считаются один раз
+    """
+    _, order_index = np.unique(order_ids, return_inverse=True)
+    baskets = sparse.csr_matrix(
+        (np.ones(len(product_ids), dtype=np.int64), (order_index, product_ids)),
+        shape=(order_index.max() + 1, size),
+    )
+    baskets.sum_duplicates()
+    baskets.data[:] = 1
+    counts = (baskets.T @ baskets).tocsr()
+    counts.setdiag(0)
+    counts.eliminate_zeros()
+    return counts
+
+
+def top_k(counts, k):
+    """
+    Top-K соседей каждой строки матрицы: массивы (product, neighbour, score, rank).
+    При равном счете выше товар с меньшим id
+    """
+    counts = counts.tocoo()
+    order = np.lexsort((counts.col, -counts.data, counts.row))
+    rows, cols, scores = counts.row[order], counts.col[order], counts.data[order]
+    # Ранг внутри строки: позиция элемента минус начало его строки
+    ranks = np.arange(len(rows)) - np.searchsorted(rows, rows, side='left')
+    keep = ranks < k
+    return rows[keep], cols[keep], scores[keep], ranks[keep]
+
+
+def stored_neighbours(product_ids, size):
+    """Сохраненные top-K соседей товаров как разреженная матрица счетчиков"""
+    rows, cols, scores = [], [], []
+    for start in range(0, len(product_ids), ID_BATCH_SIZE):
+        batch = product_ids[start:start + ID_BATCH_SIZE].tolist()
+        for product_id, neighbour_id, score in ProductNeighbour.objects.filter(
+            product_id__in=batch
+        ).values_list('product_id', 'neighbour_id', 'score'):
+            rows.append(product_id)
+            cols.append(neighbour_id)
+            scores.append(score)
+    return sparse.csr_matrix((np.array(scores, dtype=np.int64), (rows, cols)), shape=(size, size))
+
+
+def build(full=False, k=None, chunk_size=CHUNK_SIZE):
+    """
+    Пересчет рекомендаций: полный или по заказам после последнего запуска
+    (полный, если подошел его срок, см. full_rebuild_due).
+    Возвращает созданный RecommendationRun
+    """
+    k = k or top_k_size()
+    full = full or full_rebuild_due()
+    last_run = None if full else RecommendationRun.objects.order_by('-id').first()
+    after_id = last_run.last_order_id if last_run else 0
+    # Сначала граница заказов, потом размер матрицы: товары этих заказов уже существуют
+    until_id = Order.objects.aggregate(m=Max('id'))['m'] or 0
+    size = (Product.objects.aggregate(m=Max('id'))['m'] or 0) + 1
+
+    counts = sparse.csr_matrix((size, size), dtype=np.int64)
+    orders = 0
+    for order_ids, product_ids in order_baskets(after_id, until_id, chunk_size):
+        counts = counts + cooccurrence(order_ids, product_ids, size)
+        orders += len(np.unique(order_ids))
+    affected = np.unique(counts.tocoo().row)
+
+    with transaction.atomic():
+        if full or last_run is None:
+            ProductNeighbour.objects.all().delete()
+        elif len(affected):
+            counts = counts + stored_neighbours(affected, size)
+            for start in range(0, len(affected), ID_BATCH_SIZE):
+                ProductNeighbour.objects.filter(
+                    product_id__in=affected[start:start + ID_BATCH_SIZE].tolist()
+                ).delete()
+
+        products, neighbours, scores, ranks = top_k(counts, k)
+        with connection.cursor() as cursor:
+            insert_rows(
+                cursor, ProductNeighbour._meta.db_table,
+                ['product_id', 'neighbour_id', 'score', 'rank'],
+                zip(products.tolist(), neighbours.tolist(), scores.tolist(), ranks.tolist()),
+            )
+        run = RecommendationRun.objects.create(
+            last_order_id=max(until_id, after_id), full=full or last_run is None,
+            orders=orders, products=len(affected),
+        )
+        transaction.on_commit(lambda: invalidate_tags('recommendations'))
+    return run
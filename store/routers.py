@@ -0,0 +1,140 @@
+import contextvars
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# Модели каталога, которые можно читать с реплик
+CATALOG_MODELS = {'store.product', 'store.stockbalance', 'store.catalogfacet'}
+PIN_COOKIE = 'db_primary'
+
+_routing = contextvars.ContextVar('db_routing', default=None)
+
+
+class RoutingState:
+    """Состояние маршрутизации в рамках одного запроса"""
+
+    def __init__(self):
+        self.use_replica = False
+        self.wrote = False
+
+
+class ReplicaHealth:
+    """
+    Проверка доступности и отставания реплик. Результат кешируется
+    на REPLICA_CHECK_INTERVAL секунд, чтобы не проверять на каждом запросе
+    """
+
+    def __init__(self):
+        self._checked = {}
+
+    def available(self, alias):
+        now = time.monotonic()
+        checked_at, ok = self._checked.get(alias, (None, False))
+        if checked_at is not None and now - checked_at < getattr(settings, 'REPLICA_CHECK_INTERVAL', 5):
+            return ok
+        ok = self.check(alias)
+        self._checked[alias] = (now, ok)
+        return ok
+
+    def check(self, alias):
+        try:
+            lag = replica_lag(alias)
+        except DatabaseError:
+            logger.warning('Replica %s is unavailable, reading from primary', alias)
+            return False
+        max_lag = getattr(settings, 'REPLICA_MAX_LAG', 10)
+        if lag > max_lag:
+            logger.warning('Replica %s lags %.1fs (max %ss), reading from primary', alias, lag, max_lag)
+            return False
+        return True
+
+    def reset(self):
+        self._checked.clear()
+
+
+def replica_lag(alias):
+    """
+    Отставание реплики в секундах. Для не-PostgreSQL баз (например, SQLite
+    в тестах) отставание считается нулевым
+    """
+    conn = connections[alias]
+    if conn.vendor != 'postgresql':
+        return 0.0
+    with conn.cursor() as cursor:
+        cursor.execute(
+            'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+            'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+        )
+        return float(cursor.fetchone()[0])
+
+
+health = ReplicaHealth()
+
+
+class ReplicaRouter:
+    """
+    Чтение товаров и остатков в представлениях каталога идет на реплики,
+    все остальное (запись, корзина, заказ, кабинет) - на основную БД
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if (state is None or not state.use_replica or state.wrote
+                or model._meta.label_lower not in CATALOG_MODELS):
+            return DEFAULT_DB_ALIAS
+        replicas = [alias for alias in getattr(settings, 'DATABASE_REPLICAS', []) if health.available(alias)]
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None and model._meta.label_lower in CATALOG_MODELS:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in getattr(settings, 'DATABASE_REPLICAS', []):
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Включает чтение с реплик для GET-запросов к представлениям каталога
+    (REPLICA_URL_NAMES). После записи пользователь получает cookie,
+    и его чтения REPLICA_PIN_SECONDS секунд идут на основную БД
+    """
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState()
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+
+        if state.wrote or request.method not in self.SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10),
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _routing.get()
+        if (state is not None and request.method in self.SAFE_METHODS
+                and PIN_COOKIE not in request.COOKIES
+                and request.resolver_match.url_name in getattr(settings, 'REPLICA_URL_NAMES', [])):
+            state.use_replica = True
@@ -1,5 +1,14 @@
+import hashlib
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from .models import Order, Cart, CartItem, Product, StockBalance
+from django.db import transaction
+from django.utils import timezone
+from . import facets, homepage
+from .cache import cached, invalidate_tags
+from .models import Order, Cart, CartItem, Product, ProductNeighbour, ProductPopularity, StockBalance
 
 
 class OrderService:
@@ -26,6 +35,22 @@ class OrderService:
         """
         return Order.objects.filter(status=status).order_by('-order_date')
 
+    @staticmethod
+    @cached('orders.by_status', ttl=30, tags=['order'])
+    def get_recent_orders_by_status(status, limit=50):
+        """
+        Последние limit заказов со статусом (индекс order_status_date_idx)
+        """
+        return list(OrderService.get_orders_by_status(status)[:limit])
+
+    @staticmethod
+    @cached('orders.by_id', ttl=60, tags=['order'])
+    def get_order_by_id(order_id):
+        """
+        Заказ с позициями или None
+        """
+        return Order.objects.prefetch_related('items__product').filter(id=order_id).first()
+
     @staticmethod
     def cancel_order(order_id):
         """
@@ -65,6 +90,8 @@ class CartService:
             if not created:
                 cart_item.quantity += quantity
                 cart_item.save()
+            # Корзина активна: ее не удалит очистка брошенных корзин
+            Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
 
             return cart_item
         except Product.DoesNotExist:
@@ -117,6 +144,18 @@ class InventoryService:
         """
         return StockBalance.objects.filter(quantity__lte=threshold)
 
+    @staticmethod
+    @cached('stock.low', ttl=60, tags=['stock', 'product'])
+    def get_low_stock_report(threshold=5, limit=100):
+        """
+        Не больше limit остатков не выше threshold вместе с товарами,
+        начиная с наименьших (индекс stockbalance_quantity_idx)
+        """
+        return list(
+            InventoryService.get_low_stock_products(threshold).select_related('product')
+            .order_by('quantity', 'id')[:limit]
+        )
+
 
 class ProductService:
     """Сервис для работы с товарами"""
@@ -128,6 +167,14 @@ class ProductService:
         """
         return Product.objects.filter(is_active=True)
 
+    @staticmethod
+    @cached('products.popular', ttl=300, tags=['product'])
+    def get_popular_products(limit=8):
+        """
+        Самые популярные доступные товары (store.counters)
+        """
+        return list(popular_products()[:limit])
+
     @staticmethod
     def search_products(query):
         """
@@ -136,4 +183,222 @@ class ProductService:
         return Product.objects.filter(
             name__icontains=query,
             is_active=True
-        )
\ No newline at end of file
+        )
+
+    @staticmethod
+    @cached('products.facets', ttl=30, tags=['product', 'stock'])
+    def get_facet_counts():
+        """
+        Счетчики ячеек фасетов каталога (store.facets)
+        """
+        return facets.counts()
+
+
+class RecommendationService:
+    """Сервис рекомендаций "покупают вместе" (пересчет - store.recommendations)"""
+
+    @staticmethod
+    def neighbours(product_ids):
+        return ProductNeighbour.objects.filter(
+            product_id__in=product_ids,
+            neighbour__is_active=True,
+        ).select_related('neighbour')
+
+    @staticmethod
+    @cached('recommendations.product', ttl=600, tags=['recommendations', 'product'])
+    def for_product(product_id, limit=None):
+        """
+        Товары, которые чаще всего покупают вместе с данным
+        """
+        limit = limit or settings.RECOMMENDATIONS_SHOWN
+        rows = RecommendationService.neighbours([product_id]).order_by('rank')[:limit]
+        return [row.neighbour for row in rows]
+
+    @staticmethod
+    @cached('recommendations.cart', ttl=600, tags=['recommendations', 'product'])
+    def for_cart(product_ids, limit=None):
+        """
+        Рекомендации к корзине: соседи всех ее товаров, кроме уже лежащих
+        в корзине, по сумме совместных покупок
+        """
+        limit = limit or settings.RECOMMENDATIONS_SHOWN
+        scores, products = {}, {}
+        for row in RecommendationService.neighbours(product_ids).exclude(neighbour_id__in=product_ids):
+            scores[row.neighbour_id] = scores.get(row.neighbour_id, 0) + row.score
+            products[row.neighbour_id] = row.neighbour
+        best = sorted(scores, key=lambda product_id: (-scores[product_id], product_id))[:limit]
+        return [products[product_id] for product_id in best]
+
+
+class HomePageService:
+    """Сервис главной страницы"""
+
+    @staticmethod
+    @cached('home.blocks', ttl=60, tags=['home'])
+    def get_blocks():
+        """
+        Предрассчитанные блоки главной (store.homepage)
+        """
+        return homepage.load()['blocks']
+
+
+def popular_products():
+    """
+    Активные товары по убыванию популярности: порядок целиком из индекса
+    popularity_score_idx. Строка ProductPopularity заводится вместе с
+    товаром, поэтому товары без просмотров (score = 0) идут в конце
+    каталога, а не выпадают из него
+    """
+    return Product.objects.filter(is_active=True, popularity__isnull=False).order_by(
+        '-popularity__score', 'popularity__product'
+    )
+
+
+class CatalogSyncService:
+    """Сервис синхронизации каталога с полным снимком от поставщика"""
+
+    @staticmethod
+    def product_hash(description, price, is_active=True):
+        """
+        Хеш полей товара, которые приходят в снимке
+        """
+        value = '\x1f'.join([description or '', str(Decimal(str(price)).quantize(Decimal('0.01'))),
+                              '1' if is_active else '0'])
+        return hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+
+    @staticmethod
+    def stock_hash(quantity):
+        """
+        Хеш остатка товара
+        """
+        return hashlib.blake2b(str(quantity).encode('utf-8'), digest_size=16).digest()
+
+    @staticmethod
+    @transaction.atomic
+    def sync(records, batch_size=1000):
+        """
+        Синхронизация: записываются только изменившиеся строки.
+        Товары, которых нет в снимке, деактивируются.
+        Возвращает сводку изменений
+        """
+        incoming = {}
+        for item in records:
+            incoming[item['name']] = (
+                CatalogSyncService.product_hash(item.get('description', ''), item['price']),
+                CatalogSyncService.stock_hash(item['quantity']),
+                item,
+            )
+
+        summary = {
+            'created': 0, 'updated': 0, 'stock_updated': 0,
+            'deactivated': 0, 'unchanged': 0,
+        }
+        now = timezone.now()
+        products_to_update = []
+        balances_to_update = []
+        balances_to_create = []
+        to_deactivate = []
+        # Наличие товаров для фасетов каталога (store.facets): {новое значение: [id]}
+        in_stock_changes = {True: [], False: []}
+        seen = set()
+
+        # Текущее состояние БД читается одним проходом без создания моделей
+        current = Product.objects.order_by('id').values_list(
+            'id', 'name', 'description', 'price', 'is_active', 'in_stock',
+            'stock_balance__id', 'stock_balance__quantity', 'stock_balance__restocked_at',
+        ).iterator(chunk_size=batch_size)
+
+        for product_id, name, description, price, is_active, in_stock, balance_id, quantity, restocked_at in current:
+            if name not in incoming or name in seen:
+                if is_active and name not in incoming:
+                    to_deactivate.append(product_id)
+                continue
+            seen.add(name)
+            product_digest, stock_digest, item = incoming[name]
+            changed = False
+
+            if CatalogSyncService.product_hash(description, price, is_active) != product_digest:
+                products_to_update.append(Product(
+                    id=product_id,
+                    description=item.get('description', ''),
+                    price=item['price'],
+                    price_bucket=facets.bucket(Decimal(str(item['price']))),
+                    is_active=True,
+                    updated_at=now,
+                ))
+                summary['updated'] += 1
+                changed = True
+
+            if balance_id is None:
+                balances_to_create.append(StockBalance(product_id=product_id, quantity=item['quantity']))
+                summary['stock_updated'] += 1
+                changed = True
+            elif CatalogSyncService.stock_hash(quantity) != stock_digest:
+                balances_to_update.append(StockBalance(
+                    id=balance_id, quantity=item['quantity'], last_updated=now,
+                    restocked_at=now if quantity == 0 and item['quantity'] > 0 else restocked_at,
+                ))
+                summary['stock_updated'] += 1
+                changed = True
+
+            if in_stock != (item['quantity'] > 0):
+                in_stock_changes[item['quantity'] > 0].append(product_id)
+
+            if not changed:
+                summary['unchanged'] += 1
+
+        new_items = [incoming[name][2] for name in incoming if name not in seen]
+        created = Product.objects.bulk_create([
+            Product(
+                name=item['name'],
+                # Временный slug: постоянный содержит id, который выдаст вставка
+                slug=uuid.uuid4().hex,
+                description=item.get('description', ''),
+                price=item['price'],
+                price_bucket=facets.bucket(Decimal(str(item['price']))),
+                in_stock=item['quantity'] > 0,
+                is_active=True,
+            )
+            for item in new_items
+        ], batch_size=batch_size)
+        balances_to_create.extend(
+            StockBalance(product_id=product.id, quantity=item['quantity'])
+            for product, item in zip(created, new_items)
+        )
+        ProductPopularity.objects.bulk_create(
+            [ProductPopularity(product_id=product.id) for product in created], batch_size=batch_size,
+        )
+        for product in created:
+            product.slug = Product.make_slug(product.name, product.id)
+        Product.objects.bulk_update(created, ['slug'], batch_size=batch_size)
+        summary['created'] = len(created)
+
+        Product.objects.bulk_update(
+            products_to_update, ['description', 'price', 'price_bucket', 'is_active', 'updated_at'],
+            batch_size=batch_size,
+        )
+        StockBalance.objects.bulk_update(
+            balances_to_update, ['quantity', 'last_updated', 'restocked_at'], batch_size=batch_size,
+        )
+        StockBalance.objects.bulk_create(balances_to_create, batch_size=batch_size)
+
+        for start in range(0, len(to_deactivate), batch_size):
+            Product.objects.filter(id__in=to_deactivate[start:start + batch_size]).update(
+                is_active=False, updated_at=now,
+            )
+        summary['deactivated'] = len(to_deactivate)
+
+        for in_stock, ids in in_stock_changes.items():
+            for start in range(0, len(ids), batch_size):
+                Product.objects.filter(id__in=ids[start:start + batch_size]).update(in_stock=in_stock)
+        products_changed = bool(created or products_to_update or to_deactivate or any(in_stock_changes.values()))
+        if products_changed:
+            facets.recount()
+
+        # bulk-операции не отправляют сигналы, поэтому кеш сбрасывается явно,
+        # но только по тем тегам, данные которых изменились
+        tags = [tag for tag, changed in (('product', products_changed),
+                                         ('stock', balances_to_create or balances_to_update)) if changed]
+        if tags:
+            invalidate_tags(*tags)
+        return summary
@@ -0,0 +1,136 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
+
+from . import anonymous_cart, facets
+from .autocomplete import index as autocomplete_index
+from .cache import invalidate_tags, service_cache
+from .invalidation import bus, drop_navigation, navigation_tag
+from .models import Product, ProductPopularity, StockBalance, Order, OrderItem, Cart, CartItem
+
+# Теги кеша сервисов, которые сбрасываются при изменении модели
+MODEL_CACHE_TAGS = {
+    Product: ('product',),
+    StockBalance: ('stock',),
+    Order: ('order',),
+    OrderItem: ('order',),
+}
+
+
+def invalidate_service_cache(sender, **kwargs):
+    tags = MODEL_CACHE_TAGS[sender]
+    # Сразу и после коммита: иначе параллельный запрос может успеть
+    # закешировать данные до фиксации транзакции. Другим процессам
+    # сообщение уходит только после коммита
+    service_cache.invalidate_tags(*tags)
+    transaction.on_commit(lambda: invalidate_tags(*tags))
+
+
+def invalidate_navigation(user_id):
+    """
+    Сброс закешированной навигации base.html (имя и корзина пользователя).
+    Другие процессы получают сброс через шину: кеш по умолчанию без
+    REDIS_URL у каждого процесса свой
+    """
+    drop_navigation(user_id)
+
+    def after_commit():
+        drop_navigation(user_id)
+        bus.publish(navigation_tag(user_id))
+
+    transaction.on_commit(after_commit)
+
+
+def invalidate_user_navigation(sender, instance, **kwargs):
+    invalidate_navigation(instance.pk)
+
+
+def invalidate_cart_navigation(sender, instance, **kwargs):
+    if sender is Cart:
+        invalidate_navigation(instance.customer_id)
+    elif CartItem.cart.is_cached(instance):
+        invalidate_navigation(instance.cart.customer_id)
+    else:
+        customer_id = Cart.objects.filter(pk=instance.cart_id).values_list('customer_id', flat=True).first()
+        if customer_id is not None:
+            invalidate_navigation(customer_id)
+
+
+def update_autocomplete(sender, instance, signal, **kwargs):
+    # Удаленный товар пропадает из подсказок так же, как снятый с продажи
+    active = instance.is_active and signal is post_save
+    product_id, name, slug = instance.pk, instance.name, instance.slug
+    transaction.on_commit(lambda: autocomplete_index.apply(product_id, name, slug, active))
+
+
+def remember_facet_cell(sender, instance, raw=False, using='default', **kwargs):
+    # Ячейка фасетов, в которой товар посчитан сейчас. Диапазон считается
+    # из цены; наличие ведут только остатки, поэтому оно берется из БД,
+    # а не из возможно устаревшего экземпляра
+    if raw:
+        return
+    instance.price_bucket = facets.bucket(instance.price)
+    instance._facet_cell = None
+    if instance.pk is None:
+        return
+    row = Product.objects.using(using).filter(pk=instance.pk).values_list(
+        'is_active', 'price_bucket', 'in_stock'
+    ).first()
+    if row is not None:
+        instance.in_stock = row[2]
+        instance._facet_cell = facets.cell(*row)
+
+
+def update_product_facets(sender, instance, signal, raw=False, using='default', **kwargs):
+    if raw:
+        return
+    new = facets.cell(instance.is_active, instance.price_bucket, instance.in_stock) if signal is post_save else None
+    facets.move(getattr(instance, '_facet_cell', None), new, using)
+
+
+def update_stock_facets(sender, instance, signal, raw=False, using='default', origin=None, **kwargs):
+    # Остатки, удаляемые каскадом вместе с товаром, не трогают фасеты:
+    # товар уходит из своей ячейки сам
+    if raw or isinstance(origin, Product) or (isinstance(origin, QuerySet) and origin.model is Product):
+        return
+    facets.set_in_stock(instance.product_id, signal is post_save and instance.quantity > 0, using)
+
+
+def create_popularity(sender, instance, created, raw=False, using='default', **kwargs):
+    # Сортировка по популярности идет по строкам ProductPopularity:
+    # товар без строки не попал бы в каталог с этой сортировкой
+    if created and not raw:
+        ProductPopularity.objects.using(using).create(product=instance)
+
+
+def merge_anonymous_cart(sender, request, user, **kwargs):
+    # Корзина из cookie переносится в корзину пользователя, cookie удаляется
+    cart = getattr(request, 'anonymous_cart', None)
+    if cart is None or not cart.items:
+        return
+    if anonymous_cart.merge(user, cart.items):
+        invalidate_navigation(user.pk)
+    cart.clear()
+
+
+# Обработчики подключаются к конкретным моделям: обработчик без sender
+# отключил бы быстрое удаление (fast delete) для всех моделей
+for model in MODEL_CACHE_TAGS:
+    post_save.connect(invalidate_service_cache, sender=model)
+    post_delete.connect(invalidate_service_cache, sender=model)
+for model in (Cart, CartItem):
+    post_save.connect(invalidate_cart_navigation, sender=model)
+    post_delete.connect(invalidate_cart_navigation, sender=model)
+post_save.connect(invalidate_user_navigation, sender=get_user_model())
+post_save.connect(update_autocomplete, sender=Product)
+post_delete.connect(update_autocomplete, sender=Product)
+pre_save.connect(remember_facet_cell, sender=Product)
+pre_delete.connect(remember_facet_cell, sender=Product)
+post_save.connect(update_product_facets, sender=Product)
+post_save.connect(create_popularity, sender=Product)
+post_delete.connect(update_product_facets, sender=Product)
+post_save.connect(update_stock_facets, sender=StockBalance)
+post_delete.connect(update_stock_facets, sender=StockBalance)
+user_logged_in.connect(merge_anonymous_cart)
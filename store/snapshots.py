@@ -0,0 +1,80 @@
+"""
+Неизменяемые снимки заказов.
+
+При оформлении заказа его позиции с названиями и ценами, итог и адрес
+записываются одним JSON в OrderSnapshot. Страницы заказа читают заказ вместе
+со снимком одним запросом по первичному ключу и не соединяют OrderItem
+с Product: изменение или удаление товара не меняет уже оформленный заказ.
+Заказы, оформленные до появления снимков, заполняет команда
+backfill_order_snapshots; пока снимка нет, он собирается из позиций на лету.
+"""
+from .models import Order, OrderItem, OrderSnapshot
+
+SNAPSHOT_VERSION = 1
+
+
+def build(order, items):
+    """Данные снимка: items - (product_id, name, price, quantity) в порядке позиций"""
+    return {
+        'version': SNAPSHOT_VERSION,
+        'shipping_address': order.shipping_address,
+        'total': str(order.total_amount),
+        'items': [
+            {
+                'product_id': product_id,
+                'name': name,
+                'price': str(price),
+                'quantity': quantity,
+                'total': str(price * quantity),
+            }
+            for product_id, name, price, quantity in items
+        ],
+    }
+
+
+def order_items(**filters):
+    """Позиции заказов одним запросом: {order_id: [(product_id, name, price, quantity), ...]}"""
+    items = {}
+    rows = OrderItem.objects.filter(**filters).order_by('order_id', 'id').values_list(
+        'order_id', 'product_id', 'product__name', 'price', 'quantity',
+    )
+    for order_id, *item in rows:
+        items.setdefault(order_id, []).append(tuple(item))
+    return items
+
+
+def create(order):
+    """Снимок только что оформленного заказа"""
+    items = order_items(order_id=order.id).get(order.id, [])
+    return OrderSnapshot.objects.create(order=order, data=build(order, items))
+
+
+def get(order):
+    """
+    Данные снимка заказа. Заказ стоит читать с select_related('snapshot'),
+    для заказа без снимка данные собираются из позиций
+    """
+    try:
+        return order.snapshot.data
+    except OrderSnapshot.DoesNotExist:
+        return build(order, order_items(order_id=order.id).get(order.id, []))
+
+
+def backfill(start, end):
+    """
+    Снимки заказов с start < id <= end, у которых их еще нет.
+    Возвращает число заказов, для которых записан снимок
+    """
+    orders = list(
+        Order.objects.filter(id__gt=start, id__lte=end, snapshot__isnull=True)
+        .only('id', 'shipping_address', 'total_amount')
+    )
+    if not orders:
+        return 0
+    items = order_items(order_id__gt=start, order_id__lte=end)
+    # ignore_conflicts: снимок мог появиться при оформлении параллельно с заполнением
+    OrderSnapshot.objects.bulk_create([
+        OrderSnapshot(order=order, data=build(order, items.get(order.id, [])))
+        for order in orders
+    ], ignore_conflicts=True)
+    return len(orders)
@@ -0,0 +1,178 @@
+"""
+Статика с хешами в именах, заранее сжатыми gzip-копиями и раздачей
+из процесса приложения с долгим кешированием.
+"""
+import gzip
+import json
+import logging
+import mimetypes
+import os
+import posixpath
+import stat
+from email.utils import formatdate
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import parse_etags
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico', '.ttf', '.otf', '.eot'}
+# Меньше этого размера заголовки gzip съедают выигрыш
+MIN_COMPRESS_SIZE = 256
+# Сжатая копия сохраняется, только если она хотя бы на 5% меньше оригинала
+MIN_COMPRESS_RATIO = 0.95
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def compress_file(path):
+    """
+    Создание path.gz рядом с файлом. Возвращает размер сжатой копии или None
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return None
+    # mtime=0: одинаковый результат при повторной сборке
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) > len(data) * MIN_COMPRESS_RATIO:
+        if os.path.exists(path + '.gz'):
+            os.remove(path + '.gz')
+        return None
+    with open(path + '.gz', 'wb') as f:
+        f.write(compressed)
+    return len(compressed)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage, который после collectstatic сжимает
+    текстовые файлы в .gz. Если файла нет в манифесте (collectstatic
+    не запускался, например в тестах), отдается исходное имя
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        names = set(self.hashed_files.values()) | set(paths)
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS and self.exists(name):
+                compress_file(self.path(name))
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            logger.debug('Static file %s is missing from the manifest, serving it unhashed', name)
+            return name
+
+
+class StaticAsset:
+    """Файл из STATIC_ROOT и его сжатая копия, если она есть"""
+    __slots__ = ('path', 'size', 'content_type', 'last_modified', 'etag', 'gzip_size', 'cache_control')
+
+    def __init__(self, path, st, cache_control):
+        self.path = path
+        self.size = st.st_size
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type in ('application/javascript', 'image/svg+xml'):
+            self.content_type += '; charset=utf-8'
+        self.last_modified = formatdate(st.st_mtime, usegmt=True)
+        self.etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        try:
+            self.gzip_size = os.stat(path + '.gz').st_size
+        except FileNotFoundError:
+            self.gzip_size = None
+        self.cache_control = cache_control
+
+
+def accepts_gzip(request):
+    for coding in request.headers.get('Accept-Encoding', '').split(','):
+        name, _, params = coding.strip().partition(';')
+        if name.strip().lower() in ('gzip', '*'):
+            return params.replace(' ', '').lower() not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+class StaticFilesMiddleware:
+    """
+    Раздача собранной статики (STATIC_ROOT) прямо из процесса приложения.
+    Файлы с хешем в имени (из манифеста) кешируются браузером на год как
+    immutable, остальные - на STATIC_MAX_AGE секунд. Клиентам с
+    Accept-Encoding: gzip отдается заранее сжатая копия
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'STATIC_SERVE', True) or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        self.root = str(settings.STATIC_ROOT)
+        self.max_age = getattr(settings, 'STATIC_MAX_AGE', 60)
+        # В режиме отладки файлы меняются без перезапуска, поэтому без кеша
+        self.autorefresh = settings.DEBUG
+        self.immutable = self.load_manifest()
+        self.assets = {}
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            asset = self.find(request.path_info[len(self.prefix):])
+            if asset is not None:
+                return self.serve(request, asset)
+        return self.get_response(request)
+
+    def load_manifest(self):
+        path = os.path.join(self.root, ManifestStaticFilesStorage.manifest_name)
+        try:
+            with open(path, encoding='utf-8') as f:
+                return set(json.load(f).get('paths', {}).values())
+        except (OSError, ValueError):
+            return set()
+
+    def find(self, name):
+        name = posixpath.normpath(name).lstrip('/')
+        if not self.autorefresh and name in self.assets:
+            return self.assets[name]
+        asset = None
+        try:
+            path = safe_join(self.root, name)
+            st = os.stat(path)
+            if stat.S_ISREG(st.st_mode) and not name.endswith('.gz'):
+                if self.autorefresh:
+                    self.immutable = self.load_manifest()
+                cache_control = (IMMUTABLE_CACHE_CONTROL if name in self.immutable
+                                 else f'public, max-age={self.max_age}')
+                asset = StaticAsset(path, st, cache_control)
+        except (OSError, ValueError, SuspiciousFileOperation):
+            pass
+        if asset is not None and not self.autorefresh:
+            self.assets[name] = asset
+        return asset
+
+    def serve(self, request, asset):
+        use_gzip = asset.gzip_size is not None and accepts_gzip(request)
+        etag = asset.etag[:-1] + '-gz"' if use_gzip else asset.etag
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (etag in parse_etags(if_none_match) or '*' in parse_etags(if_none_match)):
+            response = HttpResponseNotModified()
+        else:
+            if request.method == 'HEAD':
+                response = HttpResponse(content_type=asset.content_type)
+            else:
+                path = asset.path + '.gz' if use_gzip else asset.path
+                response = FileResponse(open(path, 'rb'), content_type=asset.content_type)
+                response.headers.pop('Content-Disposition', None)
+            response['Content-Length'] = asset.gzip_size if use_gzip else asset.size
+            if use_gzip:
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        response['Last-Modified'] = asset.last_modified
+        response['Cache-Control'] = asset.cache_control
+        if asset.gzip_size is not None:
+            response['Vary'] = 'Accept-Encoding'
+        return response
@@ -0,0 +1,118 @@
+import contextlib
+import json
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Базовый класс для тестов бюджета SQL-запросов.
+    В query_budgets задается максимальное число запросов для каждого имени URL,
+    assertWithinBudget падает, если представление выходит за бюджет
+    """
+    query_budgets = {}
+
+    def assertWithinBudget(self, url_name, args=None, method='get', data=None, using=DEFAULT_DB_ALIAS):
+        if url_name not in self.query_budgets:
+            self.fail(f'No query budget declared for "{url_name}"')
+        budget = self.query_budgets[url_name]
+
+        with CaptureQueriesContext(connections[using]) as context:
+            response = getattr(self.client, method)(reverse(url_name, args=args), data)
+
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = '\n'.join(
+                f'{i}. {query["sql"]}' for i, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(f'"{url_name}" executed {executed} queries, budget is {budget}:\n{queries}')
+        return response
+
+
+class QueryPlanTestCase(TestCase):
+    """
+    Базовый класс для проверки планов запросов.
+    assertNoSeqScan выполняет EXPLAIN и падает, если планировщик читает
+    целиком одну из таблиц large_tables. Поддерживаются PostgreSQL
+    (EXPLAIN FORMAT JSON) и SQLite (EXPLAIN QUERY PLAN). assertViewNoSeqScan
+    и assertQueriesNoSeqScan проверяют так же все SELECT, которые выполнило
+    представление или блок кода
+    """
+    large_tables = ()
+
+    @classmethod
+    def analyze(cls, using=DEFAULT_DB_ALIAS):
+        """Обновить статистику планировщика после заполнения таблиц"""
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                for table in cls.large_tables:
+                    cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+            else:
+                cursor.execute('ANALYZE')
+
+    @staticmethod
+    def sequential_scans(sql, params=(), using=DEFAULT_DB_ALIAS, limited=False):
+        """
+        Таблицы, которые план запроса читает полным перебором. limited - в запросе
+        есть LIMIT: SQLite обходит таблицу в порядке rowid (это и есть первичный
+        ключ) и останавливается на лимите, если сортировка не нужна
+        """
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                nodes, tables = [plan[0]['Plan']], []
+                while nodes:
+                    node = nodes.pop()
+                    if node['Node Type'] == 'Seq Scan':
+                        tables.append(node['Relation Name'])
+                    nodes.extend(node.get('Plans', ()))
+                return tables
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            details = [detail for *_, detail in cursor.fetchall()]
+            if limited and not any(detail.startswith('USE TEMP B-TREE') for detail in details):
+                return []
+            # "SCAN table" без "USING INDEX" - полный перебор таблицы
+            return [match.group(1) for detail in details if (match := re.match(r'SCAN (\w+)$', detail))]
+
+    def assertNoSeqScan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        scanned = [
+            table for table in self.sequential_scans(
+                sql, params, queryset.db, limited=queryset.query.high_mark is not None
+            )
+            if table in self.large_tables
+        ]
+        if scanned:
+            self.fail(f'Sequential scan on {", ".join(scanned)}:\n{queryset.explain()}')
+
+    def assertViewNoSeqScan(self, url_name, args=None, data=None, using=DEFAULT_DB_ALIAS):
+        with self.assertQueriesNoSeqScan(f'"{url_name}"', using):
+            response = self.client.get(reverse(url_name, args=args), data)
+        self.assertLess(response.status_code, 400, f'"{url_name}" returned {response.status_code}')
+        return response
+
+    @contextlib.contextmanager
+    def assertQueriesNoSeqScan(self, label, using=DEFAULT_DB_ALIAS):
+        """Проверка планов всех SELECT, выполненных внутри блока"""
+        with CaptureQueriesContext(connections[using]) as context:
+            yield
+        for query in context.captured_queries:
+            # Параметры уже подставлены в текст запроса
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            scanned = [
+                table for table in self.sequential_scans(sql, None, using, limited=' LIMIT ' in sql)
+                if table in self.large_tables
+            ]
+            if scanned:
+                self.fail(f'{label}: sequential scan on {", ".join(scanned)}:\n{sql}')
@@ -1,7 +1,15 @@
-from django.test import TestCase, Client
+import os
+import tempfile
+from unittest import mock
+
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from .models import Product, Inventory, Cart, CartItem, Order, OrderItem, StockBalance
+from .testing import QueryBudgetTestCase
+from .views import PRODUCTS_PER_PAGE
+from MyOnlineStore.warmup import close_connections, warmup_code, warmup_connections
 
 User = get_user_model()
 
@@ -22,6 +30,15 @@ class ProductModelTest(TestCase):
         self.assertTrue(self.product.is_active)
         self.assertIsNotNone(self.product.slug)
 
+    def test_generated_slug_is_unique(self):
+        """Тест: slug из совпадающих после транслитерации названий различается id"""
+        first = Product.objects.create(name="Смартфон Samsung", price=10)
+        second = Product.objects.create(name="Смартфон, Samsung!", price=10)
+
+        self.assertEqual(first.slug, f'smartfon-samsung-{first.id}')
+        self.assertEqual(Product.objects.get(id=second.id).slug, f'smartfon-samsung-{second.id}')
+        self.assertEqual(Product.objects.create(name="Phone", slug="phone", price=10).slug, 'phone')
+
     def test_product_str_representation(self):
         """Тест строкового представления товара"""
         self.assertEqual(str(self.product), "Test Product")
@@ -81,6 +98,40 @@ class StockBalanceModelTest(TestCase):
                 quantity=-5
             )
 
+    def test_restock_from_zero_sets_restocked_at(self):
+        """Тест: save() отмечает рост остатка с нуля, в том числе с update_fields"""
+        # Arrange
+        StockBalance.objects.filter(pk=self.stock_balance.pk).update(quantity=0)
+        balance = StockBalance.objects.get(pk=self.stock_balance.pk)
+
+        # Act
+        balance.quantity = 5
+        balance.save(update_fields=['quantity'])
+
+        # Assert
+        self.assertIsNotNone(StockBalance.objects.get(pk=balance.pk).restocked_at)
+
+    def test_restock_of_unloaded_instance(self):
+        """Тест: для объекта, собранного без чтения из базы, прежний остаток читается из базы"""
+        # Arrange
+        StockBalance.objects.filter(pk=self.stock_balance.pk).update(quantity=0)
+        balance = StockBalance(pk=self.stock_balance.pk, product=self.product, quantity=3)
+
+        # Act
+        balance.save()
+
+        # Assert
+        self.assertIsNotNone(StockBalance.objects.get(pk=balance.pk).restocked_at)
+
+    def test_change_above_zero_keeps_restocked_at(self):
+        """Тест: изменение ненулевого остатка и обнуление не трогают restocked_at"""
+        balance = StockBalance.objects.get(pk=self.stock_balance.pk)
+        for quantity in (40, 0):
+            with self.subTest(quantity=quantity):
+                balance.quantity = quantity
+                balance.save()
+                self.assertIsNone(StockBalance.objects.get(pk=balance.pk).restocked_at)
+
     def test_stock_balance_str_representation(self):
         """Тест строкового представления остатка товара"""
         expected_str = f"{self.product.name} - {self.stock_balance.quantity} шт."
@@ -145,6 +196,25 @@ class StoreViewsTest(TestCase):
         self.assertTemplateUsed(response, 'store/product_list.html')
         self.assertContains(response, 'Test Product')
 
+    def test_product_list_pages(self):
+        """Тест: каталог выводится постранично без подсчета всех товаров"""
+        # Arrange
+        Product.objects.bulk_create([
+            Product(name=f"Page Product {i}", slug=f"page-product-{i}", description="", price=1)
+            for i in range(PRODUCTS_PER_PAGE)
+        ])
+
+        # Act
+        first = self.client.get(reverse('product_list'))
+        second = self.client.get(reverse('product_list'), {'page': 2})
+
+        # Assert
+        self.assertEqual(len(first.context['products']), PRODUCTS_PER_PAGE)
+        self.assertTrue(first.context['has_next'])
+        self.assertEqual(len(second.context['products']), 1)
+        self.assertFalse(second.context['has_next'])
+        self.assertContains(second, '?page=1')
+
     def test_product_detail_view(self):
         """Тест представления деталей товара"""
         response = self.client.get(reverse('product_detail', args=[self.product.slug]))
@@ -156,4 +226,190 @@ class StoreViewsTest(TestCase):
         """Тест главной страницы"""
         response = self.client.get(reverse('home'))
         self.assertEqual(response.status_code, 200)
-        self.assertTemplateUsed(response, 'store/home.html')
\ No newline at end of file
+        self.assertTemplateUsed(response, 'store/home.html')
+
+
+class QueryBudgetTest(QueryBudgetTestCase):
+    """Бюджеты SQL-запросов: число запросов не должно зависеть от числа позиций"""
+    # Для вошедшего пользователя +1 запрос: счетчик корзины в навигации
+    # при промахе фрагментного кеша (первый запрос после изменения корзины).
+    # Корзине +1 запрос на рекомендации, каталогу +1 на счетчики фасетов
+    # при промахе кеша сервисов
+    query_budgets = {
+        'product_list': 2,
+        'cart': 7,
+        'checkout': 6,
+        'my_account': 4,
+        'order_detail': 6,
+    }
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123',
+            email='test@example.com'
+        )
+        self.client.login(username='testuser', password='testpass123')
+        cart = Cart.objects.create(customer=self.user)
+        self.order = Order.objects.create(customer=self.user, total_amount=0, shipping_address="Address")
+        for i in range(5):
+            product = Product.objects.create(name=f"Product {i}", price=10.00 + i)
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+            OrderItem.objects.create(order=self.order, product=product, quantity=1, price=product.price)
+            Order.objects.create(customer=self.user, total_amount=10, shipping_address="Address")
+
+    def test_product_list_budget(self):
+        """Тест бюджета каталога"""
+        self.client.logout()
+        self.assertWithinBudget('product_list')
+
+    def test_cart_budget(self):
+        """Тест бюджета корзины"""
+        response = self.assertWithinBudget('cart')
+        self.assertContains(response, 'Product 4')
+
+    def test_checkout_budget(self):
+        """Тест бюджета оформления заказа"""
+        self.assertWithinBudget('checkout')
+
+    def test_my_account_budget(self):
+        """Тест бюджета личного кабинета"""
+        self.assertWithinBudget('my_account')
+
+    def test_order_detail_budget(self):
+        """Тест бюджета страницы заказа"""
+        response = self.assertWithinBudget('order_detail', args=[self.order.id])
+        self.assertContains(response, 'Product 4')
+
+
+@override_settings(SERVER_TIMING_HEADER=False)
+class QueryInstrumentationMiddlewareTest(TestCase):
+    """Тесты заголовка Server-Timing"""
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        Product.objects.create(name="Test Product", price=100.00)
+
+    def test_header_hidden_from_customers(self):
+        """Тест: покупатели не видят Server-Timing"""
+        response = self.client.get(reverse('product_list'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+
+    def test_header_for_staff(self):
+        """Тест: сотрудник видит запросы к БД и время рендеринга шаблона"""
+        self.client.force_login(self.staff)
+
+        response = self.client.get(reverse('cart'))
+
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('render;dur=', response['Server-Timing'])
+        self.assertIn('store/cart.html', response['Server-Timing'])
+
+    def test_header_enabled_by_setting(self):
+        """Тест: SERVER_TIMING_HEADER включает заголовок для всех"""
+        with override_settings(SERVER_TIMING_HEADER=True):
+            response = self.client.get(reverse('product_list'))
+
+        self.assertIn('render;dur=', response['Server-Timing'])
+
+
+class SamplingProfilerMiddlewareTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.staff = User.objects.create_user(
+            username='staff',
+            password='testpass123',
+            email='staff@example.com',
+            is_staff=True
+        )
+        Product.objects.create(name="Test Product", price=100.00)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_staff_can_profile_request(self):
+        """Тест профилирования запроса сотрудником по заголовку"""
+        self.client.login(username='staff', password='testpass123')
+        with override_settings(REQUEST_PROFILER_DIR=self.tmpdir.name):
+            response = self.client.get(reverse('product_list'), HTTP_X_PROFILE='1')
+
+        profile_id = response['X-Profile-Id']
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir.name, f'{profile_id}.folded')))
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir.name, f'{profile_id}.json')))
+
+    def test_anonymous_profile_flag_is_ignored(self):
+        """Тест: флаг профилирования от обычного посетителя игнорируется"""
+        with override_settings(REQUEST_PROFILER_DIR=self.tmpdir.name):
+            response = self.client.get(reverse('product_list') + '?__profile=1')
+
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+
+class WarmupTest(TestCase):
+    """Тесты прогрева приложения перед приемом запросов (gunicorn.conf.py)"""
+
+    def test_warmup_compiles_templates_and_resolves_urls(self):
+        """Тест: прогрев находит URL и компилирует шаблоны магазина"""
+        stats = warmup_code()
+
+        self.assertGreaterEqual(stats['urls'], 10)
+        self.assertGreater(stats['templates'], 0)
+
+    def test_warmup_opens_connections(self):
+        """Тест: прогрев открывает соединение с БД"""
+        stats = warmup_connections()
+
+        self.assertEqual(stats['databases'], 1)
+
+
+class CloseConnectionsTest(TransactionTestCase):
+    """Тест закрытия соединений мастера перед fork (gunicorn.conf.py)"""
+
+    def test_close_connections_before_fork(self):
+        """Тест: перед fork закрываются и соединения, и пулы соединений"""
+        warmup_connections()
+
+        close_connections()
+
+        for alias in connections:
+            self.assertNotIn(alias, getattr(connections[alias], '_connection_pools', ()))
+
+
+class NavigationFragmentCacheTest(TestCase):
+    """Тесты фрагментного кеша навигации в base.html"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123',
+            email='test@example.com',
+            first_name='Иван'
+        )
+        self.product = Product.objects.create(name="Test Product", price=100.00)
+        StockBalance.objects.create(product=self.product, quantity=10)
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_navigation_is_cached_per_user(self):
+        """Тест: повторная страница не считает корзину заново"""
+        self.client.get(reverse('my_account'))
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('my_account'))
+        self.assertContains(response, 'Привет, Иван!')
+
+    def test_cart_change_refreshes_badge(self):
+        """Тест: изменение корзины сбрасывает закешированный счетчик"""
+        self.client.get(reverse('my_account'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('add_to_cart', args=[self.product.id]))
+        response = self.client.get(reverse('my_account'))
+        self.assertContains(response, 'badge-primary">1</span>')
+
+    def test_cart_change_notifies_other_processes(self):
+        """Тест: сброс навигации уходит в шину инвалидации для других процессов"""
+        with mock.patch('store.signals.bus.publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('add_to_cart', args=[self.product.id]))
+
+        publish.assert_any_call(f'nav:{self.user.id}')
@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .models import Product, Order, OrderItem, Cart, CartItem, Inventory
+from .pagination import EstimatedCountPaginator, estimate_count
+
+User = get_user_model()
+
+
+class AdminChangelistTest(TestCase):
+    """Тесты списков админки для больших таблиц"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='adminpass123', email='a@example.com')
+        for i in range(3):
+            customer = User.objects.create_user(username=f'customer{i}', password='x', email=f'customer{i}@example.com')
+            product = Product.objects.create(name=f"Product {i}", price=10 + i)
+            Inventory.objects.create(product=product, quantity=i)
+            cart = Cart.objects.create(customer=customer)
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            order = Order.objects.create(customer=customer, total_amount=10, shipping_address="Address")
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, model):
+        url = reverse(f'admin:store_{model._meta.model_name}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Тест: число запросов списка не зависит от числа строк"""
+        for model in (Order, OrderItem, Cart, CartItem, Inventory):
+            with self.subTest(model=model.__name__):
+                # Arrange: первый запрос прогревает тему админки и кеши
+                self.changelist_queries(model)
+                before = self.changelist_queries(model)
+                customer = User.objects.create_user(
+                    username=f'extra-{model.__name__}', password='x', email=f'{model.__name__}@example.com'
+                )
+                product = Product.objects.create(name=f"Extra {model.__name__}", price=1)
+                Inventory.objects.create(product=product, quantity=1)
+                cart = Cart.objects.create(customer=customer)
+                CartItem.objects.create(cart=cart, product=product, quantity=1)
+                order = Order.objects.create(customer=customer, total_amount=1, shipping_address="Address")
+                OrderItem.objects.create(order=order, product=product, quantity=1, price=1)
+
+                # Act
+                after = self.changelist_queries(model)
+
+                # Assert
+                self.assertEqual(before, after)
+
+    def test_bulk_status_action_updates_all_selected(self):
+        """Тест: массовая смена статуса одним UPDATE"""
+        # Arrange
+        ids = list(Order.objects.values_list('id', flat=True))
+
+        # Act
+        response = self.client.post(reverse('admin:store_order_changelist'), {
+            'action': 'set_status_shipped',
+            '_selected_action': ids,
+        })
+
+        # Assert
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'shipped'})
+
+    def test_order_change_form_uses_raw_id_and_autocomplete(self):
+        """Тест: форма заказа не выводит всех покупателей и товары списком"""
+        order = Order.objects.first()
+        response = self.client.get(reverse('admin:store_order_change', args=[order.id]))
+        self.assertContains(response, 'vForeignKeyRawIdAdminField')
+        self.assertContains(response, 'admin-autocomplete')
+        customer = User.objects.get(username='customer1')
+        self.assertNotContains(response, f'<option value="{customer.id}">customer1</option>')
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    """Тесты пагинатора с оценкой числа строк"""
+
+    def test_exact_count_without_planner_statistics(self):
+        """Тест: без статистики PostgreSQL число строк считается точно"""
+        Product.objects.create(name="Product", price=1)
+        paginator = EstimatedCountPaginator(Product.objects.order_by('id'), 10)
+
+        self.assertEqual(paginator.count, 1)
+        if connection.vendor != 'postgresql':
+            self.assertIsNone(estimate_count(Product.objects.all()))
@@ -0,0 +1,128 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .anonymous_cart import decode, encode
+from .cache import service_cache
+from .models import Cart, CartItem, Product
+
+User = get_user_model()
+
+
+def writes(queries):
+    return [query['sql'] for query in queries if query['sql'].split()[0].upper() in ('INSERT', 'UPDATE', 'DELETE')]
+
+
+class EncodingTest(TestCase):
+    """Unit тесты кодирования корзины в cookie"""
+
+    def test_roundtrip(self):
+        """Тест: кодирование компактное и обратимое"""
+        items = {1: 2, 1000: 1, 123456: 5}
+
+        value = encode(items)
+
+        self.assertEqual(value, '1:2,rs:1,2n9c:5')
+        self.assertEqual(decode(value), items)
+
+    @override_settings(ANONYMOUS_CART_MAX_ITEMS=2)
+    def test_invalid_parts_are_dropped(self):
+        """Тест: испорченные позиции пропускаются, размер корзины ограничен"""
+        self.assertEqual(decode('zz,1:x,-1:2,2:0,3:500,4:1,5:1'), {3: 99, 4: 1})
+        self.assertEqual(decode(None), {})
+
+
+class AnonymousCartTest(TestCase):
+    """Тесты корзины до входа"""
+
+    def setUp(self):
+        service_cache.clear_local()
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123', email='test@example.com')
+        self.phone = Product.objects.create(name="Phone", slug="phone", price=100)
+        self.case = Product.objects.create(name="Case", slug="case", price=10)
+
+    def test_add_without_database_writes(self):
+        """Тест: добавление в корзину без входа только читает товар"""
+        # Act
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('add_to_cart', args=[self.phone.id]))
+
+        # Assert
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('cart', self.client.cookies)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_cart_page_reads_products_once(self):
+        """Тест: корзина из cookie выводится с ценами одним запросом к товарам"""
+        # Arrange
+        self.client.get(reverse('add_to_cart', args=[self.phone.id]))
+        self.client.get(reverse('add_to_cart', args=[self.case.id]))
+        self.client.get(reverse('add_to_cart', args=[self.case.id]))
+
+        # Act
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('cart'))
+
+        # Assert
+        self.assertEqual(response.context['total'], 120)
+        self.assertContains(response, "Case")
+        self.assertEqual(writes(queries), [])
+        product_reads = [query for query in queries if 'FROM "store_product"' in query['sql']]
+        self.assertEqual(len(product_reads), 1)
+
+    def test_tampered_cookie_is_ignored(self):
+        """Тест: cookie без верной подписи считается пустой корзиной"""
+        self.client.cookies['cart'] = encode({self.phone.id: 1})
+
+        response = self.client.get(reverse('cart'))
+
+        self.assertEqual(list(response.context['items']), [])
+        self.assertContains(response, "Ваша корзина пуста")
+
+    def test_remove_product(self):
+        """Тест: удаление последнего товара удаляет cookie"""
+        self.client.get(reverse('add_to_cart', args=[self.phone.id]))
+
+        self.client.get(reverse('remove_product_from_cart', args=[self.phone.id]))
+        response = self.client.get(reverse('cart'))
+
+        self.assertEqual(self.client.cookies['cart'].value, '')
+        self.assertEqual(list(response.context['items']), [])
+
+    def test_login_merges_with_one_upsert(self):
+        """Тест: при входе корзина переносится одним upsert и складывается с существующей"""
+        # Arrange
+        cart = Cart.objects.create(customer=self.user)
+        CartItem.objects.create(cart=cart, product=self.phone, quantity=1)
+        inactive = Product.objects.create(name="Old", slug="old", price=1)
+        for product in (self.phone, self.phone, self.case, inactive):
+            self.client.get(reverse('add_to_cart', args=[product.id]))
+        Product.objects.filter(id=inactive.id).update(is_active=False)
+
+        # Act
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('login'), {'username': 'testuser', 'password': 'testpass123'})
+
+        # Assert
+        self.assertEqual(
+            dict(CartItem.objects.filter(cart=cart).values_list('product_id', 'quantity')),
+            {self.phone.id: 3, self.case.id: 1},
+        )
+        item_writes = [sql for sql in writes(queries) if 'store_cartitem' in sql]
+        self.assertEqual(len(item_writes), 1)
+        self.assertEqual(self.client.cookies['cart'].value, '')
+
+    def test_login_creates_cart(self):
+        """Тест: у пользователя без корзины она создается при переносе"""
+        self.client.get(reverse('add_to_cart', args=[self.case.id]))
+
+        self.client.post(reverse('login'), {'username': 'testuser', 'password': 'testpass123'})
+        response = self.client.get(reverse('cart'))
+
+        self.assertEqual([item.product for item in response.context['items']], [self.case])
+        self.assertContains(response, 'badge-primary">1</span>')
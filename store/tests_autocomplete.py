@@ -0,0 +1,150 @@
+import datetime
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .autocomplete import PrefixIndex, index, normalize
+from .models import Product
+
+
+class NormalizeTest(TestCase):
+    """Unit тесты нормализации названий"""
+
+    def test_casefold_and_transliteration(self):
+        """Тест: регистр, ё, знаки и кириллица приводятся к одному ключу"""
+        self.assertEqual(normalize('Смартфон Ёлка-2000'), 'smartfon elka 2000')
+        self.assertEqual(normalize('SMARTFON'), normalize('смартфон'))
+        self.assertEqual(normalize('Kharkov'), normalize('Харьков'))
+
+    def test_prefix_index_matches_word_starts(self):
+        """Тест: поиск по началу любого слова, сначала совпадения с начала названия"""
+        # Arrange
+        core = PrefixIndex([(1, 'Чехол для Samsung', 'chehol'), (2, 'Samsung Galaxy', 'galaxy'),
+                            (3, 'Наушники Sony', 'sony')])
+
+        # Act
+        found = [(core.ids[owner], at_start) for owner, at_start in core.search(b'sam', 10)]
+
+        # Assert
+        self.assertEqual(sorted(found), [(1, False), (2, True)])
+        self.assertEqual(list(core.search(b'xyz', 10)), [])
+
+    def test_memory_is_bounded(self):
+        """Тест: при превышении лимита памяти индекс обрезается"""
+        entries = [(i, f'Product {i}', f'product-{i}') for i in range(1000)]
+
+        core = PrefixIndex(entries, max_bytes=5000)
+
+        self.assertTrue(core.truncated)
+        self.assertLessEqual(len(core.keys) + len(core.display), 5000)
+        self.assertGreater(len(core), 0)
+
+
+@override_settings(AUTOCOMPLETE_COMPACT_THRESHOLD=1000000)
+class AutocompleteTest(TestCase):
+    """Тесты подсказок поиска"""
+
+    def setUp(self):
+        self.phone = Product.objects.create(name="Смартфон Samsung Galaxy", slug="phone", price=100)
+        self.case = Product.objects.create(name="Чехол для смартфона", slug="case", price=10)
+        Product.objects.create(name="Смартфон снятый", slug="inactive", price=10, is_active=False)
+        index.build()
+
+    def tearDown(self):
+        index.clear()
+
+    def search(self, query):
+        response = self.client.get(reverse('autocomplete'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [result['name'] for result in response.json()['results']]
+
+    def test_endpoint_without_queries(self):
+        """Тест: подсказки отдаются из памяти, без запросов к БД"""
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('autocomplete'), {'q': 'smart'})
+
+        self.assertEqual(
+            response.json()['results'][0],
+            {'id': self.phone.id, 'name': self.phone.name, 'url': self.phone.get_absolute_url()},
+        )
+
+    def test_cyrillic_latin_and_word_prefixes(self):
+        """Тест: кириллица, латиница и начало второго слова"""
+        self.assertEqual(self.search('смарт'), ["Смартфон Samsung Galaxy", "Чехол для смартфона"])
+        self.assertEqual(self.search('SMART'), self.search('смарт'))
+        self.assertEqual(self.search('самсунг'), ["Смартфон Samsung Galaxy"])
+        self.assertEqual(self.search('с'), [])
+
+    def test_name_start_wins_over_later_word(self):
+        """Тест: название, совпавшее с начала и в середине, идет среди совпадений с начала"""
+        # Arrange
+        Product.objects.all().delete()
+        Product.objects.create(name="Smart smartphone", slug="smart-smartphone", price=10)
+        Product.objects.create(name="Apple smartwatch", slug="apple-smartwatch", price=10)
+        Product.objects.create(name="Smart TV", slug="smart-tv", price=10)
+        index.build()
+
+        # Act
+        results = self.search('smart')
+
+        # Assert
+        self.assertEqual(results, ["Smart smartphone", "Smart TV", "Apple smartwatch"])
+
+    def test_product_changes_update_index(self):
+        """Тест: сохранение и удаление товара сразу меняют подсказки"""
+        # Arrange
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Смарт-часы", slug="watch", price=50)
+            self.case.delete()
+            self.phone.name = "Телефон Samsung"
+            self.phone.save()
+
+        # Act
+        results = self.search('смарт')
+
+        # Assert
+        self.assertEqual(results, ["Смарт-часы"])
+        self.assertEqual(self.search('тел'), ["Телефон Samsung"])
+
+    def test_refresh_reads_bulk_updates(self):
+        """Тест: изменения без сигналов дочитываются по updated_at"""
+        # Arrange
+        Product.objects.filter(id=self.case.id).update(is_active=False, updated_at=timezone.now())
+        index.last_refresh -= datetime.timedelta(hours=1).total_seconds()
+
+        # Act
+        results = self.search('смарт')
+
+        # Assert
+        self.assertEqual(results, ["Смартфон Samsung Galaxy"])
+
+    def test_compaction_merges_changes(self):
+        """Тест: пересборка ядра переносит изменения в ядро"""
+        # Arrange
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Смарт-часы", slug="watch", price=50)
+            self.case.delete()
+
+        # Act
+        index._compact()
+
+        # Assert
+        self.assertEqual(index.changes, {})
+        self.assertEqual(self.search('смарт'), ["Смарт-часы", "Смартфон Samsung Galaxy"])
+        self.assertEqual(index.stats()['products'], 2)
+
+    def test_pending_changes_are_searched_by_prefix(self):
+        """Тест: изменения поверх ядра ищутся по началам слов, старое название забывается"""
+        # Arrange
+        index.apply(self.case.id, "Смарт-браслет", "band", active=True)
+        index.apply(self.case.id, "Браслет Смарт", "band", active=True)
+        index.apply(self.phone.id)
+
+        # Act
+        results = index.search('смарт')
+
+        # Assert
+        self.assertEqual(results, [(self.case.id, "Браслет Смарт", "band")])
+        self.assertEqual([word[1] for word in index.overlay], [self.case.id, self.case.id])
+        self.assertEqual(index.search('brasl'), results)
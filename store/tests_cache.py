@@ -0,0 +1,181 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from .cache import TwoTierCache, Entry, cached, service_cache
+from .models import Order, OrderItem, Product, StockBalance
+from .services import InventoryService, OrderService, ProductService
+
+
+class TwoTierCacheTest(TestCase):
+    """Unit тесты двухуровневого кеша"""
+
+    def setUp(self):
+        cache.clear()
+        self.cache = TwoTierCache(local_max_entries=2, local_ttl=60)
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_local_and_shared_hits(self):
+        """Тест попаданий в локальный и общий уровни"""
+        # Act
+        first = self.cache.get_or_set('family', 'k', self.compute, ttl=60)
+        second = self.cache.get_or_set('family', 'k', self.compute, ttl=60)
+        self.cache.clear_local()
+        third = self.cache.get_or_set('family', 'k', self.compute, ttl=60)
+
+        # Assert
+        self.assertEqual((first, second, third), (1, 1, 1))
+        stats = self.cache.stats()['family']
+        self.assertEqual((stats['misses'], stats['local_hits'], stats['shared_hits']), (1, 1, 1))
+        self.assertEqual(stats['hit_ratio'], round(2 / 3, 4))
+
+    def test_local_lru_is_bounded(self):
+        """Тест: локальный уровень ограничен по размеру"""
+        # Act
+        for key in ('a', 'b', 'c'):
+            self.cache.get_or_set('family', key, self.compute, ttl=60)
+
+        # Assert
+        self.assertEqual(list(self.cache._local), ['b', 'c'])
+
+    def test_evicted_and_expired_keys_leave_tag_index(self):
+        """Тест: вытесненные и истекшие ключи удаляются из индекса тегов"""
+        # Arrange
+        for key in ('a', 'b', 'c'):
+            self.cache.get_or_set('family', key, self.compute, ttl=60, tags=['product', key])
+
+        # Act: 'a' вытеснен, 'b' истекает при чтении
+        self.cache._local_get('b', time.time() + 3600)
+
+        # Assert
+        self.assertEqual(list(self.cache._local), ['c'])
+        self.assertEqual(dict(self.cache._local_tags), {'product': {'c'}, 'c': {'c'}})
+
+    def test_tag_invalidation(self):
+        """Тест инвалидации по тегу"""
+        # Arrange
+        self.cache.get_or_set('family', 'k', self.compute, ttl=60, tags=['product'])
+
+        # Act
+        self.cache.invalidate_tags('product')
+        value = self.cache.get_or_set('family', 'k', self.compute, ttl=60, tags=['product'])
+
+        # Assert
+        self.assertEqual(value, 2)
+
+    def test_single_flight_serves_stale_value(self):
+        """Тест: пока значение пересчитывается другим, отдается текущее"""
+        # Arrange
+        cache.set('k', Entry('stale', expires_at=0, delta=1, tag_versions=()))
+        cache.add('lock:k', 1)
+
+        # Act
+        value = self.cache.get_or_set('family', 'k', self.compute, ttl=60)
+
+        # Assert
+        self.assertEqual(value, 'stale')
+        self.assertEqual(self.calls, 0)
+
+    def test_early_refresh_recomputes(self):
+        """Тест досрочного обновления истекающего значения"""
+        # Arrange
+        cache.set('k', Entry('old', expires_at=0, delta=1, tag_versions=()))
+
+        # Act
+        value = self.cache.get_or_set('family', 'k', self.compute, ttl=60)
+
+        # Assert
+        self.assertEqual(value, 1)
+        self.assertEqual(self.cache.stats()['family']['early_refreshes'], 1)
+
+
+class ServiceCacheTest(TestCase):
+    """Тесты кеширования чтений сервисов"""
+
+    def setUp(self):
+        service_cache.clear_local()
+        cache.clear()
+
+    def test_cached_facets_invalidated_on_save(self):
+        """Тест: изменение товара сбрасывает кеш счетчиков каталога"""
+        # Arrange
+        Product.objects.create(name="First", price=10.00)
+        self.assertEqual(sum(ProductService.get_facet_counts().values()), 1)
+
+        # Act
+        with self.assertNumQueries(0):
+            cached_total = sum(ProductService.get_facet_counts().values())
+        Product.objects.create(name="Second", price=20.00)
+
+        # Assert
+        self.assertEqual(cached_total, 1)
+        self.assertEqual(sum(ProductService.get_facet_counts().values()), 2)
+
+    def test_cached_orders_invalidated_on_save(self):
+        """Тест: изменение заказа сбрасывает кеш заказов по статусу и заказа по id"""
+        # Arrange
+        user = get_user_model().objects.create_user(username='buyer', password='testpass123')
+        order = Order.objects.create(customer=user, total_amount=10, shipping_address="Address")
+        self.assertEqual(OrderService.get_recent_orders_by_status('pending'), [order])
+        self.assertEqual(OrderService.get_order_by_id(order.id).status, 'pending')
+
+        # Act
+        with self.assertNumQueries(0):
+            OrderService.get_recent_orders_by_status('pending')
+            OrderService.get_order_by_id(order.id)
+        OrderService.cancel_order(order.id)
+
+        # Assert
+        self.assertEqual(OrderService.get_recent_orders_by_status('pending'), [])
+        self.assertEqual(OrderService.get_order_by_id(order.id).status, 'cancelled')
+
+    def test_cached_order_invalidated_on_new_item(self):
+        """Тест: новая позиция заказа сбрасывает закешированный заказ"""
+        user = get_user_model().objects.create_user(username='buyer', password='testpass123')
+        order = Order.objects.create(customer=user, total_amount=10, shipping_address="Address")
+        product = Product.objects.create(name="First", price=10.00)
+        self.assertEqual(len(OrderService.get_order_by_id(order.id).items.all()), 0)
+
+        OrderItem.objects.create(order=order, product=product, quantity=1, price=10)
+
+        self.assertEqual(len(OrderService.get_order_by_id(order.id).items.all()), 1)
+
+    def test_cached_low_stock_invalidated_on_stock_change(self):
+        """Тест: изменение остатка сбрасывает кеш товаров с низким остатком"""
+        # Arrange
+        product = Product.objects.create(name="First", price=10.00)
+        StockBalance.objects.create(product=product, quantity=2)
+        self.assertEqual([balance.product.name for balance in InventoryService.get_low_stock_report()], ["First"])
+
+        # Act
+        with self.assertNumQueries(0):
+            InventoryService.get_low_stock_report()
+        InventoryService.update_stock(product.id, 10)
+
+        # Assert
+        self.assertEqual(InventoryService.get_low_stock_report(), [])
+
+    def test_cache_can_be_disabled(self):
+        """Тест отключения кеша настройкой"""
+        Product.objects.create(name="First", price=10.00)
+        with self.settings(SERVICE_CACHE_ENABLED=False), mock.patch('store.cache.service_cache') as service_cache:
+            self.assertEqual(sum(ProductService.get_facet_counts().values()), 1)
+        service_cache.get_or_set.assert_not_called()
+
+    def test_unbounded_queryset_is_not_cached(self):
+        """Тест: QuerySet без среза не кладется в кеш, срез кешируется"""
+        Product.objects.create(name="First", price=10.00)
+
+        with self.assertRaises(TypeError):
+            cached('test.all')(lambda: Product.objects.all())()
+        page = cached('test.page')(lambda: Product.objects.order_by('id')[:10])
+
+        self.assertEqual(len(page()), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(page()), 1)
@@ -0,0 +1,108 @@
+import datetime
+import io
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from .cleanup import cleanup_carts, keyset_batches
+from .models import Cart, CartItem, Product
+from .services import CartService
+
+User = get_user_model()
+
+
+class CleanupTest(TestCase):
+    """Тесты очистки брошенных корзин и истекших сессий"""
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Product", slug="product", price=10)
+        self.carts = []
+        for i in range(5):
+            user = User.objects.create_user(username=f'user{i}', password='testpass123', email=f'user{i}@example.com')
+            cart = Cart.objects.create(customer=user)
+            CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+            self.carts.append(cart)
+        # Три корзины брошены 40 дней назад, две активны
+        old = timezone.now() - datetime.timedelta(days=40)
+        Cart.objects.filter(id__in=[cart.id for cart in self.carts[:3]]).update(updated_at=old)
+
+    def session(self, expires_in):
+        store = SessionStore()
+        store['cart'] = {}
+        store.create()
+        Session.objects.filter(session_key=store.session_key).update(
+            expire_date=timezone.now() + datetime.timedelta(seconds=expires_in)
+        )
+        return store.session_key
+
+    def test_keyset_batches_cover_all_rows(self):
+        """Тест: пачки идут по порядку ключа без пропусков и повторов"""
+        batches = list(keyset_batches(Cart.objects.all(), ('updated_at', 'id'), 2))
+
+        ids = [cart_id for batch in batches for _, cart_id in batch]
+
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(sorted(ids), sorted(cart.id for cart in self.carts))
+
+    def test_removes_expired_carts_with_items(self):
+        """Тест: удаляются только брошенные корзины вместе с позициями"""
+        # Act
+        batches = list(cleanup_carts(timezone.now() - datetime.timedelta(days=30), batch_size=2))
+
+        # Assert
+        self.assertEqual([(batch['carts'], batch['items']) for batch in batches], [(2, 2), (1, 1)])
+        self.assertEqual(set(Cart.objects.values_list('id', flat=True)), {self.carts[3].id, self.carts[4].id})
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_adding_product_keeps_cart_alive(self):
+        """Тест: добавление товара продлевает жизнь корзины"""
+        CartService.add_to_cart(self.carts[0], self.product.id)
+
+        list(cleanup_carts(timezone.now() - datetime.timedelta(days=30)))
+
+        self.assertTrue(Cart.objects.filter(id=self.carts[0].id).exists())
+        self.assertEqual(Cart.objects.count(), 3)
+
+    def test_dry_run_deletes_nothing(self):
+        """Тест: пробный запуск только считает строки"""
+        # Arrange
+        self.session(-60)
+        out = io.StringIO()
+
+        # Act
+        call_command('cleanup_expired', '--dry-run', '--batch-size', '2', stdout=out)
+
+        # Assert
+        self.assertIn('Would remove 3 carts and 3 cart items in 2 batches', out.getvalue())
+        self.assertIn('Would remove 1 sessions', out.getvalue())
+        self.assertEqual(Cart.objects.count(), 5)
+        self.assertEqual(Session.objects.count(), 1)
+
+    def test_command_reports_batches(self):
+        """Тест: команда удаляет корзины и сессии и сообщает время каждой пачки"""
+        # Arrange
+        expired = [self.session(-60) for _ in range(3)]
+        alive = self.session(3600)
+        out = io.StringIO()
+
+        # Act
+        call_command('cleanup_expired', '--batch-size', '2', '--sleep', '0', stdout=out)
+
+        # Assert
+        output = out.getvalue()
+        self.assertIn('carts batch 1: 2 carts, 2 items in', output)
+        self.assertIn('sessions batch 2: 1 sessions in', output)
+        self.assertIn('Removed 3 carts and 3 cart items in 2 batches', output)
+        self.assertIn('Removed 3 sessions in 2 batches', output)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [alive])
+        self.assertFalse(Session.objects.filter(session_key__in=expired).exists())
+
+    def test_cart_days_option(self):
+        """Тест: срок хранения корзин задается параметром"""
+        call_command('cleanup_expired', '--cart-days', '60', '--sleep', '0', '--skip-sessions', stdout=io.StringIO())
+
+        self.assertEqual(Cart.objects.count(), 5)
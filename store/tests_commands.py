@@ -0,0 +1,324 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from . import facets
+from .models import Product, ProductPopularity, StockBalance, Cart, CartItem, Order, OrderItem
+
+
+class LoadGoodsCommandTest(TestCase):
+    """Тесты команды загрузки товаров"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.tmpdir.name, 'products.json')
+        with open(self.data_file, 'w', encoding='utf-8') as f:
+            json.dump([
+                {'name': 'Laptop', 'description': 'Desc', 'price': 100.00, 'quantity': 5},
+                {'name': 'Phone', 'price': 50.00, 'quantity': 3},
+            ], f)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_load_goods_creates_products_and_balances(self):
+        """Тест загрузки новых товаров"""
+        call_command('load_goods', '--file', self.data_file, stdout=io.StringIO())
+
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertEqual(StockBalance.objects.get(product__name='Phone').quantity, 3)
+
+    def test_load_goods_copy_falls_back_to_orm(self):
+        """Тест: режим --copy на не-PostgreSQL работает через ORM"""
+        call_command('load_goods', '--file', self.data_file, '--copy', stdout=io.StringIO())
+        call_command('load_goods', '--file', self.data_file, '--copy', stdout=io.StringIO())
+
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertEqual(StockBalance.objects.get(product__name='Laptop').quantity, 5)
+
+    def test_load_goods_marks_restocked(self):
+        """Тест: остаток, выросший с нуля, отмечается как снова в наличии (ORM и COPY)"""
+        for args in ([], ['--copy']):
+            with self.subTest(args=args):
+                # Arrange
+                StockBalance.objects.all().delete()
+                laptop, _ = Product.objects.get_or_create(name='Laptop', defaults={'price': 100.00})
+                phone, _ = Product.objects.get_or_create(name='Phone', defaults={'price': 50.00})
+                StockBalance.objects.create(product=laptop, quantity=0)
+                StockBalance.objects.create(product=phone, quantity=2)
+
+                # Act
+                call_command('load_goods', '--file', self.data_file, *args, stdout=io.StringIO())
+
+                # Assert
+                self.assertIsNotNone(StockBalance.objects.get(product=laptop).restocked_at)
+                self.assertIsNone(StockBalance.objects.get(product=phone).restocked_at)
+                self.assertEqual(StockBalance.objects.get(product=phone).quantity, 3)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'COPY requires PostgreSQL')
+    @override_settings(CATALOG_PRICE_BUCKETS=[60])
+    def test_load_goods_copy_fills_facets(self):
+        """Тест: загрузка через COPY заполняет диапазон и наличие товаров и счетчики фасетов"""
+        # Arrange: Phone уже есть, после загрузки он закончится на складе
+        phone = Product.objects.create(name='Phone', price=50.00)
+        StockBalance.objects.create(product=phone, quantity=2)
+        with open(self.data_file, 'w', encoding='utf-8') as f:
+            json.dump([
+                {'name': 'Laptop', 'price': 100.00, 'quantity': 5},
+                {'name': 'Phone', 'price': 50.00, 'quantity': 0},
+            ], f)
+
+        # Act
+        call_command('load_goods', '--file', self.data_file, '--copy', stdout=io.StringIO())
+
+        # Assert
+        self.assertEqual(
+            dict(Product.objects.values_list('name', 'price_bucket')), {'Laptop': 1, 'Phone': 0}
+        )
+        self.assertEqual(list(Product.objects.filter(in_stock=True).values_list('name', flat=True)), ['Laptop'])
+        self.assertEqual(
+            {cell: products for cell, products in facets.counts().items() if products},
+            {(1, True): 1, (0, False): 1},
+        )
+        self.assertTrue(ProductPopularity.objects.filter(product__name='Laptop').exists())
+
+
+    def test_load_goods_slugs(self):
+        """Тест: ORM и COPY дают одинаковые транслитерированные slug с id товара"""
+        # Arrange
+        with open(self.data_file, 'w', encoding='utf-8') as f:
+            json.dump([
+                {'name': 'Смартфон Samsung', 'price': 100.00, 'quantity': 1},
+                {'name': 'Смартфон, Samsung!', 'price': 100.00, 'quantity': 1},
+            ], f)
+
+        for args in ([], ['--copy']):
+            with self.subTest(args=args):
+                Product.objects.all().delete()
+
+                # Act
+                call_command('load_goods', '--file', self.data_file, *args, stdout=io.StringIO())
+
+                # Assert
+                products = Product.objects.all()
+                self.assertEqual(len(products), 2)
+                self.assertEqual(
+                    sorted(product.slug for product in products),
+                    sorted(f'smartfon-samsung-{product.id}' for product in products),
+                )
+
+class ExportProductResidueCommandTest(TestCase):
+    """Тесты команды выгрузки остатков"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        for name, quantity in (('Laptop', 5), ('Phone', 1), ('Tablet', 20)):
+            product = Product.objects.create(name=name, price=10.00)
+            StockBalance.objects.create(product=product, quantity=quantity)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def export(self, *args):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('export_product_residue', *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_export_json(self):
+        """Тест выгрузки в JSON"""
+        path = os.path.join(self.tmpdir.name, 'out.json')
+        output, _ = self.export('--output', path)
+
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        self.assertEqual(len(data), 3)
+        self.assertEqual(data[0]['product_name'], 'Laptop')
+        self.assertIn('rows/sec', output)
+
+    def test_export_ndjson_to_stdout_with_low_stock_filter(self):
+        """Тест выгрузки NDJSON в stdout с фильтром по низкому остатку"""
+        output, report = self.export('--format', 'ndjson', '--output', '-', '--low-stock', '5')
+
+        rows = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual([row['product_name'] for row in rows], ['Laptop', 'Phone'])
+        self.assertIn('Successfully exported 2', report)
+
+    def test_export_csv_gzip(self):
+        """Тест выгрузки CSV со сжатием"""
+        path = os.path.join(self.tmpdir.name, 'out.csv')
+        self.export('--format', 'csv', '--output', path, '--gzip')
+
+        with gzip.open(path + '.gz', 'rt', encoding='utf-8') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ['product_id', 'product_name', 'quantity', 'last_updated'])
+        self.assertEqual(len(rows), 4)
+
+    def test_export_columnar_changed_since(self):
+        """Тест колоночного формата и фильтра по дате изменения"""
+        path = os.path.join(self.tmpdir.name, 'out.columnar')
+        self.export('--format', 'columnar', '--output', path, '--changed-since', '2999-01-01')
+
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(json.loads(lines[0])['columns'][0], 'product_id')
+        self.assertEqual(len(lines), 1)
+
+
+    def test_export_copy_defaults_to_csv(self):
+        """Тест: --copy без формата пишет CSV, с другим явным форматом - ошибка"""
+        path = os.path.join(self.tmpdir.name, 'out.csv')
+        self.export('--copy', '--output', path)
+
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual(len(list(csv.reader(f))), 4)
+        for fmt in ('json', 'ndjson', 'columnar'):
+            with self.subTest(format=fmt), self.assertRaises(CommandError):
+                self.export('--copy', '--format', fmt, '--output', path)
+
+class GenerateDatasetCommandTest(TestCase):
+    """Тесты генератора синтетических данных"""
+
+    def generate(self, *args):
+        # Воркеры не видят данных транзакции теста: порции вставляются в этом процессе
+        call_command('generate_dataset', '--products', '50', '--users', '10', '--carts', '5',
+                     '--orders', '30', '--seed', '7', '--chunk-size', '20', '--workers', '1', *args,
+                     stdout=io.StringIO())
+
+    def snapshot(self):
+        """Содержимое всех сгенерированных таблиц без суррогатных ключей позиций"""
+        return {
+            'products': list(Product.objects.order_by('id').values_list(
+                'id', 'name', 'description', 'price', 'created_at', 'updated_at', 'slug', 'is_active',
+                'price_bucket', 'in_stock')),
+            'stock': list(StockBalance.objects.order_by('product_id').values_list(
+                'product_id', 'quantity', 'last_updated')),
+            'users': list(get_user_model().objects.order_by('id').values_list(
+                'id', 'username', 'email', 'date_joined', 'address')),
+            'carts': list(Cart.objects.order_by('id').values_list('id', 'customer_id', 'created_at')),
+            'cart_items': list(CartItem.objects.order_by('cart_id', 'product_id').values_list(
+                'cart_id', 'product_id', 'quantity')),
+            'orders': list(Order.objects.order_by('id').values_list(
+                'id', 'customer_id', 'order_date', 'status', 'total_amount', 'shipping_address')),
+            'order_items': list(OrderItem.objects.order_by('order_id', 'product_id').values_list(
+                'order_id', 'product_id', 'quantity', 'price')),
+        }
+
+    def delete_all(self):
+        Order.objects.all().delete()
+        Cart.objects.all().delete()
+        get_user_model().objects.all().delete()
+        Product.objects.all().delete()
+
+    def test_generate_dataset_counts(self):
+        """Тест количества сгенерированных записей"""
+        self.generate()
+
+        self.assertEqual(Product.objects.count(), 50)
+        self.assertEqual(StockBalance.objects.count(), 50)
+        self.assertEqual(get_user_model().objects.count(), 10)
+        self.assertEqual(Cart.objects.count(), 5)
+        self.assertEqual(Order.objects.count(), 30)
+        self.assertTrue(OrderItem.objects.exists())
+        self.assertTrue(get_user_model().objects.first().check_password('password'))
+
+    def test_generate_dataset_is_deterministic(self):
+        """Тест: одинаковый seed дает те же строки во всех таблицах, включая даты"""
+        # Arrange
+        self.generate()
+        first = self.snapshot()
+        self.delete_all()
+
+        # Act
+        self.generate()
+        second = self.snapshot()
+
+        # Assert
+        self.assertEqual(len(first['orders']), 30)
+        self.assertTrue(first['cart_items'] and first['order_items'])
+        for table, rows in first.items():
+            with self.subTest(table=table):
+                self.assertEqual(rows, second[table])
+
+    def test_generate_dataset_now_shifts_dates(self):
+        """Тест: даты отсчитываются от --now, остальные значения от него не зависят"""
+        # Arrange
+        self.generate('--now', '2025-01-01T00:00:00')
+        first = self.snapshot()
+        self.delete_all()
+        shift = datetime.timedelta(days=10)
+
+        # Act
+        self.generate('--now', '2025-01-11T00:00:00')
+        second = self.snapshot()
+
+        # Assert
+        self.assertEqual(first['order_items'], second['order_items'])
+        now = datetime.datetime(2025, 1, 11, tzinfo=datetime.timezone.utc)
+        for _, _, order_date, *_ in second['orders']:
+            self.assertTrue(now - datetime.timedelta(days=366) <= order_date <= now)
+        self.assertEqual([(product_id, created + shift) for product_id, _, _, _, created, *_ in first['products']],
+                         [(product_id, created) for product_id, _, _, _, created, *_ in second['products']])
+        self.assertLessEqual(max(last_updated for _, _, last_updated in second['stock']), now)
+
+    def test_generate_dataset_invalid_now(self):
+        """Тест: неверная дата --now отклоняется"""
+        with self.assertRaises(CommandError):
+            self.generate('--now', 'yesterday')
+
+
+class RequestProfilesCommandTest(TestCase):
+    """Тесты команды просмотра профилей запросов"""
+
+    def test_list_and_aggregate_profiles(self):
+        """Тест вывода и агрегации профилей"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for profile_id in ('p1', 'p2'):
+                with open(os.path.join(tmpdir, f'{profile_id}.folded'), 'w', encoding='utf-8') as f:
+                    f.write('view (views.py:1);render (base.py:5) 3\n')
+                with open(os.path.join(tmpdir, f'{profile_id}.json'), 'w', encoding='utf-8') as f:
+                    json.dump({
+                        'id': profile_id, 'method': 'GET', 'path': '/store/', 'url_name': 'product_list',
+                        'status': 200, 'total_ms': 10, 'samples': 3, 'sql_ms': 1.5,
+                        'queries': [{'sql': 'SELECT ?', 'ms': 1.5}],
+                    }, f)
+            aggregate = os.path.join(tmpdir, 'all.folded')
+            output = io.StringIO()
+
+            call_command('request_profiles', '--dir', tmpdir, '--aggregate', aggregate, stdout=output)
+
+            with open(aggregate, encoding='utf-8') as f:
+                self.assertEqual(f.read(), 'view (views.py:1);render (base.py:5) 6\n')
+            self.assertIn('render (base.py:5)', output.getvalue())
+
+
+class CompileTemplatesCommandTest(TestCase):
+    """Тесты команды компиляции и проверки шаблонов"""
+
+    def test_project_templates_compile(self):
+        """Тест: шаблоны и фильтры проекта компилируются без ошибок"""
+        output = io.StringIO()
+
+        call_command('compile_templates', stdout=output)
+
+        self.assertIn('project filters OK', output.getvalue())
+
+    def test_broken_template_fails(self):
+        """Тест: шаблон с ошибкой приводит к ошибке команды"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, 'broken.html'), 'w', encoding='utf-8') as f:
+                f.write('{% load missing_library %}')
+            templates = [dict(settings.TEMPLATES[0], DIRS=[tmpdir])]
+
+            with override_settings(TEMPLATES=templates):
+                with self.assertRaisesMessage(CommandError, '1 template errors'):
+                    call_command('compile_templates', '--all', stdout=io.StringIO(), stderr=io.StringIO())
@@ -0,0 +1,180 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import service_cache
+from .counters import EPOCH, CacheStore, MemoryStore, counters, current_epoch, current_score, decay_factor, write
+from .models import PopularityEpoch, Product, ProductPopularity
+
+User = get_user_model()
+
+
+class DecayTest(TestCase):
+    """Unit тесты затухания популярности"""
+
+    @override_settings(POPULARITY_HALF_LIFE_DAYS=7)
+    def test_forward_decay_halves_per_half_life(self):
+        """Тест: через период полураспада вклад события вдвое меньше"""
+        # Arrange
+        week = EPOCH + datetime.timedelta(days=7)
+        score = decay_factor(EPOCH)
+
+        # Act
+        decayed = current_score(score, week)
+
+        # Assert
+        self.assertEqual(score, 1)
+        self.assertAlmostEqual(decayed, 0.5)
+        self.assertGreater(decay_factor(week), decay_factor(EPOCH))
+
+    @override_settings(POPULARITY_HALF_LIFE_DAYS=1)
+    def test_epoch_moves_before_overflow(self):
+        """Тест: при большом множителе точка отсчета сдвигается, score делятся, порядок верный"""
+        # Arrange: 10 просмотров чехла 200 дней назад, точка отсчета - 600 дней назад
+        phone = Product.objects.create(name="Phone", slug="phone", price=100)
+        case = Product.objects.create(name="Case", slug="case", price=10)
+        old_epoch = timezone.now() - datetime.timedelta(days=600)
+        PopularityEpoch.objects.create(pk=1, epoch=old_epoch)
+        ProductPopularity.objects.filter(product=case).update(views=10, score=10 * 2.0 ** 400)
+
+        # Act
+        write({(phone.id, 'view'): 1})
+
+        # Assert
+        self.assertGreater(current_epoch(), old_epoch + datetime.timedelta(days=599))
+        scores = dict(ProductPopularity.objects.values_list('product_id', 'score'))
+        self.assertAlmostEqual(current_score(scores[phone.id]), 1, places=3)
+        self.assertAlmostEqual(scores[case.id] / 2.0 ** -200, 10, places=3)
+        self.assertEqual(list(ProductPopularity.objects.order_by('-score').values_list('product_id', flat=True)),
+                         [phone.id, case.id])
+
+    def test_memory_store_sums_and_drains(self):
+        """Тест: буфер в памяти складывает события и очищается при сбросе"""
+        store = MemoryStore()
+
+        store.add((1, 'view'), 1)
+        store.add((1, 'view'), 2)
+
+        self.assertEqual(store.drain(), {(1, 'view'): 3})
+        self.assertEqual(len(store), 0)
+
+    def test_cache_store_uses_atomic_increments(self):
+        """Тест: буфер в кеше переживает несколько процессов и сбрасывается один раз"""
+        # Arrange
+        cache.clear()
+        first, second = CacheStore(), CacheStore()
+        first.add((1, 'view'), 1)
+        second.add((1, 'view'), 2)
+        first.add((2, 'cart'), 1)
+
+        # Act
+        drained = first.drain()
+
+        # Assert: first сбросил и увеличения second, тот уже ничего не найдет
+        self.assertEqual(drained, {(1, 'view'): 3, (2, 'cart'): 1})
+        self.assertEqual(second.drain(), {})
+
+
+class PopularityCountersTest(TestCase):
+    """Тесты буферизованных счетчиков популярности"""
+
+    def setUp(self):
+        service_cache.clear_local()
+        cache.clear()
+        counters.store.drain()
+        self.phone = Product.objects.create(name="Phone", slug="phone", price=100)
+        self.case = Product.objects.create(name="Case", slug="case", price=10)
+
+    def tearDown(self):
+        counters.store.drain()
+
+    def test_view_does_not_write_to_database(self):
+        """Тест: просмотр товара только увеличивает счетчик в памяти"""
+        # Act: запросы страницы - товар и рекомендации, без записи
+        with self.assertNumQueries(2):
+            self.client.get(reverse('product_detail', args=[self.phone.slug]))
+
+        # Assert
+        self.assertEqual(counters.store.drain(), {(self.phone.id, 'view'): 1})
+        self.assertFalse(ProductPopularity.objects.filter(views__gt=0).exists())
+
+    def test_flush_upserts_and_accumulates(self):
+        """Тест: сброс создает строки и прибавляет к существующим"""
+        # Arrange
+        for _ in range(3):
+            counters.record(self.phone.id)
+        counters.record(self.case.id, 'cart')
+        counters.flush()
+        counters.record(self.phone.id)
+
+        # Act
+        updated = counters.flush()
+
+        # Assert
+        self.assertEqual(updated, 1)
+        phone = ProductPopularity.objects.get(product=self.phone)
+        case = ProductPopularity.objects.get(product=self.case)
+        self.assertEqual(phone.views, 4)
+        self.assertEqual(case.views, 0)
+        self.assertGreater(case.score, phone.score)
+        self.assertEqual(counters.pending(), 0)
+
+    def test_deleted_products_are_skipped(self):
+        """Тест: счетчики удаленного товара не ломают сброс"""
+        counters.record(self.phone.id)
+        counters.record(self.case.id)
+        self.case.delete()
+
+        counters.flush()
+
+        self.assertEqual(list(ProductPopularity.objects.values_list('product_id', flat=True)), [self.phone.id])
+
+    @override_settings(COUNTERS_ENABLED=False)
+    def test_disabled_counters(self):
+        """Тест: выключенные счетчики ничего не копят"""
+        counters.record(self.phone.id)
+
+        self.assertEqual(counters.pending(), 0)
+
+    def test_catalog_and_home_sort_by_popularity(self):
+        """Тест: сортировка каталога и блок на главной по популярности"""
+        # Arrange
+        write({(self.case.id, 'view'): 10, (self.phone.id, 'view'): 1})
+
+        # Act
+        catalog = self.client.get(reverse('product_list'), {'sort': 'popular'})
+        home = self.client.get(reverse('home'))
+
+        # Assert
+        self.assertEqual([product.id for product in catalog.context['products']], [self.case.id, self.phone.id])
+        self.assertEqual(catalog.context['sort'], 'popular')
+        self.assertEqual(home.context['popular'], [self.case, self.phone])
+
+    def test_popular_sort_keeps_products_without_views(self):
+        """Тест: товары без просмотров остаются в каталоге по популярности, после просмотренных"""
+        # Arrange
+        cable = Product.objects.create(name="Cable", slug="cable", price=5)
+        write({(self.case.id, 'view'): 3})
+
+        # Act
+        catalog = self.client.get(reverse('product_list'), {'sort': 'popular'})
+
+        # Assert
+        self.assertEqual([product.id for product in catalog.context['products']],
+                         [self.case.id, self.phone.id, cable.id])
+
+    def test_add_to_cart_counts(self):
+        """Тест: добавление в корзину учитывается со своим весом"""
+        # Arrange
+        User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+
+        # Act
+        self.client.post(reverse('add_to_cart', args=[self.phone.id]))
+
+        # Assert
+        self.assertEqual(counters.store.drain(), {(self.phone.id, 'cart'): 1})
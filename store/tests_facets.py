@@ -0,0 +1,248 @@
+import io
+import threading
+import time
+import unittest
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import facets
+from .cache import service_cache
+from .models import CatalogFacet, Product, StockBalance
+from .services import CatalogSyncService, InventoryService
+
+
+def cells():
+    return {cell: products for cell, products in facets.counts().items() if products}
+
+
+@override_settings(CATALOG_PRICE_BUCKETS=[1000, 5000])
+class BucketTest(TestCase):
+    """Unit тесты ценовых диапазонов"""
+
+    def test_bucket_bounds(self):
+        """Тест: граница диапазона относится к следующему диапазону"""
+        self.assertEqual([facets.bucket(price) for price in (0, 999.99, 1000, 4999, 5000, 10 ** 6)], [0, 0, 1, 1, 2, 2])
+        self.assertEqual(facets.labels(), ["до 1000", "1000 – 5000", "от 5000"])
+
+    def test_summary_respects_other_filter(self):
+        """Тест: счетчики диапазонов учитывают фильтр наличия, счетчик наличия - диапазон"""
+        counts = {(0, False): 3, (0, True): 2, (1, True): 4, (2, False): 1}
+
+        summary = facets.summary(counts, price_bucket=0, in_stock=True)
+
+        self.assertEqual([bucket['count'] for bucket in summary['buckets']], [2, 4, 0])
+        self.assertEqual(summary['in_stock'], 2)
+        self.assertEqual(summary['total'], 6)
+
+
+@override_settings(CATALOG_PRICE_BUCKETS=[1000, 5000])
+class FacetCountersTest(TestCase):
+    """Тесты приращений счетчиков фасетов при изменении товаров и остатков"""
+
+    def setUp(self):
+        service_cache.clear_local()
+        cache.clear()
+        self.cheap = Product.objects.create(name="Cheap", slug="cheap", price=100)
+        self.phone = Product.objects.create(name="Phone", slug="phone", price=2000)
+        StockBalance.objects.create(product=self.phone, quantity=3)
+
+    def assertMatchesRecount(self):
+        incremental = cells()
+        self.assertEqual(incremental, {cell: n for cell, n in facets.recount().items() if n})
+
+    def test_create_counts_product(self):
+        """Тест: новый товар попадает в свой диапазон, остаток переводит его в наличие"""
+        self.assertEqual(cells(), {(0, False): 1, (1, True): 1})
+        self.phone.refresh_from_db()
+        self.assertEqual((self.phone.price_bucket, self.phone.in_stock), (1, True))
+        self.assertMatchesRecount()
+
+    def test_price_change_and_deactivation(self):
+        """Тест: смена цены переносит товар, снятие с продажи убирает его из счетчиков"""
+        # Act
+        self.cheap.price = 7000
+        self.cheap.save()
+        self.phone.is_active = False
+        self.phone.save()
+
+        # Assert
+        self.assertEqual(cells(), {(2, False): 1})
+        self.assertMatchesRecount()
+
+    def test_stale_instance_keeps_stock_flag(self):
+        """Тест: сохранение экземпляра, загруженного до изменения остатка, не сбрасывает наличие"""
+        stale = Product.objects.get(id=self.cheap.id)
+        InventoryService.update_stock(self.cheap.id, 5)
+
+        stale.name = "Cheap renamed"
+        stale.save()
+
+        self.assertTrue(Product.objects.get(id=self.cheap.id).in_stock)
+        self.assertEqual(cells(), {(0, True): 1, (1, True): 1})
+
+    def test_stock_change_without_zero_crossing_skips_facets(self):
+        """Тест: продажа без обнуления остатка не пишет в таблицу фасетов"""
+        # Act
+        with CaptureQueriesContext(connection) as queries:
+            InventoryService.update_stock(self.phone.id, -1)
+        facet_writes = [query for query in queries if CatalogFacet._meta.db_table in query['sql']]
+
+        # Assert
+        self.assertEqual(facet_writes, [])
+        self.assertEqual(cells(), {(0, False): 1, (1, True): 1})
+
+    def test_stock_sold_out_and_deleted(self):
+        """Тест: обнуление и удаление остатка переводят товар в "нет в наличии"""
+        InventoryService.update_stock(self.phone.id, -3)
+        self.assertEqual(cells(), {(0, False): 1, (1, False): 1})
+
+        InventoryService.update_stock(self.phone.id, 2)
+        StockBalance.objects.filter(product=self.phone).delete()
+
+        self.assertFalse(Product.objects.get(id=self.phone.id).in_stock)
+        self.assertMatchesRecount()
+
+    def test_product_delete_with_stock(self):
+        """Тест: товар, удаленный вместе с остатком, вычитается один раз"""
+        self.phone.delete()
+        Product.objects.filter(id=self.cheap.id).delete()
+
+        self.assertEqual(cells(), {})
+        self.assertMatchesRecount()
+
+    def test_sync_keeps_counters_consistent(self):
+        """Тест: синхронизация каталога пересчитывает наличие и счетчики"""
+        # Act
+        CatalogSyncService.sync([
+            {'name': "Cheap", 'price': 6000, 'quantity': 1},
+            {'name': "Tablet", 'price': 1500, 'quantity': 0},
+        ])
+
+        # Assert: Phone деактивирован, Cheap подорожал и появился на складе
+        self.assertEqual(cells(), {(2, True): 1, (1, False): 1})
+        self.assertTrue(Product.objects.get(name="Cheap").in_stock)
+
+    def test_rebuild_command_after_bounds_change(self):
+        """Тест: после изменения границ команда пересчитывает диапазоны товаров"""
+        out = io.StringIO()
+
+        with override_settings(CATALOG_PRICE_BUCKETS=[50]):
+            call_command('rebuild_facets', stdout=out)
+
+        self.assertIn('Facets rebuilt: 2 products, 2 price buckets', out.getvalue())
+        self.assertEqual(cells(), {(1, False): 1, (1, True): 1})
+
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Row and table locks require PostgreSQL')
+@override_settings(CATALOG_PRICE_BUCKETS=[1000, 5000])
+class RecountConcurrencyTest(TransactionTestCase):
+    """Пересчет счетчиков параллельно с приращениями"""
+
+    def test_recount_keeps_concurrent_delta(self):
+        """Тест: приращение из незафиксированной транзакции не теряется при пересчете"""
+        # Arrange: товар снимается с продажи в транзакции, которая еще не зафиксирована
+        phone = Product.objects.create(name="Phone", slug="phone", price=2000)
+        changed, release = threading.Event(), threading.Event()
+
+        def deactivate():
+            try:
+                with transaction.atomic():
+                    Product.objects.filter(id=phone.id).update(is_active=False)
+                    facets.move(facets.cell(True, 1, False), None)
+                    changed.set()
+                    release.wait(5)
+            finally:
+                connections.close_all()
+
+        def recount():
+            try:
+                facets.recount()
+            finally:
+                connections.close_all()
+
+        writer = threading.Thread(target=deactivate)
+        writer.start()
+        self.assertTrue(changed.wait(5))
+
+        # Act
+        recounter = threading.Thread(target=recount)
+        recounter.start()
+        time.sleep(0.3)
+        release.set()
+        writer.join()
+        recounter.join()
+
+        # Assert
+        self.assertEqual(cells(), {})
+
+
+@override_settings(CATALOG_PRICE_BUCKETS=[1000, 5000])
+class CatalogFiltersTest(TestCase):
+    """Тесты фильтров каталога"""
+
+    def setUp(self):
+        service_cache.clear_local()
+        cache.clear()
+        self.products = {}
+        for name, price, quantity in [("Cable", 300, 0), ("Mouse", 900, 4), ("Phone", 2500, 2), ("Laptop", 9000, 0)]:
+            product = Product.objects.create(name=name, slug=name.lower(), price=price)
+            StockBalance.objects.create(product=product, quantity=quantity)
+            self.products[name] = product
+
+    def names(self, response):
+        return [product.name for product in response.context['products']]
+
+    def test_newest_first(self):
+        """Тест: без фильтров каталог начинается с новинок"""
+        response = self.client.get(reverse('product_list'))
+
+        self.assertEqual(self.names(response), ["Laptop", "Phone", "Mouse", "Cable"])
+        self.assertEqual(response.context['facets']['total'], 4)
+
+    def test_price_and_stock_filters(self):
+        """Тест: фильтры по цене и наличию сужают выдачу и пересчитывают соседние счетчики"""
+        # Act
+        response = self.client.get(reverse('product_list'), {'price': '0', 'in_stock': '1'})
+
+        # Assert
+        self.assertEqual(self.names(response), ["Mouse"])
+        summary = response.context['facets']
+        self.assertEqual([bucket['count'] for bucket in summary['buckets']], [1, 1, 0])
+        self.assertEqual(summary['in_stock'], 1)
+        self.assertContains(response, '?price=1&amp;in_stock=1')
+
+    def test_invalid_filter_is_ignored(self):
+        """Тест: неизвестный диапазон означает любую цену"""
+        response = self.client.get(reverse('product_list'), {'price': '9'})
+
+        self.assertIsNone(response.context['price_bucket'])
+        self.assertEqual(len(self.names(response)), 4)
+
+    def test_counts_without_count_queries(self):
+        """Тест: счетчики фильтров читаются одним запросом к фасетам, без COUNT по товарам"""
+        # Act
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('product_list'), {'in_stock': '1'})
+        sql = [query['sql'] for query in queries]
+
+        # Assert
+        self.assertEqual(len([query for query in sql if CatalogFacet._meta.db_table in query]), 1)
+        self.assertFalse([query for query in sql if 'COUNT(' in query.upper()])
+
+    def test_paging_keeps_filters(self):
+        """Тест: ссылки на страницы сохраняют фильтры"""
+        Product.objects.bulk_create([
+            Product(name=f"Item {i}", slug=f"item-{i}", description="", price=10, in_stock=False)
+            for i in range(60)
+        ])
+
+        response = self.client.get(reverse('product_list'), {'price': '0', 'sort': 'new'})
+
+        self.assertTrue(response.context['has_next'])
+        self.assertContains(response, '?price=0&amp;sort=new&amp;page=2')
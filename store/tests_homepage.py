@@ -0,0 +1,140 @@
+import datetime
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import homepage
+from .cache import service_cache
+from .models import Order, OrderItem, PrecomputedPage, Product, StockBalance
+from .services import CatalogSyncService, InventoryService
+
+User = get_user_model()
+
+
+class HomePageTest(TestCase):
+    """Тесты предрассчитанных блоков главной страницы"""
+
+    def setUp(self):
+        service_cache.clear_local()
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.products = [
+            Product.objects.create(name=f"Product {i}", slug=f"product-{i}", price=10 + i) for i in range(4)
+        ]
+
+    def order(self, quantities, status='delivered'):
+        order = Order.objects.create(customer=self.user, total_amount=0, shipping_address="Address", status=status)
+        for index, quantity in quantities.items():
+            OrderItem.objects.create(order=order, product=self.products[index], quantity=quantity, price=1)
+        return order
+
+    def names(self, block):
+        return [product['name'] for product in block]
+
+    def test_refresh_builds_blocks(self):
+        """Тест: хиты по проданным штукам, новинки, снова в наличии"""
+        # Arrange: отмененные и старые заказы не учитываются
+        self.order({1: 3, 2: 1})
+        self.order({2: 1})
+        self.order({0: 10}, status='cancelled')
+        old = self.order({3: 10})
+        Order.objects.filter(id=old.id).update(order_date=timezone.now() - datetime.timedelta(days=60))
+        StockBalance.objects.create(product=self.products[0], quantity=0)
+        InventoryService.update_stock(self.products[0].id, 5)
+        InventoryService.update_stock(self.products[1].id, 5)
+
+        # Act
+        page = homepage.refresh()
+
+        # Assert
+        self.assertEqual(self.names(page.payload['bestsellers']), ["Product 1", "Product 2"])
+        self.assertEqual(self.names(page.payload['new_arrivals']), ["Product 3", "Product 2", "Product 1", "Product 0"])
+        self.assertEqual(self.names(page.payload['back_in_stock']), ["Product 0"])
+        self.assertEqual(page.payload['bestsellers'][0]['url'], self.products[1].get_absolute_url())
+
+    def test_home_page_without_aggregate_queries(self):
+        """Тест: главная читает блоки по первичному ключу, повторно - из кеша"""
+        # Arrange
+        self.order({1: 2})
+        homepage.refresh()
+        service_cache.clear_local()
+        cache.clear()
+
+        # Act
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('home'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('home'))
+
+        # Assert
+        self.assertFalse([query['sql'] for query in queries if 'SUM(' in query['sql'].upper()])
+        self.assertEqual(self.names(response.context['blocks']['bestsellers']), ["Product 1"])
+        self.assertContains(response, "Хиты продаж")
+
+    def test_refresh_invalidates_cached_blocks(self):
+        """Тест: после пересчета главная показывает новые блоки"""
+        with self.captureOnCommitCallbacks(execute=True):
+            homepage.refresh()
+        self.client.get(reverse('home'))
+        self.order({2: 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            homepage.refresh()
+        response = self.client.get(reverse('home'))
+
+        self.assertEqual(self.names(response.context['blocks']['bestsellers']), ["Product 2"])
+
+    def test_stale_blocks_are_served(self):
+        """Тест: устаревшие блоки отдаются с предупреждением в лог"""
+        # Arrange
+        self.order({1: 1})
+        homepage.refresh()
+        PrecomputedPage.objects.update(refreshed_at=timezone.now() - datetime.timedelta(days=1))
+
+        # Act
+        with self.assertLogs('store.homepage', 'WARNING'):
+            response = self.client.get(reverse('home'))
+
+        # Assert
+        self.assertEqual(self.names(response.context['blocks']['bestsellers']), ["Product 1"])
+
+    def test_never_refreshed_falls_back_to_new_arrivals(self):
+        """Тест: без пересчета главная показывает новинки"""
+        with self.assertLogs('store.homepage', 'WARNING'):
+            response = self.client.get(reverse('home'))
+
+        self.assertEqual(list(response.context['blocks']), ['new_arrivals'])
+        self.assertEqual(len(response.context['blocks']['new_arrivals']), 4)
+
+    def test_catalog_sync_marks_restocked(self):
+        """Тест: синхронизация каталога отмечает товары, снова появившиеся в наличии"""
+        # Arrange
+        StockBalance.objects.create(product=self.products[0], quantity=0)
+        StockBalance.objects.create(product=self.products[1], quantity=3)
+        records = [
+            {'name': product.name, 'description': product.description, 'price': product.price, 'quantity': 7}
+            for product in self.products[:2]
+        ]
+
+        # Act
+        CatalogSyncService.sync(records)
+
+        # Assert
+        restocked = StockBalance.objects.filter(restocked_at__isnull=False).values_list('product_id', flat=True)
+        self.assertEqual(list(restocked), [self.products[0].id])
+
+    def test_refresh_command(self):
+        """Тест: команда пересчета сообщает размеры блоков"""
+        out = io.StringIO()
+
+        call_command('refresh_home_page', stdout=out)
+
+        self.assertIn('4 new_arrivals', out.getvalue())
+        self.assertTrue(PrecomputedPage.objects.filter(key=homepage.HOME_PAGE_KEY).exists())
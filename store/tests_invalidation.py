@@ -0,0 +1,148 @@
+import multiprocessing
+import time
+import unittest
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from MyOnlineStore.warmup import close_connections
+from .cache import TwoTierCache, invalidate_tags, service_cache
+from .invalidation import InvalidationBus, bus, decode, encode, navigation_tag
+from .models import CacheInvalidation, Product
+
+# Максимальная задержка применения инвалидации в других процессах
+MAX_DELAY = 3
+
+
+class InvalidationBusTest(TestCase):
+    """Тесты публикации и применения сообщений шины"""
+
+    def setUp(self):
+        self.cache = TwoTierCache(local_ttl=60)
+        self.bus = InvalidationBus(self.cache)
+
+    def test_encode_decode(self):
+        """Тест формата сообщения"""
+        payload = encode('node:1', ['stock', 'product', 'stock'])
+        self.assertEqual(payload, 'node:1|product,stock')
+        self.assertEqual(decode(payload), ('node:1', ['product', 'stock']))
+
+    def test_apply_drops_navigation_fragment(self):
+        """Тест: чужое сообщение с тегом nav:<id> сбрасывает навигацию пользователя в этом процессе"""
+        # Arrange
+        cache.set(make_template_fragment_key('nav', [5]), 'badge 1')
+        cache.set(make_template_fragment_key('nav', [6]), 'badge 2')
+        self.cache.get_or_set('family', 'product-key', lambda: 1, ttl=60, tags=('product',))
+
+        # Act
+        self.bus.apply(encode('other-process', [navigation_tag(5)]))
+
+        # Assert
+        self.assertIsNone(cache.get(make_template_fragment_key('nav', [5])))
+        self.assertEqual(cache.get(make_template_fragment_key('nav', [6])), 'badge 2')
+        self.assertIn('product-key', self.cache._local)
+
+    def test_apply_drops_tagged_local_entries(self):
+        """Тест: чужое сообщение сбрасывает локальные значения с тегом"""
+        # Arrange
+        self.cache.get_or_set('family', 'product-key', lambda: 1, ttl=60, tags=('product',))
+        self.cache.get_or_set('family', 'order-key', lambda: 2, ttl=60, tags=('order',))
+
+        # Act
+        self.bus.apply(encode('other-process', ['product']))
+
+        # Assert
+        self.assertNotIn('product-key', self.cache._local)
+        self.assertIn('order-key', self.cache._local)
+        self.assertEqual(self.bus.received, 1)
+
+    def test_own_messages_are_ignored(self):
+        """Тест: свои сообщения уже применены при публикации"""
+        self.cache.get_or_set('family', 'key', lambda: 1, ttl=60, tags=('product',))
+        self.bus.apply(encode(self.bus.origin, ['product']))
+        self.assertIn('key', self.cache._local)
+        self.assertEqual(self.bus.received, 0)
+
+    @override_settings(CACHE_INVALIDATION_BACKEND='table')
+    def test_model_change_is_published_after_commit(self):
+        """Тест: изменение товара попадает в журнал после коммита"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Product", slug="product", price=100.00)
+
+        entry = CacheInvalidation.objects.get()
+        self.assertEqual((entry.tags, entry.origin), ('product', bus.origin))
+
+    @override_settings(CACHE_INVALIDATION_BACKEND='off')
+    def test_disabled_bus_publishes_nothing(self):
+        """Тест: при выключенной шине журнал не пишется"""
+        invalidate_tags('product')
+        self.assertFalse(CacheInvalidation.objects.exists())
+
+
+def _worker(backend, ready, results):
+    """
+    Процесс-воркер: кеширует значение с тегом product и ждет,
+    пока шина сбросит его из локального уровня
+    """
+    with override_settings(CACHE_INVALIDATION_BACKEND=backend, CACHE_INVALIDATION_POLL_INTERVAL=0.1):
+        service_cache.clear_local()
+        bus.start()
+        service_cache.get_or_set('family', 'product-key', lambda: 1, ttl=600, tags=('product',))
+        ready.put(True)
+        deadline = time.monotonic() + MAX_DELAY * 2
+        while 'product-key' in service_cache._local and time.monotonic() < deadline:
+            time.sleep(0.02)
+        results.put('product-key' not in service_cache._local)
+        bus.stop()
+        connections.close_all()
+
+
+class MultiProcessInvalidationTest(TransactionTestCase):
+    """Тесты доставки инвалидаций в другие процессы через общую БД"""
+    workers = 2
+
+    @classmethod
+    def setUpClass(cls):
+        # Проверяется тестовая БД: она создана к этому моменту и может быть
+        # в памяти, даже если в настройках проекта указан файл
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise unittest.SkipTest('Processes need a database shared through a file or server')
+        super().setUpClass()
+
+    def run_workers(self, backend):
+        # Дочерние процессы не должны использовать соединения и пул родителя
+        close_connections()
+        context = multiprocessing.get_context('fork')
+        ready, results = context.Queue(), context.Queue()
+        processes = [context.Process(target=_worker, args=(backend, ready, results))
+                     for _ in range(self.workers)]
+        for process in processes:
+            process.start()
+        try:
+            for _ in processes:
+                ready.get(timeout=10)
+            # Слушатели запоминают момент старта, публикация должна быть позже
+            time.sleep(0.3)
+            with override_settings(CACHE_INVALIDATION_BACKEND=backend):
+                started = time.monotonic()
+                Product.objects.create(name="Product", slug="product", price=100.00)
+            delivered = [results.get(timeout=MAX_DELAY * 3) for _ in processes]
+            elapsed = time.monotonic() - started
+        finally:
+            for process in processes:
+                process.join(10)
+                if process.is_alive():
+                    process.terminate()
+        self.assertEqual(delivered, [True] * self.workers)
+        self.assertLess(elapsed, MAX_DELAY)
+        self.assertEqual([process.exitcode for process in processes], [0] * self.workers)
+
+    def test_change_log_table(self):
+        """Тест: опрос журнала доставляет инвалидацию всем процессам"""
+        self.run_workers('table')
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'LISTEN/NOTIFY requires PostgreSQL')
+    def test_listen_notify(self):
+        """Тест: LISTEN/NOTIFY доставляет инвалидацию всем процессам"""
+        self.run_workers('notify')
@@ -0,0 +1,113 @@
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+
+from .cache import service_cache
+from .counters import write
+from .models import Product, Order, OrderItem, Cart, CartItem, StockBalance, ProductNeighbour, ProductPopularity
+from .recommendations import build
+from .services import OrderService, InventoryService, ProductService, RecommendationService
+from .testing import QueryPlanTestCase
+
+User = get_user_model()
+
+
+class HotQueryPlanTest(QueryPlanTestCase):
+    """
+    Планы запросов представлений и сервисов на заполненной базе:
+    ни один из них не должен читать большую таблицу целиком
+    """
+    large_tables = (
+        Product._meta.db_table, Order._meta.db_table, OrderItem._meta.db_table,
+        Cart._meta.db_table, CartItem._meta.db_table, StockBalance._meta.db_table,
+        ProductNeighbour._meta.db_table, ProductPopularity._meta.db_table, User._meta.db_table,
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_dataset', '--products', '3000', '--users', '3000', '--carts', '2000',
+                     '--orders', '3000', '--seed', '11', stdout=io.StringIO())
+        build(full=True)
+        # Просмотрена половина товаров: остальные тоже есть в сортировке по популярности
+        ids = Product.objects.values_list('id', flat=True)[::2]
+        write({(product_id, 'view'): product_id % 97 + 1 for product_id in ids})
+        cls.analyze()
+        cls.order = Order.objects.order_by('id')[1500]
+        cls.customer = cls.order.customer
+        cls.cart = Cart.objects.order_by('id')[1000]
+        cls.cart_item = cls.cart.items.first()
+        cls.product = Product.objects.filter(is_active=True).order_by('id')[1000]
+
+    def setUp(self):
+        service_cache.clear_local()
+        cache.clear()
+
+    def test_storefront_views(self):
+        """Тест: запросы, которые выполняют страницы магазина, идут по индексам"""
+        pages = {
+            'home': ('home', None, None),
+            'product_list': ('product_list', None, {'page': 2}),
+            'product_list_price': ('product_list', None, {'page': 2, 'price': 2}),
+            'product_list_in_stock': ('product_list', None, {'page': 2, 'in_stock': 1}),
+            'product_list_price_in_stock': ('product_list', None, {'page': 2, 'price': 2, 'in_stock': 1}),
+            'product_list_popular': ('product_list', None, {'page': 2, 'sort': 'popular'}),
+            'product_detail': ('product_detail', [self.product.slug], None),
+        }
+        for name, (url_name, args, data) in pages.items():
+            with self.subTest(page=name):
+                self.assertViewNoSeqScan(url_name, args, data)
+
+        self.client.force_login(self.cart.customer)
+        for name, args in [('cart', None), ('add_to_cart', [self.product.id]),
+                           ('remove_from_cart', [self.cart_item.id])]:
+            with self.subTest(page=name):
+                self.assertViewNoSeqScan(name, args)
+
+        self.client.force_login(self.customer)
+        for name, args in [('my_account', None), ('order_detail', [self.order.id])]:
+            with self.subTest(page=name):
+                self.assertViewNoSeqScan(name, args)
+
+    def test_services(self):
+        """Тест: запросы сервисов идут по индексам"""
+        queries = {
+            'orders_by_status': OrderService.get_orders_by_status('pending'),
+            'low_stock': InventoryService.get_low_stock_products(threshold=5),
+            'stock_for_product': StockBalance.objects.filter(product=self.product),
+            'recommendations': RecommendationService.neighbours([self.product.id]).order_by('rank'),
+            'autocomplete_refresh': Product.objects.filter(updated_at__gte=timezone.now()),
+            'expired_carts': Cart.objects.filter(updated_at__lt=timezone.now()).order_by('updated_at', 'id')[:1000],
+        }
+        if connection.vendor == 'postgresql':
+            # LIKE '%...%' обслуживает только триграммный индекс PostgreSQL
+            queries['search'] = ProductService.search_products('Samsung Смартфон 1')
+        for name, queryset in queries.items():
+            with self.subTest(query=name):
+                self.assertNoSeqScan(queryset)
+
+        reads = {
+            'recent_orders_by_status': lambda: OrderService.get_recent_orders_by_status.uncached('pending'),
+            'order_by_id': lambda: OrderService.get_order_by_id.uncached(self.order.id),
+            'low_stock_report': lambda: InventoryService.get_low_stock_report.uncached(threshold=5),
+        }
+        for name, read in reads.items():
+            with self.subTest(query=name), self.assertQueriesNoSeqScan(name):
+                read()
+
+    def test_admin_changelists(self):
+        """Тест: фильтры списка заказов в админке идут по индексам"""
+        # Без фильтра на маленькой тестовой таблице EstimatedCountPaginator
+        # честно выполняет COUNT(*), поэтому проверяются только фильтры
+        self.client.force_login(User.objects.create_superuser('plan-admin', 'plan-admin@example.com', 'x'))
+        for lookup, value in [('status__exact', 'pending')]:
+            with self.subTest(filter=lookup):
+                self.assertViewNoSeqScan('admin:store_order_changelist', data={lookup: value})
+
+    def test_harness_detects_sequential_scan(self):
+        """Тест: запрос без подходящего индекса проваливает проверку"""
+        with self.assertRaises(AssertionError):
+            self.assertNoSeqScan(Order.objects.filter(shipping_address__startswith='x'))
@@ -0,0 +1,101 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from .models import Product, StockBalance
+from .ratelimit import BucketStore, TokenBucket, parse_rate
+
+User = get_user_model()
+
+
+class TokenBucketTest(TestCase):
+    """Unit тесты token bucket"""
+
+    def test_parse_rate(self):
+        """Тест разбора лимита"""
+        self.assertEqual(parse_rate('10/m'), (10, 10 / 60))
+        self.assertEqual(parse_rate('2/s'), (2, 2))
+
+    def test_burst_then_refill(self):
+        """Тест: ведро отдает емкость сразу и пополняется со временем"""
+        # Arrange
+        state = None
+
+        # Act
+        results = []
+        for _ in range(3):
+            allowed, state, wait = TokenBucket.take(state, 2, 1.0, now=100.0)
+            results.append(allowed)
+        refilled, _, _ = TokenBucket.take(state, 2, 1.0, now=101.0)
+
+        # Assert
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(wait, 1.0)
+        self.assertTrue(refilled)
+
+    def test_in_process_fallback(self):
+        """Тест: при недоступном общем кеше лимит считается в памяти процесса"""
+        store = BucketStore()
+        with mock.patch('store.ratelimit.caches') as caches:
+            caches.__getitem__.return_value.get.side_effect = ConnectionError('down')
+            results = [store.take('key', 1, 0.1, now=10.0)[0] for _ in range(2)]
+        self.assertEqual(results, [True, False])
+
+
+@override_settings(RATE_LIMITS={
+    'add_to_cart': {'ip': '100/m', 'user': '2/m'},
+    'login': {'ip': '100/m', 'username': '2/m', 'methods': ['POST']},
+})
+class RateLimitMiddlewareTest(TestCase):
+    """Тесты ограничения частоты запросов"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.product = Product.objects.create(name="Test Product", price=100.00)
+        StockBalance.objects.create(product=self.product, quantity=100)
+
+    def test_user_limit_returns_429_with_retry_after(self):
+        """Тест: сверх лимита пользователь получает 429 и Retry-After"""
+        # Arrange
+        self.client.login(username='testuser', password='testpass123')
+        url = reverse('add_to_cart', args=[self.product.id])
+
+        # Act
+        statuses = [self.client.get(url).status_code for _ in range(3)]
+        response = self.client.get(url)
+
+        # Assert
+        self.assertEqual(statuses, [302, 302, 429])
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+
+    def test_rejected_login_does_not_hash_password(self):
+        """Тест: отклоненный вход не доходит до проверки пароля и БД"""
+        # Arrange
+        data = {'username': 'testuser', 'password': 'wrong'}
+        for _ in range(2):
+            self.client.post(reverse('login'), data)
+
+        # Act
+        with mock.patch('django.contrib.auth.hashers.check_password') as check_password:
+            with self.assertNumQueries(0):
+                response = self.client.post(reverse('login'), data)
+
+        # Assert
+        self.assertEqual(response.status_code, 429)
+        check_password.assert_not_called()
+
+    def test_other_views_and_methods_are_not_limited(self):
+        """Тест: GET входа и страницы без лимита не ограничиваются"""
+        for _ in range(5):
+            self.assertEqual(self.client.get(reverse('login')).status_code, 200)
+
+    @override_settings(RATE_LIMIT_ENABLED=False)
+    def test_disabled(self):
+        """Тест: лимиты можно отключить"""
+        data = {'username': 'testuser', 'password': 'wrong'}
+        statuses = {self.client.post(reverse('login'), data).status_code for _ in range(4)}
+        self.assertEqual(statuses, {200})
@@ -0,0 +1,159 @@
+import io
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import service_cache
+from .models import Product, Order, OrderItem, Cart, CartItem, ProductNeighbour, RecommendationRun
+from .recommendations import build, cooccurrence, top_k
+from .services import RecommendationService
+
+User = get_user_model()
+
+
+class CooccurrenceTest(TestCase):
+    """Unit тесты подсчета совместных покупок"""
+
+    def test_counts_pairs_once_per_order(self):
+        """Тест: пара считается один раз на заказ, диагональ пустая"""
+        # Arrange: заказ 1 - товары 1, 2 (2 дважды), заказ 2 - товары 1, 2, 3
+        order_ids = np.array([1, 1, 1, 2, 2, 2])
+        product_ids = np.array([1, 2, 2, 1, 2, 3])
+
+        # Act
+        counts = cooccurrence(order_ids, product_ids, 4).toarray()
+
+        # Assert
+        self.assertEqual(counts[1, 2], 2)
+        self.assertEqual(counts[2, 1], 2)
+        self.assertEqual(counts[1, 3], 1)
+        self.assertEqual(counts.diagonal().sum(), 0)
+
+    def test_top_k_orders_by_score_then_id(self):
+        """Тест: top-K по убыванию счета, при равенстве - по id"""
+        counts = cooccurrence(np.array([1, 1, 1, 2, 2]), np.array([1, 3, 2, 1, 3]), 4)
+
+        products, neighbours, scores, ranks = top_k(counts, 1)
+
+        self.assertEqual(
+            list(zip(products.tolist(), neighbours.tolist(), scores.tolist(), ranks.tolist())),
+            [(1, 3, 2, 0), (2, 1, 1, 0), (3, 1, 2, 0)],
+        )
+
+
+class RecommendationBuildTest(TestCase):
+    """Тесты пересчета и выдачи рекомендаций"""
+
+    def setUp(self):
+        service_cache.clear_local()
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.products = [Product.objects.create(name=f"Product {i}", price=10 + i) for i in range(4)]
+
+    def order(self, *indexes, status='delivered'):
+        order = Order.objects.create(customer=self.user, total_amount=0, shipping_address="Address", status=status)
+        for index in indexes:
+            OrderItem.objects.create(order=order, product=self.products[index], quantity=1, price=1)
+        return order
+
+    def neighbours(self):
+        return list(ProductNeighbour.objects.order_by('product_id', 'rank').values_list(
+            'product_id', 'neighbour_id', 'score'
+        ))
+
+    def test_incremental_build_matches_full(self):
+        """Тест: дозагрузка новых заказов дает тот же результат, что полный пересчет"""
+        # Arrange
+        self.order(0, 1)
+        self.order(0, 1, 2)
+        build(full=True)
+        self.order(0, 2)
+        self.order(2, 3)
+        self.order(0, 3, status='cancelled')
+
+        # Act
+        run = build()
+        incremental = self.neighbours()
+        build(full=True)
+
+        # Assert
+        self.assertFalse(run.full)
+        self.assertEqual(run.orders, 2)
+        self.assertEqual(incremental, self.neighbours())
+        p = [product.id for product in self.products]
+        self.assertIn((p[0], p[1], 2), incremental)
+        self.assertNotIn((p[0], p[3], 1), incremental)
+
+    def test_stale_full_rebuild_is_repeated(self):
+        """Тест: после интервала полного пересчета запуск становится полным и вычитает отмененные заказы"""
+        # Arrange: заказ учтен пересчетом, потом отменен
+        self.order(2, 3)
+        cancelled = self.order(0, 1)
+        build(full=True)
+        Order.objects.filter(pk=cancelled.pk).update(status='cancelled')
+        p = [product.id for product in self.products]
+
+        # Act
+        fresh = build()
+        kept = self.neighbours()
+        RecommendationRun.objects.update(created_at=timezone.now() - timedelta(days=2))
+        stale = build()
+
+        # Assert
+        self.assertFalse(fresh.full)
+        self.assertIn((p[0], p[1], 1), kept)
+        self.assertTrue(stale.full)
+        self.assertEqual(self.neighbours(), [(p[2], p[3], 1), (p[3], p[2], 1)])
+
+    def test_service_serves_with_one_query(self):
+        """Тест: рекомендации к товару - один запрос по индексу"""
+        # Arrange
+        self.order(0, 1)
+        self.order(0, 1, 2)
+        self.order(0, 2)
+        self.order(0, 3)
+        self.order(0, 2)
+        self.products[3].is_active = False
+        self.products[3].save()
+        build(full=True)
+
+        # Act
+        with self.assertNumQueries(1):
+            recommended = RecommendationService.for_product.uncached(self.products[0].id)
+
+        # Assert: неактивный товар не предлагается
+        self.assertEqual(recommended, [self.products[2], self.products[1]])
+
+    def test_cart_recommendations_exclude_cart_products(self):
+        """Тест: в корзине предлагаются только товары, которых в ней нет"""
+        # Arrange
+        self.order(0, 1, 2)
+        self.order(1, 3)
+        call_command('build_recommendations', '--full', stdout=io.StringIO())
+        cart = Cart.objects.create(customer=self.user)
+        CartItem.objects.create(cart=cart, product=self.products[0])
+        CartItem.objects.create(cart=cart, product=self.products[1])
+        self.client.login(username='testuser', password='testpass123')
+
+        # Act
+        response = self.client.get(reverse('cart'))
+
+        # Assert
+        self.assertEqual(response.context['recommendations'], [self.products[2], self.products[3]])
+        self.assertContains(response, 'С этим товаром покупают')
+
+    def test_product_detail_shows_recommendations(self):
+        """Тест: страница товара показывает рекомендации после пересчета"""
+        self.order(0, 1)
+        call_command('build_recommendations', stdout=io.StringIO())
+
+        response = self.client.get(reverse('product_detail', args=[self.products[0].slug]))
+
+        self.assertEqual(response.context['recommendations'], [self.products[1]])
+        self.assertTrue(RecommendationRun.objects.get().full)
@@ -0,0 +1,90 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from .models import CatalogFacet, Product, ProductPopularity, StockBalance, Cart
+from .routers import ReplicaRouter, RoutingState, PIN_COOKIE, _routing, health
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_URL_NAMES=['product_list', 'product_detail'])
+class ReplicaRoutingTest(TestCase):
+    """Тесты маршрутизации чтения на реплику (две SQLite-БД вместо primary/replica)"""
+    # Реплика подключается в setUpClass, поэтому список БД вычисляется там же
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        configured = connections.configure_settings({
+            'default': connections.settings['default'],
+            'replica': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(cls.tmpdir.name, 'replica.sqlite3'),
+            },
+        })
+        connections.settings['replica'] = configured['replica']
+        with connections['replica'].schema_editor() as editor:
+            editor.create_model(Product)
+            editor.create_model(StockBalance)
+            editor.create_model(CatalogFacet)
+            editor.create_model(ProductPopularity)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        health.reset()
+        Product.objects.create(name="Primary Product", slug="product", price=100.00)
+        Product.objects.using('replica').create(name="Replica Product", slug="product", price=100.00)
+
+    def test_catalog_reads_go_to_replica(self):
+        """Тест: каталог читается с реплики"""
+        response = self.client.get(reverse('product_list'))
+
+        self.assertContains(response, 'Replica Product')
+        self.assertNotContains(response, 'Primary Product')
+
+    def test_pinned_user_reads_from_primary(self):
+        """Тест: после записи чтения идут на основную БД"""
+        self.client.cookies[PIN_COOKIE] = '1'
+
+        response = self.client.get(reverse('product_detail', args=['product']))
+
+        self.assertContains(response, 'Primary Product')
+
+    def test_write_request_sets_pin_cookie(self):
+        """Тест: небезопасный метод закрепляет пользователя за основной БД"""
+        response = self.client.post(reverse('product_list'))
+
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        """Тест: отстающая реплика не используется"""
+        with mock.patch('store.routers.replica_lag', return_value=3600), \
+                self.assertLogs('store.routers', 'WARNING'):
+            response = self.client.get(reverse('product_list'))
+
+        self.assertContains(response, 'Primary Product')
+
+    def test_non_catalog_models_use_primary(self):
+        """Тест: корзина всегда читается с основной БД"""
+        state = RoutingState()
+        state.use_replica = True
+        token = _routing.set(state)
+        try:
+            router = ReplicaRouter()
+            self.assertEqual(router.db_for_read(Product), 'replica')
+            self.assertEqual(router.db_for_read(Cart), 'default')
+            router.db_for_write(Product)
+            self.assertEqual(router.db_for_read(Product), 'default')
+        finally:
+            _routing.reset(token)
@@ -1,8 +1,10 @@
+from unittest import mock
+
 from django.test import TestCase
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
-from .models import Product, Cart, Order, StockBalance
-from .services import OrderService, CartService, InventoryService, ProductService
+from .models import Product, ProductPopularity, Cart, Order, StockBalance
+from .services import OrderService, CartService, InventoryService, ProductService, CatalogSyncService
 
 User = get_user_model()
 
@@ -271,4 +273,91 @@ class ProductServiceTest(TestCase):
         search_results = ProductService.search_products("nonexistent")
 
         # Assert
-        self.assertEqual(search_results.count(), 0)
\ No newline at end of file
+        self.assertEqual(search_results.count(), 0)
+
+
+class CatalogSyncServiceTest(TestCase):
+    """Unit тесты для синхронизации каталога"""
+
+    def setUp(self):
+        self.unchanged = Product.objects.create(name="Unchanged", description="Desc", price=10.00)
+        StockBalance.objects.create(product=self.unchanged, quantity=5)
+        self.repriced = Product.objects.create(name="Repriced", description="Desc", price=20.00)
+        StockBalance.objects.create(product=self.repriced, quantity=5)
+        self.restocked = Product.objects.create(name="Restocked", description="Desc", price=30.00)
+        StockBalance.objects.create(product=self.restocked, quantity=5)
+        self.removed = Product.objects.create(name="Removed", description="Desc", price=40.00)
+
+    def test_sync_writes_only_changed_rows(self):
+        """Тест: синхронизация затрагивает только изменившиеся строки"""
+        # Arrange
+        unchanged_updated_at = Product.objects.get(id=self.unchanged.id).updated_at
+        snapshot = [
+            {'name': 'Unchanged', 'description': 'Desc', 'price': 10.00, 'quantity': 5},
+            {'name': 'Repriced', 'description': 'Desc', 'price': 25.00, 'quantity': 5},
+            {'name': 'Restocked', 'description': 'Desc', 'price': 30.00, 'quantity': 9},
+            {'name': 'New', 'description': 'Desc', 'price': 50.00, 'quantity': 1},
+        ]
+
+        # Act
+        summary = CatalogSyncService.sync(snapshot)
+
+        # Assert
+        self.assertEqual(summary, {
+            'created': 1, 'updated': 1, 'stock_updated': 1,
+            'deactivated': 1, 'unchanged': 1,
+        })
+        self.assertEqual(Product.objects.get(id=self.unchanged.id).updated_at, unchanged_updated_at)
+        self.assertEqual(Product.objects.get(id=self.repriced.id).price, 25)
+        self.assertEqual(StockBalance.objects.get(product=self.restocked).quantity, 9)
+        self.assertFalse(Product.objects.get(id=self.removed.id).is_active)
+        self.assertEqual(StockBalance.objects.get(product__name='New').quantity, 1)
+        self.assertTrue(ProductPopularity.objects.filter(product__name='New').exists())
+
+    def test_sync_repeated_snapshot_is_noop(self):
+        """Тест: повторная синхронизация того же снимка ничего не меняет"""
+        # Arrange
+        snapshot = [{'name': 'Unchanged', 'description': 'Desc', 'price': 10.00, 'quantity': 5}]
+        CatalogSyncService.sync(snapshot)
+
+        # Act
+        summary = CatalogSyncService.sync(snapshot)
+
+        # Assert
+        self.assertEqual(summary['unchanged'], 1)
+        self.assertEqual(summary['created'] + summary['updated'] + summary['deactivated'], 0)
+
+    def test_sync_without_changes_keeps_cache(self):
+        """Тест: снимок без изменений не сбрасывает кеш товаров и остатков"""
+        # Arrange
+        snapshot = [
+            {'name': name, 'description': 'Desc', 'price': price, 'quantity': 5}
+            for name, price in (('Unchanged', 10.00), ('Repriced', 20.00), ('Restocked', 30.00))
+        ]
+        CatalogSyncService.sync(snapshot)
+
+        # Act
+        with mock.patch('store.services.invalidate_tags') as invalidate:
+            CatalogSyncService.sync(snapshot)
+            CatalogSyncService.sync(snapshot[:2] + [dict(snapshot[2], quantity=7)])
+
+        # Assert: вторая синхронизация изменила только остаток
+        invalidate.assert_called_once_with('stock')
+
+    def test_sync_creates_unique_transliterated_slugs(self):
+        """Тест: новые товары с русскими и совпадающими после slugify названиями получают разные slug"""
+        # Arrange
+        snapshot = [
+            {'name': 'Смартфон Samsung', 'price': 100.00, 'quantity': 1},
+            {'name': 'Смартфон, Samsung!', 'price': 100.00, 'quantity': 1},
+        ]
+
+        # Act
+        CatalogSyncService.sync(snapshot)
+
+        # Assert
+        products = Product.objects.filter(name__startswith='Смартфон')
+        self.assertEqual(
+            sorted(products.values_list('slug', flat=True)),
+            sorted(f'smartfon-samsung-{product.id}' for product in products),
+        )
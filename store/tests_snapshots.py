@@ -0,0 +1,154 @@
+import io
+import unittest
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import snapshots
+from .models import Cart, CartItem, Order, OrderItem, OrderSnapshot, Product
+
+User = get_user_model()
+
+
+class OrderSnapshotTest(TestCase):
+    """Тесты неизменяемых снимков заказов"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123', email='test@example.com')
+        self.client.login(username='testuser', password='testpass123')
+        self.products = [
+            Product.objects.create(name=f"Product {i}", slug=f"product-{i}", price=10 + i) for i in range(3)
+        ]
+
+    def checkout(self):
+        cart = Cart.objects.create(customer=self.user)
+        for product in self.products[:2]:
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+        self.client.post(reverse('checkout'), {'address': "Москва, Тверская 1"})
+        return Order.objects.get(customer=self.user)
+
+    def legacy_order(self, *indexes):
+        """Заказ, оформленный до появления снимков"""
+        order = Order.objects.create(customer=self.user, total_amount=0, shipping_address="Address")
+        for index in indexes:
+            OrderItem.objects.create(order=order, product=self.products[index], quantity=1,
+                                     price=self.products[index].price)
+        order.update_total()
+        return order
+
+    def test_checkout_writes_snapshot(self):
+        """Тест: при оформлении записывается снимок с позициями и итогом"""
+        order = self.checkout()
+
+        data = OrderSnapshot.objects.get(order=order).data
+
+        self.assertEqual(data['shipping_address'], "Москва, Тверская 1")
+        self.assertEqual(data['total'], '42.00')
+        self.assertEqual(
+            [(item['name'], item['price'], item['quantity'], item['total']) for item in data['items']],
+            [("Product 0", '10.00', 2, '20.00'), ("Product 1", '11.00', 2, '22.00')],
+        )
+
+    def test_order_pages_show_snapshot_after_product_changes(self):
+        """Тест: переименование товара не меняет оформленный заказ"""
+        # Arrange
+        order = self.checkout()
+        Product.objects.filter(id=self.products[0].id).update(name="Renamed", price=99)
+        Order.objects.filter(id=order.id).update(status='shipped')
+
+        # Act
+        detail = self.client.get(reverse('order_detail', args=[order.id]))
+        confirmation = self.client.get(reverse('order_confirmation', args=[order.id]))
+
+        # Assert: статус живой, состав из снимка
+        self.assertContains(detail, "Product 0")
+        self.assertNotContains(detail, "Renamed")
+        self.assertContains(detail, "Отправлен")
+        self.assertContains(confirmation, "42.00")
+
+    def test_order_detail_single_order_query(self):
+        """Тест: заказ читается одним запросом вместе со снимком, без позиций и товаров"""
+        order = self.checkout()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('order_detail', args=[order.id]))
+
+        self.assertEqual(response.status_code, 200)
+        tables = ' '.join(query['sql'] for query in queries)
+        self.assertIn(OrderSnapshot._meta.db_table, tables)
+        self.assertNotIn(OrderItem._meta.db_table, tables)
+        self.assertNotIn(f'"{Product._meta.db_table}"', tables)
+
+    def test_order_without_snapshot_is_built_from_items(self):
+        """Тест: заказ без снимка показывается по позициям"""
+        order = self.legacy_order(0, 2)
+
+        response = self.client.get(reverse('order_detail', args=[order.id]))
+
+        self.assertContains(response, "Product 2")
+        self.assertFalse(OrderSnapshot.objects.exists())
+
+    def test_other_customer_order_is_not_found(self):
+        """Тест: чужой заказ недоступен"""
+        other = User.objects.create_user(username='other', password='testpass123', email='other@example.com')
+        order = Order.objects.create(customer=other, total_amount=0, shipping_address="Address")
+        snapshots.create(order)
+
+        response = self.client.get(reverse('order_detail', args=[order.id]))
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_backfill_command(self):
+        """Тест: заполнение снимков по диапазонам id, повторный запуск ничего не делает"""
+        # Arrange
+        orders = [self.legacy_order(0), self.legacy_order(1, 2), self.legacy_order()]
+        snapshots.create(orders[0])
+        out = io.StringIO()
+
+        # Act
+        # Воркеры не видят данных транзакции теста: диапазоны обрабатываются в этом процессе
+        call_command('backfill_order_snapshots', '--chunk-size', '1', '--workers', '1', stdout=out)
+        call_command('backfill_order_snapshots', '--workers', '1', stdout=out)
+
+        # Assert
+        self.assertIn('Snapshots written for 2 orders', out.getvalue())
+        self.assertIn('All orders already have snapshots', out.getvalue())
+        data = OrderSnapshot.objects.get(order=orders[1]).data
+        self.assertEqual([item['name'] for item in data['items']], ["Product 1", "Product 2"])
+        self.assertEqual(OrderSnapshot.objects.get(order=orders[2]).data['items'], [])
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Parallel backfill requires PostgreSQL')
+class ParallelBackfillTest(TransactionTestCase):
+    """Заполнение снимков несколькими процессами на зафиксированных данных"""
+
+    def test_backfill_with_workers(self):
+        """Тест: при --workers 2 у каждого заказа ровно один снимок с его позициями"""
+        # Arrange
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        product = Product.objects.create(name="Product", slug="product", price=10)
+        orders = []
+        for index in range(7):
+            order = Order.objects.create(customer=user, total_amount=0, shipping_address="Address")
+            OrderItem.objects.create(order=order, product=product, quantity=index + 1, price=10)
+            orders.append(order)
+        snapshots.create(orders[3])
+        out = io.StringIO()
+
+        # Act
+        call_command('backfill_order_snapshots', '--chunk-size', '2', '--workers', '2', stdout=out)
+
+        # Assert
+        self.assertIn('Snapshots written for 6 orders', out.getvalue())
+        self.assertIn('2 workers', out.getvalue())
+        self.assertEqual(
+            sorted(OrderSnapshot.objects.values_list('order_id', flat=True)),
+            [order.id for order in orders],
+        )
+        for index, order in enumerate(orders):
+            items = OrderSnapshot.objects.get(order=order).data['items']
+            self.assertEqual([item['quantity'] for item in items], [index + 1])
@@ -0,0 +1,83 @@
+import gzip
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+CSS = '.product-card { border: 1px solid #ddd; padding: 15px; margin: 10px; }\n' * 20
+
+
+class StaticPipelineTest(SimpleTestCase):
+    """Тесты сборки статики с хешами и gzip и ее раздачи из приложения"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        source = os.path.join(tmpdir.name, 'source')
+        self.root = os.path.join(tmpdir.name, 'root')
+        os.makedirs(os.path.join(source, 'css'))
+        with open(os.path.join(source, 'css', 'site.css'), 'w') as f:
+            f.write(CSS)
+        with open(os.path.join(source, 'css', 'tiny.css'), 'w') as f:
+            f.write('a { color: red; }\n')
+
+        overrides = override_settings(
+            STATIC_ROOT=self.root,
+            STATICFILES_DIRS=[source],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            DEBUG=False,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        call_command('collectstatic', interactive=False, verbosity=0, stdout=StringIO())
+        self.hashed = staticfiles_storage.stored_name('css/site.css')
+
+    def test_collectstatic_writes_hashed_and_gzip_files(self):
+        """Тест: хешированные имена в манифесте и .gz только там, где есть выигрыш"""
+        # Assert
+        self.assertNotEqual(self.hashed, 'css/site.css')
+        self.assertTrue(os.path.exists(os.path.join(self.root, self.hashed + '.gz')))
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'css', 'site.css.gz')))
+        tiny = staticfiles_storage.stored_name('css/tiny.css')
+        self.assertFalse(os.path.exists(os.path.join(self.root, tiny + '.gz')))
+
+    def test_hashed_file_is_immutable_and_negotiates_gzip(self):
+        """Тест: файл с хешем отдается сжатым и кешируется на год"""
+        # Act
+        response = self.client.get(f'/static/{self.hashed}', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        body = b''.join(response.streaming_content)
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertTrue(response['Content-Type'].startswith('text/css'))
+        self.assertEqual(int(response['Content-Length']), len(body))
+        self.assertEqual(gzip.decompress(body).decode(), CSS)
+
+    def test_identity_without_accept_encoding(self):
+        """Тест: без Accept-Encoding отдается несжатый файл"""
+        response = self.client.get(f'/static/{self.hashed}', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(b''.join(response.streaming_content).decode(), CSS)
+
+    def test_conditional_request(self):
+        """Тест: повторный запрос с ETag получает 304"""
+        first = self.client.get(f'/static/{self.hashed}', HTTP_ACCEPT_ENCODING='gzip')
+        second = self.client.get(f'/static/{self.hashed}', HTTP_ACCEPT_ENCODING='gzip',
+                                 HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+    def test_unhashed_file_has_short_max_age(self):
+        """Тест: файл без хеша кешируется ненадолго"""
+        response = self.client.get('/static/css/site.css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+
+    def test_missing_and_outside_files_fall_through(self):
+        """Тест: отсутствующие файлы и выход за STATIC_ROOT не раздаются"""
+        self.assertEqual(self.client.get('/static/css/missing.css').status_code, 404)
+        self.assertEqual(self.client.get('/static/../manage.py').status_code, 404)
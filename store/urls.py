@@ -3,9 +3,11 @@ from . import views
 
 urlpatterns = [
     path('', views.product_list, name='product_list'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
     path('cart/', views.cart_view, name='cart'),
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/remove/<int:cart_item_id>/', views.remove_from_cart, name='remove_from_cart'),
+    path('cart/remove-product/<int:product_id>/', views.remove_product_from_cart, name='remove_product_from_cart'),
     path('checkout/', views.checkout_view, name='checkout'),
     path('order-confirmation/<int:order_id>/', views.order_confirmation, name='order_confirmation'),
     path('my-account/orders/<int:order_id>/', views.order_detail, name='order_detail'),
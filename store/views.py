@@ -1,32 +1,133 @@
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash
-from .models import Product, Cart, CartItem, Order
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from .models import CATALOG_COLUMNS, Product, Cart, CartItem, Order
+from . import facets, snapshots
+from .autocomplete import index as autocomplete_index
+from .counters import counters
+from .services import HomePageService, ProductService, RecommendationService, popular_products
+
+PRODUCTS_PER_PAGE = 48
+CATALOG_ORDERINGS = {
+    'new': lambda: Product.objects.filter(is_active=True).order_by('-id'),
+    'popular': popular_products,
+}
+
+
+def catalog_filters(params):
+    """Ценовой диапазон (None - любой) и фильтр наличия из параметров запроса"""
+    try:
+        price_bucket = int(params.get('price', ''))
+    except ValueError:
+        price_bucket = None
+    if price_bucket is not None and not 0 <= price_bucket < len(facets.labels()):
+        price_bucket = None
+    return price_bucket, params.get('in_stock') == '1'
+
+
+def catalog_products(sort='new', price_bucket=None, in_stock=False):
+    """Товары каталога с фильтрами; читаются только поля карточки"""
+    products = CATALOG_ORDERINGS[sort]().only('id', *CATALOG_COLUMNS)
+    if price_bucket is not None:
+        products = products.filter(price_bucket=price_bucket)
+    if in_stock:
+        products = products.filter(in_stock=True)
+    return products
+
 
 def product_list(request):
-    products = Product.objects.filter(is_active=True)
-    return render(request, 'store/product_list.html', {'products': products})
+    """
+    Каталог постранично, без COUNT(*): берется на один товар больше страницы,
+    чтобы понять, есть ли следующая. Новинки с фильтрами по цене и наличию
+    читаются из частичных индексов товаров, в которые включены поля карточки;
+    по популярности - индексом score. Счетчики фильтров - из готовых ячеек
+    фасетов (store.facets), без COUNT по товарам
+    """
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    sort = request.GET.get('sort') if request.GET.get('sort') in CATALOG_ORDERINGS else 'new'
+    price_bucket, in_stock = catalog_filters(request.GET)
+    offset = (page - 1) * PRODUCTS_PER_PAGE
+    products = list(catalog_products(sort, price_bucket, in_stock)[offset:offset + PRODUCTS_PER_PAGE + 1])
+    return render(request, 'store/product_list.html', {
+        'products': products[:PRODUCTS_PER_PAGE],
+        'page': page,
+        'sort': sort,
+        'price_bucket': price_bucket,
+        'in_stock': in_stock,
+        'facets': facets.summary(ProductService.get_facet_counts(), price_bucket, in_stock),
+        'has_next': len(products) > PRODUCTS_PER_PAGE,
+    })
 
 def product_detail(request, slug):
     product = get_object_or_404(Product, slug=slug, is_active=True)
-    return render(request, 'store/product_detail.html', {'product': product})
+    counters.record(product.id, 'view')
+    return render(request, 'store/product_detail.html', {
+        'product': product,
+        'recommendations': RecommendationService.for_product(product.id),
+    })
+
+AUTOCOMPLETE_MAX_LIMIT = 20
+
+
+def autocomplete(request):
+    """Подсказки поиска по мере ввода из индекса в памяти, без запросов к БД"""
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), AUTOCOMPLETE_MAX_LIMIT)
+    except ValueError:
+        limit = 10
+    results = autocomplete_index.search(request.GET.get('q', ''), limit)
+    return JsonResponse({'results': [
+        {'id': product_id, 'name': name, 'url': reverse('product_detail', args=[slug])}
+        for product_id, name, slug in results
+    ]})
+
 
 def home_page(request):
-    return render(request, 'store/home.html')
+    return render(request, 'store/home.html', {
+        'blocks': HomePageService.get_blocks(),
+        'popular': ProductService.get_popular_products(),
+    })
 
 
-@login_required
 def cart_view(request):
-    cart, created = Cart.objects.get_or_create(customer=request.user)
-    return render(request, 'store/cart.html', {'cart': cart})
+    """
+    Корзина пользователя из БД или, до входа, корзина из cookie
+    (store.anonymous_cart): товары читаются одним запросом, без записи
+    """
+    if request.user.is_authenticated:
+        cart, created = Cart.objects.get_or_create(customer=request.user)
+        prefetch_related_objects([cart], 'items__product')
+        items, total = cart.items.all(), cart.total_price
+    else:
+        items = request.anonymous_cart.lines()
+        total = sum(item.price for item in items)
+    product_ids = sorted({item.product.id for item in items})
+    recommendations = RecommendationService.for_cart(tuple(product_ids)) if product_ids else []
+    return render(request, 'store/cart.html', {
+        'items': items,
+        'total': total,
+        'anonymous': not request.user.is_authenticated,
+        'recommendations': recommendations,
+    })
 
 
-@login_required
 def add_to_cart(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
-    cart, created = Cart.objects.get_or_create(customer=request.user)
-    cart.add_product(product)
+    if request.user.is_authenticated:
+        product = get_object_or_404(Product, id=product_id)
+        cart, created = Cart.objects.get_or_create(customer=request.user)
+        cart.add_product(product)
+    else:
+        product = get_object_or_404(Product, id=product_id, is_active=True)
+        request.anonymous_cart.add(product.id)
+    counters.record(product.id, 'cart')
     return redirect('cart')
 
 
@@ -37,17 +138,25 @@ def remove_from_cart(request, cart_item_id):
     return redirect('cart')
 
 
+def remove_product_from_cart(request, product_id):
+    """Удаление товара из корзины в cookie"""
+    request.anonymous_cart.remove(product_id)
+    return redirect('cart')
+
+
 @login_required
 def checkout_view(request):
-    cart = get_object_or_404(Cart, customer=request.user)
+    cart = get_object_or_404(Cart.objects.prefetch_related('items__product'), customer=request.user)
 
     if request.method == 'POST':
-        order = Order.objects.create(
-            customer=request.user,
-            shipping_address=request.POST.get('address'),
-            total_amount=cart.total_price
-        )
-        order.create_order_from_cart(cart)
+        with transaction.atomic():
+            order = Order.objects.create(
+                customer=request.user,
+                shipping_address=request.POST.get('address'),
+                total_amount=cart.total_price
+            )
+            order.create_order_from_cart(cart)
+            snapshots.create(order)
         return redirect('order_confirmation', order_id=order.id)
 
     return render(request, 'store/checkout.html', {'cart': cart})
@@ -55,8 +164,8 @@ def checkout_view(request):
 
 @login_required
 def order_confirmation(request, order_id):
-    order = get_object_or_404(Order, id=order_id, customer=request.user)
-    return render(request, 'store/order_confirmation.html', {'order': order})
+    order = get_object_or_404(Order.objects.select_related('snapshot'), id=order_id, customer=request.user)
+    return render(request, 'store/order_confirmation.html', {'order': order, 'snapshot': snapshots.get(order)})
 
 
 from django.contrib.auth.decorators import login_required
@@ -90,5 +199,6 @@ def my_account(request):
 
 @login_required
 def order_detail(request, order_id):
-    order = get_object_or_404(Order, id=order_id, customer=request.user)
-    return render(request, 'store/order_detail.html', {'order': order})
+    # Позиции, названия и итог - из снимка заказа, статус - из самого заказа
+    order = get_object_or_404(Order.objects.select_related('snapshot'), id=order_id, customer=request.user)
+    return render(request, 'store/order_detail.html', {'order': order, 'snapshot': snapshots.get(order)})